@@ -1,20 +1,27 @@
 # frontend/app.py
 import streamlit as st
-import requests
-from pathlib import Path
+from utils.api import (
+    ApiError, set_api_url, file_digest, upload_policy_api, clear_policy_api, policy_version_api,
+    moderate_stream_api, submit_job_api, poll_job, cancel_job_api,
+)
 
 # Configure this to match your backend address/port
 API_URL = st.secrets.get("api_url", "http://localhost:8000")
+set_api_url(API_URL)
+# moderation results kept per browser session, keyed by (file hash, policy version)
+RESULT_CACHE_SIZE = 20
 
 st.set_page_config(page_title="Content Moderation", layout="wide")
 st.title("PDF Content Moderation (Policy-based)")
 
+results = st.session_state.setdefault("moderation_results", {})
+digests = st.session_state.setdefault("file_digests", {})
+
 st.sidebar.header("Policy Management")
 policy_files = st.sidebar.file_uploader("Upload policy PDFs (multiple)", type="pdf", accept_multiple_files=True)
 if st.sidebar.button("Upload Policy PDFs") and policy_files:
-    files = [("files", (f.name, f.read(), "application/pdf")) for f in policy_files]
     try:
-        resp = requests.post(f"{API_URL}/upload_policy/", files=files, timeout=120)
+        resp = upload_policy_api(policy_files)
         if resp.status_code == 200:
             st.sidebar.success("Policy PDFs uploaded and stored.")
         else:
@@ -24,7 +31,7 @@ if st.sidebar.button("Upload Policy PDFs") and policy_files:
 
 if st.sidebar.button("Clear Policy Store"):
     try:
-        resp = requests.post(f"{API_URL}/clear_policy/")
+        resp = clear_policy_api()
         if resp.status_code == 200:
             st.sidebar.success("Policy store cleared.")
         else:
@@ -32,39 +39,124 @@ if st.sidebar.button("Clear Policy Store"):
     except Exception as e:
         st.sidebar.error(f"Clear failed: {e}")
 
+
+def render_violation(v: dict):
+    st.markdown("---")
+    st.markdown(f"**Chunk ID:** `{v.get('chunk_id')}`")
+    st.markdown(f"**Verdict:** {v.get('verdict')}")
+    st.markdown(f"**Explanation:** {v.get('explanation')}")
+    sources = v.get("sources", [])
+    if sources:
+        st.markdown("**Sources:**")
+        for s in sources:
+            st.markdown(f"- `{s}`")
+    st.markdown("**Chunk Preview:**")
+    st.code(v.get("chunk_text", "")[:1000])
+
+
+def render_summary(data: dict):
+    st.write(f"Verdict: **{data.get('verdict')}**")
+    st.write(f"Total chunks analyzed: {data.get('total_chunks')}")
+    st.write(f"Allowed chunks: {data.get('allowed_chunks')}")
+    violations = data.get("violations", [])
+    if not violations:
+        st.success("No violations found according to the policy store.")
+    else:
+        st.error(f"{len(violations)} violation(s) detected")
+
+
+def render_result(data: dict):
+    st.subheader("Moderation Result")
+    render_summary(data)
+    for v in data.get("violations", []):
+        render_violation(v)
+
+
+def run_streaming(current_file) -> dict:
+    """
+    Moderate through /moderate/stream, showing progress and each flagged chunk as it is judged.
+    """
+    st.subheader("Moderation Result")
+    summary_box = st.empty()
+    progress = st.empty()
+    counts = {}
+    summary = None
+    for record in moderate_stream_api(current_file):
+        if record["type"] == "chunk":
+            counts[record["verdict"]] = counts.get(record["verdict"], 0) + 1
+            progress.markdown(
+                f"Judged {sum(counts.values())} chunks: {counts.get('violation', 0)} violation(s), "
+                f"{counts.get('review', 0)} for review"
+            )
+            if record["verdict"] != "ok":
+                render_violation(record)
+        elif record["type"] == "summary":
+            summary = {k: v for k, v in record.items() if k != "type"}
+        elif record["type"] == "error":
+            raise ApiError(500, record.get("error", ""))
+    progress.empty()
+    if summary is None:
+        raise ApiError(500, "stream ended without a summary")
+    with summary_box.container():
+        render_summary(summary)
+    return summary
+
+
+def run_job(current_file) -> dict:
+    """
+    Moderate through a background job, polling its progress.
+    """
+    job_id = submit_job_api(current_file)
+    bar = st.progress(0.0, text="Queued")
+    try:
+        for job in poll_job(job_id):
+            done, total = job["progress"]["done"], job["progress"]["total"]
+            if job["status"] == "running" and total:
+                # total grows while the server is still parsing the PDF
+                bar.progress(min(done / total, 1.0), text=f"Judged {done} of {total}+ chunks")
+    except BaseException:
+        # a rerun (e.g. the user changing the file) stops this script; don't leave the job running
+        cancel_job_api(job_id)
+        raise
+    bar.empty()
+    if job["status"] != "done":
+        raise ApiError(500, f"job {job['status']}: {job.get('error') or ''}")
+    render_result(job["result"])
+    return job["result"]
+
+
 st.header("Moderate a Document")
-st.markdown("Upload the document you want to check against the stored policies. The file is not retained on the server after checking.")
+st.markdown(
+    "Upload the document you want to check against the stored policies. The PDF itself is not kept "
+    "on the server; if the server has its moderation archive enabled, the extracted text and verdicts "
+    "are kept for re-moderation until they expire or are deleted."
+)
 
 current_file = st.file_uploader("Upload PDF to moderate (single file)", type="pdf")
-if st.button("Run Moderation") and current_file:
+delivery = st.radio("Delivery", ["Stream results", "Background job"], horizontal=True)
+if current_file:
+    file_key = (current_file.name, current_file.size, getattr(current_file, "file_id", None))
+    if file_key not in digests:
+        digests[file_key] = file_digest(current_file)
     try:
-        files = {"current_file": (current_file.name, current_file.read(), "application/pdf")}
-        with st.spinner("Running moderation..."):
-            resp = requests.post(f"{API_URL}/moderate/", files=files, timeout=300)
-        if resp.status_code == 200:
-            data = resp.json()
-            st.subheader("Moderation Result")
-            st.write(f"Verdict: **{data.get('verdict')}**")
-            st.write(f"Total chunks analyzed: {data.get('total_chunks')}")
-            st.write(f"Allowed chunks: {data.get('allowed_chunks')}")
-            violations = data.get("violations", [])
-            if not violations:
-                st.success("No violations found according to the policy store.")
-            else:
-                st.error(f"{len(violations)} violation(s) detected")
-                for v in violations:
-                    st.markdown("---")
-                    st.markdown(f"**Chunk ID:** `{v.get('chunk_id')}`")
-                    st.markdown(f"**Verdict:** {v.get('verdict')}")
-                    st.markdown(f"**Explanation:** {v.get('explanation')}")
-                    sources = v.get("sources", [])
-                    if sources:
-                        st.markdown("**Sources:**")
-                        for s in sources:
-                            st.markdown(f"- `{s}`")
-                    st.markdown("**Chunk Preview:**")
-                    st.code(v.get("chunk_text", "")[:1000])
-        else:
-            st.error(f"Error: {resp.status_code} - {resp.text}")
-    except Exception as e:
-        st.error(f"Moderation failed: {e}")
+        policy_version = policy_version_api()
+    except Exception:
+        policy_version = None
+    # without a known policy version a stored result may be stale, so nothing is reused
+    cache_key = (digests[file_key], policy_version) if policy_version else None
+
+    run = st.button("Run Moderation")
+    if cache_key in results:
+        st.caption("Showing the stored result for this file and policy version.")
+        render_result(results[cache_key])
+    elif run:
+        try:
+            data = run_streaming(current_file) if delivery == "Stream results" else run_job(current_file)
+            if cache_key:
+                results[cache_key] = data
+                while len(results) > RESULT_CACHE_SIZE:
+                    results.pop(next(iter(results)))
+        except ApiError as e:
+            st.error(f"Error: {e}")
+        except Exception as e:
+            st.error(f"Moderation failed: {e}")
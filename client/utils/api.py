@@ -1,13 +1,174 @@
 # frontend/utils/api.py
+import hashlib
+import json
+import os
+import time
+import uuid
+from functools import lru_cache
+from typing import BinaryIO, Iterator, List, Optional, Tuple
 import requests
-from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+API_URL = os.environ.get("API_URL", "http://localhost:8000")
+# files are read and uploaded in blocks of this size instead of one .read()
+UPLOAD_BLOCK_SIZE = 1 << 16
+POOL_SIZE = 8
+CONNECT_TIMEOUT = 10
+# for streamed responses this bounds the wait between records, not the whole request
+READ_TIMEOUT = 300
+JOB_POLL_INTERVAL = 1.0
+FINAL_JOB_STATES = ("done", "failed", "cancelled")
+
+
+class ApiError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def set_api_url(url: str):
+    global API_URL
+    API_URL = url.rstrip("/")
+
+
+@lru_cache(maxsize=None)
+def get_session() -> requests.Session:
+    """
+    Shared HTTP session. Streamlit re-runs the script on every interaction but keeps
+    imported modules, so connections to the API stay pooled across reruns.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _size(fileobj: BinaryIO) -> int:
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def file_digest(fileobj: BinaryIO) -> str:
+    """
+    SHA-256 of an uploaded file, read block by block.
+    """
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(UPLOAD_BLOCK_SIZE), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class MultipartStream:
+    """
+    multipart/form-data body generated from file objects block by block, so uploads are
+    never copied into one bytes payload. It has a length, so requests sends a
+    Content-Length header and iterates it instead of using chunked encoding.
+    """
+
+    def __init__(self, files: List[Tuple[str, str, BinaryIO]]):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._parts = []
+        for field, filename, fileobj in files:
+            filename = filename.replace('"', "%22").replace("\r", "").replace("\n", "")
+            head = (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                "Content-Type: application/pdf\r\n\r\n"
+            ).encode()
+            self._parts.append((head, fileobj, _size(fileobj)))
+        self._tail = f"--{boundary}--\r\n".encode()
+
+    def __len__(self) -> int:
+        return sum(len(head) + size + 2 for head, _, size in self._parts) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for head, fileobj, _ in self._parts:
+            yield head
+            fileobj.seek(0)
+            for block in iter(lambda: fileobj.read(UPLOAD_BLOCK_SIZE), b""):
+                yield block
+            yield b"\r\n"
+        yield self._tail
+
+
+def _post_files(path: str, files: List[Tuple[str, str, BinaryIO]], params: Optional[dict] = None,
+                timeout: float = READ_TIMEOUT, stream: bool = False) -> requests.Response:
+    body = MultipartStream(files)
+    return get_session().post(
+        f"{API_URL}{path}", data=body, params=params, headers={"Content-Type": body.content_type},
+        timeout=(CONNECT_TIMEOUT, timeout), stream=stream,
+    )
+
+
+def _json(resp: requests.Response) -> dict:
+    if resp.status_code != 200:
+        raise ApiError(resp.status_code, resp.text)
+    return resp.json()
 
-API_URL = "http://localhost:8000"
 
 def upload_policy_api(files):
-    files_payload=[("files",(f.name,f.read(),"application/pdf")) for f in files]
-    return requests.post(f"{API_URL}/upload_policy/", files=files_payload)
+    return _post_files("/upload_policy/", [("files", f.name, f) for f in files], timeout=120)
+
+
+def clear_policy_api():
+    return get_session().post(f"{API_URL}/clear_policy/", timeout=(CONNECT_TIMEOUT, 60))
+
+
+def policy_version_api() -> Optional[str]:
+    """
+    Version of the default policy store, or None when the server has none loaded.
+    /ready answers 503 while warming up but still reports the version.
+    """
+    resp = get_session().get(f"{API_URL}/ready", timeout=(CONNECT_TIMEOUT, 10))
+    return resp.json().get("policy_version")
+
+
+def moderate_api(current_file, **params):
+    return _post_files("/moderate/", [("current_file", current_file.name, current_file)], params=params)
+
+
+def moderate_stream_api(current_file, **params) -> Iterator[dict]:
+    """
+    Yield the NDJSON records of /moderate/stream as they arrive: one {"type": "chunk"} per
+    judged chunk, then {"type": "summary"} (or {"type": "error"}).
+    """
+    with _post_files(
+        "/moderate/stream", [("current_file", current_file.name, current_file)], params=params, stream=True
+    ) as resp:
+        if resp.status_code != 200:
+            raise ApiError(resp.status_code, resp.text)
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def submit_job_api(current_file, **params) -> str:
+    resp = _post_files("/moderate/jobs", [("current_file", current_file.name, current_file)], params=params)
+    return _json(resp)["job_id"]
+
+
+def job_api(job_id: str) -> dict:
+    return _json(get_session().get(f"{API_URL}/moderate/jobs/{job_id}", timeout=(CONNECT_TIMEOUT, 30)))
+
+
+def cancel_job_api(job_id: str) -> dict:
+    return _json(get_session().post(f"{API_URL}/moderate/jobs/{job_id}/cancel", timeout=(CONNECT_TIMEOUT, 30)))
+
 
-def moderate_api(current_file):
-    files = {"current_file": (current_file.name, current_file.read(), "application/pdf")}
-    return requests.post(f"{API_URL}/moderate/", files=files)
+def poll_job(job_id: str, interval: float = JOB_POLL_INTERVAL) -> Iterator[dict]:
+    """
+    Yield the job every `interval` seconds until it reaches a final state (yielded last).
+    """
+    while True:
+        job = job_api(job_id)
+        yield job
+        if job["status"] in FINAL_JOB_STATES:
+            return
+        time.sleep(interval)
@@ -1,14 +1,18 @@
+import os
 import logging
 
+# DEBUG logs chunk-level detail; keep INFO or above in production so payloads are never formatted
+LOG_LEVEL=os.environ.get("LOG_LEVEL","INFO").upper()
 
-def setup_logger(name="ragbot"):
+
+def setup_logger(name="ragbot", level=LOG_LEVEL):
 
     logger=logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level)
 
     # Console handler
     ch=logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
+    ch.setLevel(level)
 
     # formatter
 
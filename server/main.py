@@ -1,15 +1,40 @@
 # server/main.py
 import os
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 from logger import logger
 
-from modules.policy_store import build_or_update_policy_store, load_policy_store, clear_policy_store, PERSIST_POLICY_DIR
-from modules.moderation import moderate_file_against_policy
+from modules.policy_store import (
+    build_or_update_policy_store, clear_policy_store, list_policy_documents, delete_policy_document,
+    list_namespaces, policy_dirs, DEFAULT_NAMESPACE, InvalidNamespace,
+)
+from modules.moderation import (
+    amoderate_file_against_policy, amoderate_chunks_stream, amoderate_documents, aiter_in_thread, aremoderate_document,
+)
+from modules.archive import moderation_archive
+from modules.pdf_handlers import SpooledUpload, SpooledBatch, BulkUploadError, shutdown_parse_pool
+from modules.runtime import runtime
+from modules.jobs import job_queue
+from modules.metrics import metrics, request_timings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load the embedding model, LLM client, policy store and index once per process
+    await run_in_threadpool(runtime.warm)
+    logger.info(f"Runtime warmed: {runtime.status()}")
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    shutdown_parse_pool()
 
-app = FastAPI(title="Content Moderation (Policy-based)")
+app = FastAPI(title="Content Moderation (Policy-based)", lifespan=lifespan)
 
 # allow frontend to access the backend
 app.add_middleware(
@@ -22,57 +47,385 @@ app.add_middleware(
 
 @app.middleware("http")
 async def catch_exception_middleware(request, call_next):
+    start = time.perf_counter()
+    status = 500
     try:
-        return await call_next(request)
+        response = await call_next(request)
+        status = response.status_code
+        return response
     except Exception as exc:
         logger.exception("UNHANDLED EXCEPTION")
         return JSONResponse(status_code=500, content={"error": str(exc)})
+    finally:
+        # label by route template so job IDs and filenames don't create new series
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.observe("http_request_seconds", time.perf_counter() - start,
+                        method=request.method, route=path, status=status)
 
 @app.get("/test")
 async def test():
     return {"message": "Moderation server is up and running!"}
 
+@app.get("/ready")
+async def ready():
+    """
+    Report whether the embedding model, policy store and chains are warm.
+    """
+    status = runtime.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus text exposition: stage and request latency histograms, LLM token counters,
+    verdict cache and pre-filter counters, and runtime gauges.
+    """
+    status = runtime.status()
+    metrics.set("runtime_ready", int(status["ready"]))
+    metrics.set("policy_chunks", status["policy_chunks"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _bad_namespace(e: InvalidNamespace):
+    return JSONResponse(status_code=400, content={"error": str(e)})
+
+def _empty_store(namespace: str):
+    if namespace == DEFAULT_NAMESPACE:
+        return JSONResponse(status_code=400, content={"error": "Policy store empty. Upload policy PDFs first."})
+    return JSONResponse(status_code=400, content={
+        "error": f"Policy store for namespace '{namespace}' empty. Upload policy PDFs first."
+    })
+
 @app.post("/upload_policy/")
-async def upload_policy(files: List[UploadFile] = File(...)):
+async def upload_policy(files: List[UploadFile] = File(...), namespace: str = DEFAULT_NAMESPACE):
     """
-    Upload one or more policy PDFs. These are persisted into the policy_store (Chroma).
+    Upload one or more policy PDFs. These are persisted into the namespace's policy store.
     """
     try:
-        logger.info(f"Received {len(files)} policy files for upload")
-        store = build_or_update_policy_store(files)
-        return {"message": "Policy files processed and stored", "policy_store_path": PERSIST_POLICY_DIR}
+        logger.info(f"Received {len(files)} policy files for upload to namespace '{namespace}'")
+        store_dir, _ = policy_dirs(namespace)
+
+        def update():
+            # parsing, embedding and persisting block, so they run in a worker thread
+            with runtime.writing(namespace):
+                store = build_or_update_policy_store(files, embeddings=runtime.embeddings, namespace=namespace)
+                runtime.swap(store, namespace)
+
+        await run_in_threadpool(update)
+        return {"message": "Policy files processed and stored", "namespace": namespace, "policy_store_path": store_dir}
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
     except Exception as e:
         logger.exception("Error during policy upload")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.get("/policies/")
+async def list_policies(namespace: str = DEFAULT_NAMESPACE):
+    """
+    List ingested policy files with their content hash and chunk count.
+    """
+    try:
+        return {"namespace": namespace, "policies": list_policy_documents(namespace)}
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
+
+@app.get("/namespaces/")
+async def namespaces():
+    """
+    List policy namespaces on disk and the ones currently loaded in memory.
+    """
+    return {"namespaces": list_namespaces(), "loaded": runtime.status()["namespaces_loaded"]}
+
+@app.delete("/policies/{filename}")
+async def delete_policy(filename: str, namespace: str = DEFAULT_NAMESPACE):
+    """
+    Remove a single policy file (its chunks and upload) from the namespace's policy store.
+    """
+    try:
+        def delete():
+            with runtime.writing(namespace):
+                store = delete_policy_document(filename, embeddings=runtime.embeddings, namespace=namespace)
+                runtime.swap(store, namespace)
+
+        await run_in_threadpool(delete)
+        return {"message": f"Policy {filename} deleted"}
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"error": f"Policy {filename} not found"})
+    except Exception as e:
+        logger.exception("Error deleting policy")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
 @app.post("/moderate/")
-async def moderate(current_file: UploadFile = File(...)):
+async def moderate(
+    current_file: UploadFile = File(...),
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    two_pass: Optional[bool] = None,
+    stop_on_first_violation: bool = False,
+    timings: bool = False,
+    namespace: str = DEFAULT_NAMESPACE,
+):
     """
-    Upload a single current file (PDF) to be checked against the persisted policy store.
+    Upload a single current file (PDF) to be checked against the namespace's persisted policy store.
     Returns a moderation verdict, any violations and sources.
+    `mode=batched` judges `batch_size` chunks per LLM call (defaults from the server config).
+    `two_pass=true` asks for labels first and explanations only for VIOLATION/REVIEW chunks.
+    `stop_on_first_violation` cancels remaining chunk work once a violation is found.
+    `timings=true` adds per-stage durations, token counts and cache/pre-filter hits.
     """
     try:
         # 1) Ensure policy store exists
         try:
-            policy_store = load_policy_store()
+            snapshot = await runtime.acurrent(namespace)
         except FileNotFoundError as fe:
-            return JSONResponse(status_code=400, content={"error": "Policy store empty. Upload policy PDFs first."})
+            return _empty_store(namespace)
+        except InvalidNamespace as e:
+            return _bad_namespace(e)
 
         # 2) Run moderation
-        result = moderate_file_against_policy(policy_store, current_file, k=3)
+        options = _moderation_options(snapshot, mode, batch_size, two_pass)
+        with request_timings() as request_spans:
+            result = await amoderate_file_against_policy(
+                snapshot.store, current_file, k=3, stop_on_first_violation=stop_on_first_violation,
+                archive_as=current_file.filename, **options
+            )
+        if timings:
+            result["timings"] = request_spans.as_dict()
         return result
     except Exception as e:
         logger.exception("Error during moderation")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.post("/moderate/bulk")
+async def moderate_bulk(
+    files: List[UploadFile] = File(...),
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    two_pass: Optional[bool] = None,
+    timings: bool = False,
+    namespace: str = DEFAULT_NAMESPACE,
+):
+    """
+    Moderate many PDFs in one request: send several files and/or ZIP archives of PDFs.
+    Chunks from all documents share one pipeline (batching, concurrency, deduplication).
+    Returns per-file results in the /moderate/ shape plus aggregate statistics.
+    """
+    try:
+        snapshot = await runtime.acurrent(namespace)
+    except FileNotFoundError:
+        return _empty_store(namespace)
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
+
+    try:
+        batch = await asyncio.to_thread(SpooledBatch, files)
+    except BulkUploadError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        logger.info(f"Bulk moderation of {len(batch.documents)} documents ({len(batch.rejected)} rejected)")
+        with request_timings() as request_spans:
+            result = await amoderate_documents(
+                snapshot.store, batch.documents, k=3, **_moderation_options(snapshot, mode, batch_size, two_pass)
+            )
+        result["results"] += [{"filename": name, "error": reason} for name, reason in batch.rejected]
+        result["aggregate"]["rejected_files"] = len(batch.rejected)
+        if timings:
+            result["timings"] = request_spans.as_dict()
+        return result
+    except Exception as e:
+        logger.exception("Error during bulk moderation")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    finally:
+        await asyncio.to_thread(batch.cleanup)
+
+@app.post("/moderate/stream")
+async def moderate_stream(
+    current_file: UploadFile = File(...),
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    two_pass: Optional[bool] = None,
+    stop_on_first_violation: bool = False,
+    namespace: str = DEFAULT_NAMESPACE,
+):
+    """
+    Streaming variant of /moderate/. Responds with NDJSON: one {"type": "chunk"} record per
+    chunk as soon as its verdict is ready, then a {"type": "summary"} record in the /moderate/ shape.
+    """
+    try:
+        snapshot = await runtime.acurrent(namespace)
+    except FileNotFoundError:
+        return _empty_store(namespace)
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
+
+    try:
+        # spool before streaming starts: the upload is closed once this handler returns
+        spool = await asyncio.to_thread(SpooledUpload, current_file)
+    except Exception as e:
+        logger.exception("Error reading file for moderation")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    async def ndjson():
+        try:
+            # the PDF is parsed page by page while earlier chunks are already being judged
+            async for record in amoderate_chunks_stream(
+                snapshot.store, aiter_in_thread(spool.iter_chunks), k=3,
+                stop_on_first_violation=stop_on_first_violation, archive_as=current_file.filename,
+                **_moderation_options(snapshot, mode, batch_size, two_pass)
+            ):
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            logger.exception("Error during streaming moderation")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/moderate/jobs")
+async def create_moderation_job(
+    current_file: UploadFile = File(...),
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    two_pass: Optional[bool] = None,
+    namespace: str = DEFAULT_NAMESPACE,
+):
+    """
+    Queue a PDF for background moderation and return its job ID immediately.
+    """
+    try:
+        snapshot = await runtime.acurrent(namespace)
+    except FileNotFoundError:
+        return _empty_store(namespace)
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
+    # the job runs against the namespace's snapshot at the time it starts
+    options = _moderation_options(snapshot, mode, batch_size, two_pass, resources=False)
+    job_id = await job_queue.submit(current_file, options)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/moderate/jobs")
+async def list_moderation_jobs(limit: int = 50, status: Optional[str] = None):
+    """
+    List recent jobs with their status and progress (results omitted).
+    """
+    return {"jobs": await asyncio.to_thread(job_queue.store.list, limit=limit, status=status)}
+
+@app.get("/moderate/jobs/{job_id}")
+async def get_moderation_job(job_id: str):
+    """
+    Poll a job: status, progress (chunks done / total) and, once done, the moderation result.
+    """
+    job = await asyncio.to_thread(job_queue.store.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job {job_id} not found"})
+    return job
+
+@app.post("/moderate/jobs/{job_id}/cancel")
+async def cancel_moderation_job(job_id: str):
+    """
+    Cancel a queued or running job.
+    """
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job {job_id} not found"})
+    return job
+
+def _moderation_options(snapshot, mode: Optional[str], batch_size: Optional[int], two_pass: Optional[bool] = None,
+                        resources: bool = True) -> dict:
+    """
+    Engine keyword arguments for a request against `snapshot`. Without `resources`, only the
+    request's own settings are returned (JSON-safe, as stored with a background job).
+    """
+    options = runtime.moderation_options(snapshot) if resources else {}
+    options["namespace"] = snapshot.namespace
+    options["mode"] = mode
+    if batch_size:
+        options["batch_size"] = batch_size
+    options["two_pass"] = two_pass
+    return options
+
+@app.get("/moderations/")
+async def list_moderations(namespace: Optional[str] = None, limit: int = 50):
+    """
+    List archived moderations (kept for /remoderate) with the policy version each was judged against.
+    """
+    return {"documents": await asyncio.to_thread(moderation_archive.list, namespace, limit)}
+
+@app.delete("/moderations/{document_id}")
+async def delete_moderation(document_id: str):
+    """
+    Remove an archived moderation (its chunk text, embeddings and verdicts).
+    """
+    if not await asyncio.to_thread(moderation_archive.delete, document_id):
+        return JSONResponse(status_code=404, content={"error": f"Moderation {document_id} not found"})
+    return {"message": "Moderation deleted", "document_id": document_id}
+
+@app.post("/remoderate")
+async def remoderate(
+    document_ids: Optional[List[str]] = Query(None),
+    namespace: str = DEFAULT_NAMESPACE,
+    force: bool = False,
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    two_pass: Optional[bool] = None,
+):
+    """
+    Re-check archived moderations after a policy change. Only chunks whose top-k policy
+    retrieval changed are sent to the LLM again; the rest keep their verdicts.
+    Defaults to every document in the namespace judged against an older policy version;
+    `document_ids` selects documents explicitly, and `force` re-checks current ones too.
+    """
+    try:
+        snapshot = await runtime.acurrent(namespace)
+    except FileNotFoundError:
+        return _empty_store(namespace)
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
+
+    if document_ids is None:
+        document_ids = await asyncio.to_thread(
+            moderation_archive.stale, namespace, None if force else snapshot.version
+        )
+    options = _moderation_options(snapshot, mode, batch_size, two_pass)
+    documents, missing, llm_calls = [], [], 0
+    try:
+        for document_id in document_ids:
+            try:
+                report = await aremoderate_document(document_id, snapshot.store, **options)
+            except KeyError:
+                missing.append(document_id)
+                continue
+            llm_calls += report["result"].get("llm_calls", 0)
+            documents.append(report)
+    except Exception as e:
+        logger.exception("Error during re-moderation")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    return {
+        "namespace": namespace,
+        "policy_version": snapshot.version,
+        "documents": documents,
+        "not_found": missing,
+        "rejudged_chunks": sum(d["rejudged_chunks"] for d in documents),
+        "reused_chunks": sum(d["reused_chunks"] for d in documents),
+        "llm_calls": llm_calls,
+    }
+
 @app.post("/clear_policy/")
-async def clear_policy():
+async def clear_policy(namespace: str = DEFAULT_NAMESPACE):
     """
-    Clear persistent policy store and uploaded policies.
+    Clear the namespace's persistent policy store and uploaded policies.
     """
     try:
-        clear_policy_store()
-        return {"message": "Policy store cleared"}
+        def clear():
+            with runtime.writing(namespace):
+                clear_policy_store(namespace)
+                runtime.clear(namespace)
+
+        await run_in_threadpool(clear)
+        return {"message": "Policy store cleared", "namespace": namespace}
+    except InvalidNamespace as e:
+        return _bad_namespace(e)
     except Exception as e:
         logger.exception("Error clearing policy store")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -0,0 +1,177 @@
+# server/modules/archive.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+MODERATION_ARCHIVE_PATH = os.environ.get("MODERATION_ARCHIVE_PATH", str(BASE_DIR / "moderation_archive.sqlite3"))
+# keep moderated documents (chunks, embeddings, retrieved policy IDs, verdicts) for /remoderate;
+# off by default, since it stores the text of every moderated document
+MODERATION_ARCHIVE_ENABLED = os.environ.get("MODERATION_ARCHIVE_ENABLED", "0") == "1"
+# archived documents not moderated (or re-moderated) for this many days are removed; 0 keeps them
+MODERATION_ARCHIVE_RETENTION_DAYS = float(os.environ.get("MODERATION_ARCHIVE_RETENTION_DAYS", 30))
+
+# (embedding, retrieved policy chunk IDs) per chunk position
+ChunkTrace = Tuple[np.ndarray, List[str]]
+
+
+class ModerationArchive:
+    """
+    SQLite record of moderated documents: every chunk with its embedding, the policy chunk
+    IDs retrieved for it and its outcome, plus the policy version it was judged against.
+    Documents untouched for `retention_days` are removed whenever another one is saved.
+    """
+
+    def __init__(self, path: str = MODERATION_ARCHIVE_PATH, retention_days: float = MODERATION_ARCHIVE_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, filename TEXT NOT NULL, namespace TEXT NOT NULL, k INTEGER NOT NULL, "
+                "policy_version TEXT NOT NULL, embedding_model TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "document_id TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+                "vector BLOB, policy_ids TEXT, outcome TEXT, PRIMARY KEY (document_id, position))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS documents_namespace ON documents(namespace, updated_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS documents_updated ON documents(updated_at)")
+            self._conn.commit()
+        return self._conn
+
+    def save(
+        self,
+        document_id: str,
+        filename: str,
+        namespace: str,
+        k: int,
+        policy_version: str,
+        embedding_model: str,
+        chunks: List[dict],
+        outcomes: List[Optional[dict]],
+        traces: Dict[int, ChunkTrace],
+    ):
+        now = time.time()
+        rows = []
+        for i, (chunk, outcome) in enumerate(zip(chunks, outcomes)):
+            vector, policy_ids = traces.get(i, (None, None))
+            rows.append((
+                document_id, i, chunk["page_content"], json.dumps(chunk["metadata"]),
+                None if vector is None else np.asarray(vector, dtype=np.float32).tobytes(),
+                None if policy_ids is None else json.dumps(policy_ids),
+                None if outcome is None else json.dumps(outcome),
+            ))
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_id, filename, namespace, k, policy_version, embedding_model, now, now),
+            )
+            conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            if self.retention_days > 0:
+                self._expire(conn, now - self.retention_days * 86400)
+            conn.commit()
+
+    def get(self, document_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM documents WHERE id = ?", (document_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, namespace: Optional[str] = None, limit: int = 50) -> list:
+        query = "SELECT d.*, COUNT(c.position) AS chunks FROM documents d LEFT JOIN chunks c ON c.document_id = d.id"
+        params = []
+        if namespace:
+            query += " WHERE d.namespace = ?"
+            params.append(namespace)
+        query += " GROUP BY d.id ORDER BY d.updated_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [dict(r) for r in rows]
+
+    def stale(self, namespace: str, policy_version: Optional[str] = None) -> List[str]:
+        """
+        IDs of the namespace's documents judged against another policy version (all of them if None).
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM documents WHERE namespace = ? AND policy_version != ? ORDER BY created_at",
+                (namespace, policy_version or ""),
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    def load_chunks(self, document_id: str):
+        """
+        Return (chunks, vectors, policy_ids, outcomes) in chunk order; entries are None
+        for empty chunks.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM chunks WHERE document_id = ? ORDER BY position", (document_id,)
+            ).fetchall()
+        chunks = [{"page_content": r["text"], "metadata": json.loads(r["metadata"])} for r in rows]
+        vectors = [None if r["vector"] is None else np.frombuffer(r["vector"], dtype=np.float32) for r in rows]
+        policy_ids = [None if r["policy_ids"] is None else json.loads(r["policy_ids"]) for r in rows]
+        outcomes = [None if r["outcome"] is None else json.loads(r["outcome"]) for r in rows]
+        return chunks, vectors, policy_ids, outcomes
+
+    def update(
+        self,
+        document_id: str,
+        policy_version: str,
+        embedding_model: str,
+        traces: Dict[int, ChunkTrace],
+        outcomes: Dict[int, dict],
+    ):
+        """
+        Record a re-moderation: new traces for the given positions, new outcomes for re-judged ones.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "UPDATE chunks SET vector = ?, policy_ids = ? WHERE document_id = ? AND position = ?",
+                [(np.asarray(v, dtype=np.float32).tobytes(), json.dumps(ids), document_id, i)
+                 for i, (v, ids) in traces.items()],
+            )
+            conn.executemany(
+                "UPDATE chunks SET outcome = ? WHERE document_id = ? AND position = ?",
+                [(json.dumps(o), document_id, i) for i, o in outcomes.items() if o is not None],
+            )
+            conn.execute(
+                "UPDATE documents SET policy_version = ?, embedding_model = ?, updated_at = ? WHERE id = ?",
+                (policy_version, embedding_model, time.time(), document_id),
+            )
+            conn.commit()
+
+    @staticmethod
+    def _expire(conn: sqlite3.Connection, cutoff: float) -> int:
+        conn.execute(
+            "DELETE FROM chunks WHERE document_id IN (SELECT id FROM documents WHERE updated_at < ?)", (cutoff,)
+        )
+        return conn.execute("DELETE FROM documents WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def delete(self, document_id: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            deleted = conn.execute("DELETE FROM documents WHERE id = ?", (document_id,)).rowcount
+            conn.commit()
+        return bool(deleted)
+
+
+moderation_archive = ModerationArchive()
@@ -0,0 +1,87 @@
+# server/modules/batching.py
+import re
+from typing import Dict, List, Sequence
+from modules.rate_limit import estimate_tokens
+
+SECTION_HEADER = "[{n}]"
+REPLY_LINE_RE = re.compile(r"^\s*\[?(\d+)\s*[\]\).:]*\s*(VIOLATION|REVIEW|OK)\b\s*[:\-]?\s*(.*)$", re.IGNORECASE)
+
+
+def format_sections(texts: Sequence[str]) -> str:
+    """
+    Render chunk texts as numbered sections (1-based) for the batch prompt.
+    """
+    return "\n\n".join(f"{SECTION_HEADER.format(n=i + 1)}\n{t}" for i, t in enumerate(texts))
+
+
+def split_sections(sections: str) -> List[str]:
+    """
+    Inverse of `format_sections`, used by the fake LLM.
+    """
+    parts = re.split(r"(?m)^\[(\d+)\]\n", sections)
+    return [parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)]
+
+
+def parse_batch_reply(reply: str, count: int) -> Dict[int, str]:
+    """
+    Parse a batch reply into {section index (0-based): 'LABEL: explanation'}.
+    Lines that don't start a section are appended to the previous section's explanation.
+    Out-of-range and repeated section numbers are ignored (first answer wins).
+    """
+    answers: Dict[int, str] = {}
+    current = None
+    for line in reply.splitlines():
+        m = REPLY_LINE_RE.match(line)
+        if m:
+            idx = int(m.group(1)) - 1
+            if 0 <= idx < count and idx not in answers:
+                answers[idx] = f"{m.group(2).upper()}: {m.group(3).strip()}".rstrip()
+                current = idx
+            else:
+                current = None
+        elif current is not None and line.strip():
+            answers[current] = f"{answers[current]} {line.strip()}"
+    return answers
+
+
+def pack_batches(items: Sequence[dict], batch_size: int, max_input_tokens: int, fixed_tokens: int) -> List[List[int]]:
+    """
+    Greedily group items into batches of at most `batch_size` whose estimated prompt
+    (fixed instructions + deduplicated policy context + section texts) fits `max_input_tokens`.
+    Each item has 'text' and 'docs' (retrieved policy documents). Returns lists of item positions.
+    A single item that exceeds the budget still gets its own batch.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    seen_docs = set()
+    used = fixed_tokens
+
+    for pos, item in enumerate(items):
+        new_docs = [d.page_content for d in item["docs"] if d.page_content not in seen_docs]
+        cost = estimate_tokens(item["text"]) + sum(estimate_tokens(d) for d in new_docs) + 4
+        if current and (len(current) >= batch_size or used + cost > max_input_tokens):
+            batches.append(current)
+            current, seen_docs, used = [], set(), fixed_tokens
+            new_docs = [d.page_content for d in item["docs"]]
+            cost = estimate_tokens(item["text"]) + sum(estimate_tokens(d) for d in new_docs) + 4
+        current.append(pos)
+        seen_docs.update(new_docs)
+        used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_context_docs(items: Sequence[dict]) -> list:
+    """
+    Union of the policy documents retrieved for a batch, first occurrence order.
+    """
+    seen = set()
+    docs = []
+    for item in items:
+        for d in item["docs"]:
+            if d.page_content not in seen:
+                seen.add(d.page_content)
+                docs.append(d)
+    return docs
@@ -0,0 +1,169 @@
+# server/modules/context_builder.py
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Sequence
+from modules.prefilter import tokenize
+from modules.rate_limit import estimate_tokens
+
+# Token budget for the policy context of one single-chunk call (batched calls get one per
+# section). 0 (the default) keeps whole snippets: trimming can cut the exception or condition
+# a verdict depends on, so it is opt-in; overlap merging and duplicate removal always apply.
+POLICY_CONTEXT_TOKEN_BUDGET = int(os.environ.get("POLICY_CONTEXT_TOKEN_BUDGET", 0))
+# word-shingle Jaccard similarity above which a snippet counts as a near-duplicate. 0 (the
+# default) drops only identical or contained snippets: clauses that differ in one word
+# ("may" / "may not") score close to 1.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", 0))
+# the policy splitter overlaps chunks by 100 characters; look a little further
+MAX_MERGE_OVERLAP = 200
+MIN_MERGE_OVERLAP = 20
+SHINGLE_SIZE = 3
+
+# part of the verdict cache key: changing how context is assembled changes verdicts
+CONTEXT_VERSION = f"ctx2-{POLICY_CONTEXT_TOKEN_BUDGET}-{NEAR_DUPLICATE_THRESHOLD:g}"
+
+SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+WORD_RE = re.compile(r"\w+")
+GAP = "..."
+
+
+@dataclass
+class PolicyContext:
+    text: str
+    tokens_before: int
+    tokens_after: int
+    snippets_in: int
+    snippets_out: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+
+def _overlap(a: str, b: str) -> int:
+    """
+    Length of the longest suffix of `a` that is a prefix of `b` (0 if shorter than MIN_MERGE_OVERLAP).
+    """
+    for n in range(min(len(a), len(b), MAX_MERGE_OVERLAP), MIN_MERGE_OVERLAP - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def merge_overlapping(texts: Sequence[str]) -> List[str]:
+    """
+    Stitch snippets that continue each other (the splitter's chunk overlap) into one,
+    and drop snippets fully contained in another. Keeps first-occurrence order.
+    """
+    merged: List[str] = []
+    for text in texts:
+        text = text.strip()
+        if not text or any(text in m for m in merged):
+            continue
+        merged = [m for m in merged if m not in text]
+        for n, m in enumerate(merged):
+            tail = _overlap(m, text)
+            if tail:
+                merged[n] = m + text[tail:]
+                break
+            head = _overlap(text, m)
+            if head:
+                merged[n] = text + m[head:]
+                break
+        else:
+            merged.append(text)
+    return merged
+
+
+def _shingles(text: str) -> set:
+    # every word counts, including stop words and numbers that the relevance tokenizer drops
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(texts: Sequence[str], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[str]:
+    if threshold <= 0:
+        return list(texts)
+    kept, kept_shingles = [], []
+    for text in texts:
+        shingles = _shingles(text)
+        if any(len(shingles & other) / max(1, len(shingles | other)) >= threshold for other in kept_shingles):
+            continue
+        kept.append(text)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _trim_to_budget(snippets: List[str], query_terms: set, budget: int) -> List[str]:
+    """
+    Keep the sentences sharing the most terms with the query, within `budget` tokens.
+    Every snippet keeps at least its best sentence (retrieval ranked it for a reason);
+    kept sentences stay in their original order, with gaps marked.
+    """
+    sentences = [[s for s in SENTENCE_RE.split(snippet) if s.strip()] for snippet in snippets]
+    scored = []
+    for n, snippet_sentences in enumerate(sentences):
+        for m, sentence in enumerate(snippet_sentences):
+            terms = set(tokenize(sentence))
+            score = len(terms & query_terms) / (len(terms) ** 0.5) if terms else 0.0
+            # ties go to earlier snippets (higher retrieval rank), then earlier sentences
+            scored.append((-score, n, m))
+    scored.sort()
+
+    keep = set()
+    used = 0
+    best_of = {}
+    for _, n, m in scored:
+        best_of.setdefault(n, m)
+    for n, m in best_of.items():
+        keep.add((n, m))
+        used += estimate_tokens(sentences[n][m])
+    for _, n, m in scored:
+        if (n, m) in keep:
+            continue
+        cost = estimate_tokens(sentences[n][m])
+        if used + cost > budget:
+            continue
+        keep.add((n, m))
+        used += cost
+
+    trimmed = []
+    for n, snippet_sentences in enumerate(sentences):
+        parts, last = [], None
+        for m, sentence in enumerate(snippet_sentences):
+            if (n, m) in keep:
+                if last is not None and m != last + 1:
+                    parts.append(GAP)
+                parts.append(sentence.strip())
+                last = m
+        if parts:
+            trimmed.append(" ".join(parts))
+    return trimmed
+
+
+def build_policy_context(docs, queries: Sequence[str], token_budget: int = POLICY_CONTEXT_TOKEN_BUDGET) -> PolicyContext:
+    """
+    Policy context for one LLM call: retrieved snippets in rank order with overlapping
+    neighbours merged, duplicates (and, if enabled, near-duplicates) dropped and, if
+    `token_budget` is set, trimmed to the sentences most relevant to `queries`.
+    Reports tokens before and after.
+    """
+    raw = [d.page_content for d in docs]
+    before = estimate_tokens("\n\n".join(raw)) if raw else 0
+    snippets = drop_near_duplicates(merge_overlapping(raw))
+    text = "\n\n".join(snippets)
+    if token_budget > 0 and estimate_tokens(text) > token_budget:
+        query_terms = set()
+        for query in queries:
+            query_terms.update(tokenize(query))
+        snippets = _trim_to_budget(snippets, query_terms, token_budget)
+        text = "\n\n".join(snippets)
+    return PolicyContext(
+        text=text,
+        tokens_before=before,
+        tokens_after=estimate_tokens(text) if text else 0,
+        snippets_in=len(raw),
+        snippets_out=len(snippets),
+    )
@@ -0,0 +1,104 @@
+# server/modules/dedup.py
+import asyncio
+import hashlib
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from modules.verdict_cache import normalize_text
+
+# Collapse repeated chunks (headers, footers, boilerplate) before retrieval and the LLM.
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "1") == "1"
+# max differing SimHash bits (of 64) for two chunks to count as near-duplicates; 0 = exact only.
+# Near-duplicate collapsing is opt-in: chunks differing in one word ("may" / "may not")
+# or one amount can land within a few bits and would share a verdict.
+DEDUP_SIMHASH_DISTANCE = int(os.environ.get("DEDUP_SIMHASH_DISTANCE", 0))
+# chunks with fewer word pairs than this only collapse on an exact match
+DEDUP_MIN_SHINGLES = 8
+
+_BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+# every word and number counts, including stopwords and negations
+SHINGLE_TOKEN_RE = re.compile(r"\w+")
+
+
+def exact_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash over word pairs of the lowercased, whitespace-normalized text.
+    Returns None for text too short to compare reliably.
+    """
+    words = SHINGLE_TOKEN_RE.findall(normalize_text(text))
+    shingles = [f"{words[i]} {words[i + 1]}" for i in range(len(words) - 1)]
+    if len(shingles) < DEDUP_MIN_SHINGLES:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    ones = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).sum(axis=0)
+    return sum(1 << int(bit) for bit in np.flatnonzero(ones * 2 > len(shingles)))
+
+
+class ChunkGroup:
+    """
+    Chunks judged as one: the representative's outcome resolves `outcome` for every member.
+    """
+
+    def __init__(self, chunk_id: Optional[str], fingerprint: Optional[int]):
+        self.chunk_id = chunk_id
+        self.fingerprint = fingerprint
+        self.outcome: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ChunkDeduplicator:
+    """
+    Groups exact (normalized-text hash) and near-duplicate (SimHash within `distance` bits)
+    chunks. Near-duplicate lookup splits the fingerprint into `distance + 1` bands: two
+    fingerprints within `distance` bits agree exactly on at least one band, so candidates
+    come from band buckets instead of a scan over every group.
+    One instance can span many windows (and documents) within one event loop.
+    """
+
+    def __init__(self, distance: int = DEDUP_SIMHASH_DISTANCE):
+        self.distance = max(0, distance)
+        self.bands = self.distance + 1
+        self.band_bits = 64 // self.bands
+        self._exact: Dict[str, ChunkGroup] = {}
+        self._buckets: Dict[Tuple[int, int], List[ChunkGroup]] = defaultdict(list)
+
+    def _band_keys(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        return [(b, (fingerprint >> (b * self.band_bits)) & mask) for b in range(self.bands)]
+
+    def _near(self, fingerprint: int) -> Optional[ChunkGroup]:
+        for key in self._band_keys(fingerprint):
+            for group in self._buckets.get(key, ()):
+                if bin(group.fingerprint ^ fingerprint).count("1") <= self.distance:
+                    return group
+        return None
+
+    def assign(self, text: str, chunk_id: Optional[str]) -> Tuple[ChunkGroup, bool]:
+        """
+        Return (group, is_new). A new group has this chunk as its representative.
+        """
+        key = exact_key(text)
+        group = self._exact.get(key)
+        fingerprint = None
+        if group is None and self.distance:
+            fingerprint = simhash(text)
+            if fingerprint is not None:
+                group = self._near(fingerprint)
+        if group is not None:
+            self._exact.setdefault(key, group)
+            return group, False
+
+        group = ChunkGroup(chunk_id, fingerprint)
+        self._exact[key] = group
+        if fingerprint is not None:
+            for band_key in self._band_keys(fingerprint):
+                self._buckets[band_key].append(group)
+        return group, True
@@ -0,0 +1,212 @@
+# server/modules/embedding_engine.py
+import os
+import time
+from pathlib import Path
+from typing import List, Sequence
+import numpy as np
+from modules.retrieval import EMBED_BATCH_SIZE, normalize_rows, top_k
+from logger import logger
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+EMBEDDING_MODEL = "all-MiniLM-L12-v2"
+# "torch" (sentence-transformers, the reference model), "torch-int8" (dynamically quantized
+# Linear layers), "onnx" (ONNX Runtime) or "onnx-int8" (ONNX Runtime, int8 weights).
+# Check drift with `python -m tools.embedding_parity --backend ...` before switching.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# intra-op threads for the encoder; 0 keeps the library default
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", 0))
+# all-MiniLM-L12-v2 truncates at 128 word pieces
+EMBED_MAX_LENGTH = int(os.environ.get("EMBED_MAX_LENGTH", 128))
+# exported and quantized ONNX models are cached here
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", str(BASE_DIR / "embedding_models"))
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+class _TorchEncoder:
+    def __init__(self, model_name: str, threads: int, quantize: bool):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name, device="cpu")
+        model.max_seq_length = EMBED_MAX_LENGTH
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+def export_onnx(hub_id: str, path: Path) -> Path:
+    """
+    Export the transformer to ONNX (token embeddings only; pooling runs in numpy).
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(hub_id)
+    model = AutoModel.from_pretrained(hub_id).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in names), str(path),
+            input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14,
+        )
+    logger.info(f"Exported {hub_id} to {path}")
+    return path
+
+
+def onnx_model_path(hub_id: str, quantize: bool) -> Path:
+    """
+    Path of the (optionally int8-quantized) ONNX model, exporting and quantizing on first use.
+    """
+    model_dir = Path(EMBEDDING_CACHE_DIR) / hub_id.replace("/", "__")
+    fp32 = model_dir / "model.onnx"
+    if not fp32.exists():
+        export_onnx(hub_id, fp32)
+    if not quantize:
+        return fp32
+    int8 = model_dir / "model.int8.onnx"
+    if not int8.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32), str(int8), weight_type=QuantType.QInt8)
+        logger.info(f"Quantized {fp32.name} to {int8.name}")
+    return int8
+
+
+class _OnnxEncoder:
+    def __init__(self, hub_id: str, threads: int, quantize: bool):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(onnx_model_path(hub_id, quantize)), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(hub_id)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=EMBED_MAX_LENGTH, return_tensors="np")
+        feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        # mean pooling over real tokens, as in the sentence-transformers model
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class EmbeddingEngine:
+    """
+    CPU embedding engine for policy and document chunks, usable wherever a LangChain
+    embeddings object is expected. Inputs are sorted by length before batching so each
+    batch pads to similar lengths, then returned in the caller's order, L2-normalized.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        backend: str = EMBEDDING_BACKEND,
+        batch_size: int = EMBED_BATCH_SIZE,
+        threads: int = EMBED_THREADS,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend} (expected one of {', '.join(BACKENDS)})")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        quantize = backend.endswith("-int8")
+        if backend.startswith("onnx"):
+            self._encoder = _OnnxEncoder(f"sentence-transformers/{model_name}", threads, quantize)
+        else:
+            self._encoder = _TorchEncoder(model_name, threads, quantize)
+        logger.info(f"Embedding engine ready: {model_name} on {backend} "
+                    f"(batch_size={self.batch_size}, threads={threads or 'default'})")
+
+    @property
+    def model_id(self) -> str:
+        """
+        Identity recorded in the policy manifest: quantized vectors are not interchangeable
+        with full-precision ones, so switching to or from int8 re-embeds the store.
+        """
+        return f"{self.model_name}+int8" if self.backend.endswith("-int8") else self.model_name
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts and return a normalized (n, dim) float32 matrix in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = None
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors = normalize_rows(self._encoder.encode([texts[i] for i in batch]))
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[batch] = vectors
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def reference_embeddings(model_name: str = EMBEDDING_MODEL):
+    """
+    The original LangChain HuggingFaceEmbeddings setup, used as the parity baseline.
+    """
+    from langchain.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def parity_check(engine, reference, texts: Sequence[str], k: int = 5) -> dict:
+    """
+    Compare an engine against the reference model on the same texts: per-text cosine
+    similarity between the two embeddings, and how often each text's k nearest
+    neighbours (within `texts`) agree. Also reports throughput of both.
+    """
+    texts = list(texts)
+    start = time.perf_counter()
+    ref = normalize_rows(np.array(reference.embed_documents(texts), dtype=np.float32))
+    ref_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    got = engine.encode(texts)
+    engine_seconds = time.perf_counter() - start
+
+    cosine = (ref * got).sum(axis=1)
+    k = min(k, len(texts) - 1)
+    agreement = None
+    if k > 0:
+        ref_scores, got_scores = ref @ ref.T, got @ got.T
+        np.fill_diagonal(ref_scores, -np.inf)
+        np.fill_diagonal(got_scores, -np.inf)
+        ref_top, got_top = top_k(ref_scores, k), top_k(got_scores, k)
+        agreement = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, got_top)]))
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "p01_cosine": float(np.percentile(cosine, 1)),
+        "max_drift": float(1.0 - cosine.min()),
+        "k": k,
+        "topk_agreement": agreement,
+        "reference_texts_per_s": round(len(texts) / ref_seconds, 1) if ref_seconds else None,
+        "engine_texts_per_s": round(len(texts) / engine_seconds, 1) if engine_seconds else None,
+    }
@@ -0,0 +1,66 @@
+# server/modules/fake_llm.py
+import asyncio
+import time
+from typing import Any, List, Optional
+from langchain.llms.base import LLM
+
+DEFAULT_VIOLATION_TERMS = ["hate", "kill", "violence", "slur"]
+DEFAULT_REVIEW_TERMS = ["weapon", "drugs", "confidential"]
+
+
+class FakeModerationLLM(LLM):
+    """
+    Local stand-in for the Groq model. Answers in the moderation prompt format by
+    keyword matching on the text under '=== TEXT TO CHECK ===', after `latency` seconds.
+    Label-only prompts (two-pass mode) get the label without an explanation.
+    Enable it with MODERATION_LLM=fake for tests and benchmarks.
+    """
+
+    latency: float = 0.0
+    violation_terms: List[str] = DEFAULT_VIOLATION_TERMS
+    review_terms: List[str] = DEFAULT_REVIEW_TERMS
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-moderation"
+
+    def judge(self, text: str) -> str:
+        lowered = text.lower()
+        for term in self.violation_terms:
+            if term in lowered:
+                return f"VIOLATION: text mentions '{term}'."
+        for term in self.review_terms:
+            if term in lowered:
+                return f"REVIEW: text mentions '{term}'."
+        return "OK: no policy-relevant content found."
+
+    def answer(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        self.calls += 1
+        judge = self.judge
+        if "label only" in prompt:
+            judge = lambda t: self.judge(t).split(":", 1)[0]
+        if "=== TEXT SECTIONS TO CHECK ===" in prompt:
+            from modules.batching import split_sections
+            sections = prompt.split("=== TEXT SECTIONS TO CHECK ===", 1)[-1]
+            sections = sections.split("Judge every section", 1)[0]
+            texts = split_sections(sections.strip() + "\n")
+            reply = "\n".join(f"[{i + 1}] {judge(t)}" for i, t in enumerate(texts))
+        else:
+            text = prompt.split("=== TEXT TO CHECK ===", 1)[-1]
+            text = text.split("Please respond", 1)[0]
+            reply = judge(text)
+        # like the API, cut the completion at the first stop sequence
+        for sequence in stop or []:
+            reply = reply.split(sequence, 1)[0]
+        return reply
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.answer(prompt, stop)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.answer(prompt, stop)
@@ -0,0 +1,175 @@
+# server/modules/flat_store.py
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from langchain.schema import Document
+from modules.retrieval import PolicyIndex, embed_texts, normalize_rows
+from logger import logger
+
+# precision of the persisted matrix: float16 halves the file and page-cache footprint
+FLAT_STORE_DTYPE = os.environ.get("FLAT_STORE_DTYPE", "float32")
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+FLAT_STORE_FILES = {VECTORS_FILE, CHUNKS_FILE}
+
+
+class FlatVectorStore:
+    """
+    Policy chunks as one memory-mapped, L2-normalized embedding matrix (`vectors.npy`) plus a
+    JSON side-car with IDs, texts and metadata (`chunks.json`). Queries are exact: one matrix
+    multiply per batch. Implements the part of the Chroma vectorstore API that
+    policy_store.py uses, so either backend can sit behind it.
+
+    Writes stay in memory until persist(), which rewrites both files atomically; that is
+    cheap at policy-corpus sizes (thousands of chunks).
+    """
+
+    def __init__(self, persist_directory: str, embedding_function=None, dtype: str = FLAT_STORE_DTYPE):
+        self.persist_directory = str(persist_directory)
+        self.dtype = np.dtype(dtype)
+        self._embedding_function = embedding_function
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.vectors = np.zeros((0, 0), dtype=self.dtype)
+        self._index: Optional[PolicyIndex] = None
+        self._load()
+
+    @staticmethod
+    def exists(persist_directory: str) -> bool:
+        return (Path(persist_directory) / CHUNKS_FILE).exists()
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def _load(self):
+        directory = Path(self.persist_directory)
+        self._index = None
+        if not self.exists(directory):
+            return
+        side_car = json.loads((directory / CHUNKS_FILE).read_text())
+        self.ids = side_car["ids"]
+        self.texts = side_car["texts"]
+        self.metadatas = side_car["metadatas"]
+        if self.ids:
+            # read-only mapping: pages are shared with every process that maps the same file
+            self.vectors = np.load(directory / VECTORS_FILE, mmap_mode="r")
+            if len(self.vectors) != len(self.ids):
+                raise ValueError(f"{VECTORS_FILE} has {len(self.vectors)} rows but {CHUNKS_FILE} lists {len(self.ids)} chunks")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Embed and add documents; existing IDs are replaced.
+        """
+        if not documents:
+            return []
+        if self._embedding_function is None:
+            raise ValueError("FlatVectorStore needs an embedding_function to add documents")
+        vectors = embed_texts(self._embedding_function, [d.page_content for d in documents])
+        return self.add_embeddings(
+            ids or [str(i) for i in range(len(self), len(self) + len(documents))],
+            [d.page_content for d in documents],
+            [d.metadata or {} for d in documents],
+            vectors,
+        )
+
+    def add_embeddings(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[dict],
+                       vectors: np.ndarray) -> List[str]:
+        """
+        Add precomputed embeddings (normalized here), e.g. when migrating from Chroma.
+        """
+        ids = list(ids)
+        existing = set(self.ids)
+        self.delete(ids=[i for i in ids if i in existing])
+        vectors = normalize_rows(vectors)
+        current = np.asarray(self.vectors, dtype=np.float32) if len(self) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        self.vectors = np.vstack([current, vectors])
+        self._index = None
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None):
+        if not ids:
+            return
+        drop = set(ids)
+        keep = [n for n, i in enumerate(self.ids) if i not in drop]
+        if len(keep) == len(self.ids):
+            return
+        self.vectors = np.asarray(self.vectors)[keep] if keep else np.zeros((0, self.vectors.shape[1]), dtype=self.dtype)
+        self.ids = [self.ids[n] for n in keep]
+        self.texts = [self.texts[n] for n in keep]
+        self.metadatas = [self.metadatas[n] for n in keep]
+        self._index = None
+
+    def persist(self):
+        """
+        Write the matrix and side-car to temporary files and swap them in, then remap.
+        """
+        directory = Path(self.persist_directory)
+        os.makedirs(directory, exist_ok=True)
+        tmp_vectors = directory / (VECTORS_FILE + ".tmp")
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=self.dtype))
+        tmp_chunks = directory / (CHUNKS_FILE + ".tmp")
+        tmp_chunks.write_text(json.dumps({
+            "ids": self.ids, "texts": self.texts, "metadatas": self.metadatas, "dtype": self.dtype.name,
+        }))
+        os.replace(tmp_vectors, directory / VECTORS_FILE)
+        os.replace(tmp_chunks, directory / CHUNKS_FILE)
+        logger.info(f"Flat policy store persisted with {len(self)} chunks ({self.dtype.name})")
+        self._load()
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, list]:
+        """
+        Chroma-style lookup by IDs and/or metadata equality (`where={"source": path}`).
+        """
+        rows = range(len(self))
+        if ids is not None:
+            wanted = set(ids)
+            rows = [n for n in rows if self.ids[n] in wanted]
+        if where:
+            rows = [n for n in rows if all(self.metadatas[n].get(key) == value for key, value in where.items())]
+        rows = list(rows)
+        data = {"ids": [self.ids[n] for n in rows]}
+        if "documents" in include:
+            data["documents"] = [self.texts[n] for n in rows]
+        if "metadatas" in include:
+            data["metadatas"] = [self.metadatas[n] for n in rows]
+        if "embeddings" in include:
+            data["embeddings"] = np.asarray(self.vectors[rows], dtype=np.float32) if rows else []
+        return data
+
+    def documents(self) -> List[Document]:
+        return [Document(page_content=t, metadata=md) for t, md in zip(self.texts, self.metadatas)]
+
+    def as_policy_index(self) -> PolicyIndex:
+        """
+        A PolicyIndex over the mapped matrix itself: rows are already normalized, so a
+        float32 store is searched in place without copying it into memory.
+        """
+        if self._index is None:
+            self._index = PolicyIndex(self.ids, self.vectors, self.documents(), normalized=True)
+        return self._index
+
+    def search(self, query_vectors: np.ndarray, k: int):
+        """
+        Exact top-k documents and cosine scores for a batch of normalized query vectors.
+        """
+        return self.as_policy_index().search_with_scores(query_vectors, k)
+
+    def similarity_search_with_score(self, query: str, k: int = 4):
+        docs, scores = self.search(normalize_rows(self._embedding_function.embed_query(query)), k)
+        return list(zip(docs[0], scores[0].tolist())) if docs else []
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
@@ -0,0 +1,287 @@
+# server/modules/jobs.py
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from modules.moderation import amoderate_chunk_iter, build_moderation_result, aiter_in_thread
+from modules.pdf_handlers import iter_pdf_chunks
+from modules.policy_store import DEFAULT_NAMESPACE
+from modules.runtime import runtime
+from logger import logger
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", str(BASE_DIR / "jobs.sqlite3"))
+JOB_UPLOAD_DIR = os.environ.get("JOB_UPLOAD_DIR", str(BASE_DIR / "job_uploads"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# write progress to the database at most this often (seconds)
+JOB_PROGRESS_INTERVAL = 1.0
+
+ACTIVE_STATES = ("queued", "running")
+FINAL_STATES = ("done", "failed", "cancelled")
+
+
+def judged_chunks(chunks) -> int:
+    """
+    Chunks that get an outcome (empty ones are skipped): the `total` of a job's progress.
+    """
+    return sum(1 for c in chunks if c["page_content"].strip())
+
+
+class JobStore:
+    """
+    SQLite persistence for moderation jobs: state, progress, options and results.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, filename TEXT NOT NULL, path TEXT NOT NULL, status TEXT NOT NULL, "
+            "options TEXT NOT NULL, total INTEGER, done INTEGER NOT NULL DEFAULT 0, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def create(self, job_id: str, filename: str, path: str, options: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, filename, path, status, options, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, filename, path, json.dumps(options), now, now),
+            )
+            self._conn.commit()
+
+    def update(self, job_id: str, only_if: Optional[str] = None, **fields) -> bool:
+        """
+        Update a job's fields; with `only_if`, only while the job is in that status.
+        Returns whether the job was updated.
+        """
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        query = f"UPDATE jobs SET {columns} WHERE id = ?"
+        params = (*fields.values(), job_id)
+        if only_if:
+            query += " AND status = ?"
+            params += (only_if,)
+        with self._lock:
+            updated = self._conn.execute(query, params).rowcount
+            self._conn.commit()
+        return bool(updated)
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row, include_result) if row else None
+
+    def list(self, limit: int = 50, status: Optional[str] = None) -> list:
+        query = "SELECT * FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._to_dict(r, include_result=False) for r in rows]
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATES
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, include_result: bool) -> dict:
+        job = {
+            "job_id": row["id"],
+            "filename": row["filename"],
+            "status": row["status"],
+            "options": json.loads(row["options"]),
+            "progress": {"done": row["done"], "total": row["total"]},
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if include_result:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
+
+
+class JobQueue:
+    """
+    Background moderation queue: uploads are saved to disk, recorded in the JobStore and
+    processed by `workers` asyncio workers. Jobs left queued or running by a previous
+    process are re-queued on start; chunks judged before the restart come back from the
+    verdict cache, so a resumed job only pays for unfinished work. With several server
+    processes sharing the database, only one should `resume` (serve.py picks the first).
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, store: Optional[JobStore] = None, resume: bool = True):
+        self.workers = workers
+        self.store = store
+        self.resume = resume
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._running = {}
+        self._stopping = False
+
+    async def start(self):
+        os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+        self.store = self.store or JobStore()
+        self._queue = asyncio.Queue()
+        for job_id in self.store.unfinished() if self.resume else []:
+            self.store.update(job_id, status="queued")
+            self._queue.put_nowait(job_id)
+        if self._queue.qsize():
+            logger.info(f"Resuming {self._queue.qsize()} unfinished moderation jobs")
+        self._sweep_uploads()
+        self._workers = [asyncio.create_task(self._worker(n)) for n in range(max(1, self.workers))]
+
+    async def stop(self):
+        # running jobs stay 'running' in the store and are resumed on next start
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, uploaded_file, options: dict) -> str:
+        """
+        Persist the upload and enqueue a job. Returns the job ID.
+        """
+        # disk and database writes go to a thread; the asyncio queue is only touched on the loop
+        job_id = await asyncio.to_thread(self._persist, uploaded_file, options)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def _persist(self, uploaded_file, options: dict) -> str:
+        job_id = uuid.uuid4().hex
+        path = Path(JOB_UPLOAD_DIR) / f"{job_id}.pdf"
+        with open(path, "wb") as f:
+            shutil.copyfileobj(uploaded_file.file, f)
+        self.store.create(job_id, uploaded_file.filename, str(path), options)
+        return job_id
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancel a queued or running job. Returns the updated job, or None if unknown.
+        With several server processes the job may belong to another one: it sees the
+        cancelled status on its next progress write (or when it dequeues the job), stops,
+        and removes the upload itself, since only the owner knows when it is done reading it.
+        """
+        job = await asyncio.to_thread(self.store.get, job_id, include_result=False)
+        if job is None or job["status"] in FINAL_STATES:
+            return job
+        for status in ACTIVE_STATES:
+            await asyncio.to_thread(self.store.update, job_id, only_if=status, status="cancelled")
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return await asyncio.to_thread(self.store.get, job_id, include_result=False)
+
+    async def _worker(self, n: int):
+        while True:
+            job_id = await self._queue.get()
+            job = await asyncio.to_thread(self.store.get, job_id, include_result=False)
+            if job is None or job["status"] != "queued":
+                if job is not None and job["status"] == "cancelled":
+                    self._remove_upload(str(Path(JOB_UPLOAD_DIR) / f"{job_id}.pdf"))
+                continue
+            task = asyncio.create_task(self._run(job_id))
+            self._running[job_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                if self._stopping or not task.cancelled():
+                    raise
+                logger.info(f"Moderation job {job_id} cancelled")
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _run(self, job_id: str):
+        row = await asyncio.to_thread(self.store.get, job_id, include_result=False)
+        path = str(Path(JOB_UPLOAD_DIR) / f"{job_id}.pdf")
+        if not await asyncio.to_thread(self.store.update, job_id, only_if="queued", status="running", done=0):
+            # cancelled between dequeue and start
+            self._remove_upload(path)
+            return
+        task = asyncio.current_task()
+        try:
+            job_options = dict(row["options"])
+            # jobs queued before namespaces existed ran against the default store
+            snapshot = await runtime.acurrent(job_options.pop("namespace", DEFAULT_NAMESPACE))
+            chunks = aiter_in_thread(lambda: iter_pdf_chunks(path, row["filename"]))
+            parsed = []
+            progress = {"done": 0, "written": 0.0, "write": None}
+
+            async def write_progress(done: int, total: int):
+                # a failed write means the job was cancelled, possibly through another server process
+                if not await asyncio.to_thread(self.store.update, job_id, only_if="running", done=done, total=total):
+                    task.cancel()
+
+            def on_outcome(i, outcome):
+                progress["done"] += 1
+                now = time.monotonic()
+                pending = progress["write"]
+                if now - progress["written"] >= JOB_PROGRESS_INTERVAL and (pending is None or pending.done()):
+                    progress["written"] = now
+                    # total grows while the PDF is still being parsed
+                    progress["write"] = asyncio.create_task(write_progress(progress["done"], judged_chunks(parsed)))
+
+            stats = {"llm_calls": 0}
+            options = {**runtime.moderation_options(snapshot), **job_options}
+            k = options.pop("k", 3)
+            parsed, outcomes = await amoderate_chunk_iter(
+                snapshot.store, chunks, k=k, stats=stats, on_outcome=on_outcome, collected=parsed,
+                archive_as=row["filename"], namespace=snapshot.namespace, **options
+            )
+            if progress["write"] is not None:
+                await progress["write"]
+            result = build_moderation_result(parsed, outcomes, **stats)
+            await asyncio.to_thread(
+                self.store.update, job_id, only_if="running", status="done",
+                done=progress["done"], total=judged_chunks(parsed), result=result,
+            )
+            self._remove_upload(path)
+        except asyncio.CancelledError:
+            # user cancellation drops the upload; shutdown keeps it so the job can resume
+            job = await asyncio.to_thread(self.store.get, job_id, include_result=False)
+            if job["status"] == "cancelled":
+                self._remove_upload(path)
+            raise
+        except Exception as e:
+            logger.exception(f"Moderation job {job_id} failed")
+            await asyncio.to_thread(self.store.update, job_id, only_if="running", status="failed", error=str(e))
+            self._remove_upload(path)
+
+    def _sweep_uploads(self):
+        """
+        Remove uploads left by finished jobs, e.g. one cancelled while queued in a process
+        that stopped before dequeuing it. Safe from any process: no final job is read again.
+        """
+        for name in os.listdir(JOB_UPLOAD_DIR):
+            job = self.store.get(Path(name).stem, include_result=False)
+            if job is not None and job["status"] in FINAL_STATES:
+                self._remove_upload(str(Path(JOB_UPLOAD_DIR) / name))
+
+    @staticmethod
+    def _remove_upload(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+job_queue = JobQueue()
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain.chains import RetrievalQA
@@ -7,6 +8,16 @@ from logger import logger
 
 load_dotenv()
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+# "groq" (default) or "fake" for the local stand-in in modules/fake_llm.py
+MODERATION_LLM = os.environ.get("MODERATION_LLM", "groq")
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", 0.0))
+MODERATION_MODEL = "llama-3.3-70b-versatile"
+# completion cap of the shared client; the engine also uses it to size rate-limit reservations
+LLM_MAX_TOKENS = 512
+# bump whenever MODERATION_PROMPT or BATCH_MODERATION_PROMPT change, to invalidate cached verdicts
+PROMPT_VERSION = "v1"
+# same for the two-pass prompts (VERDICT_PROMPT, BATCH_VERDICT_PROMPT, EXPLANATION_PROMPT)
+TWO_PASS_PROMPT_VERSION = "2p1"
 
 
 MODERATION_PROMPT = PromptTemplate(
@@ -26,17 +37,102 @@ MODERATION_PROMPT = PromptTemplate(
     )
 )
 
-def get_retrieval_qa_chain(vectorstore, k: int = 3, chain_type: str = "stuff"):
+@lru_cache(maxsize=None)
+def get_llm():
     """
-    Return a RetrievalQA chain using Groq LLM and the provided vectorstore retriever.
-    The LLM will follow the custom moderation prompt above.
+    Return the shared Groq chat client. The client is stateless, so one instance
+    (and its HTTP connection pool) serves every chain in the process.
     """
-    llm = ChatGroq(
+    if MODERATION_LLM == "fake":
+        from modules.fake_llm import FakeModerationLLM
+        return FakeModerationLLM(latency=FAKE_LLM_LATENCY)
+    return ChatGroq(
         groq_api_key=GROQ_API_KEY,
-        model_name="llama-3.3-70b-versatile",
+        model_name=MODERATION_MODEL,
         temperature=0.3,
-        max_tokens=512
+        max_tokens=LLM_MAX_TOKENS
+    )
+
+BATCH_MODERATION_PROMPT = PromptTemplate(
+    input_variables=["context", "sections", "count"],
+    template=(
+        "You are an AI content moderation system. Your task is to determine "
+        "if each of the numbered text sections below violates any of the company’s policy documents.\n\n"
+        "=== POLICY CONTEXT ===\n"
+        "{context}\n\n"
+        "=== TEXT SECTIONS TO CHECK ===\n"
+        "{sections}\n\n"
+        "Judge every section independently. Respond with exactly {count} lines, one per section, "
+        "in section order, STRICTLY in one of the following formats:\n"
+        "[<section number>] VIOLATION: <brief explanation of which policy it violates and why>\n"
+        "[<section number>] REVIEW: <brief explanation of why it needs human review>\n"
+        "[<section number>] OK: <brief reason why it is compliant>\n\n"
+        "Do not add any other text."
+    )
+)
+
+# Two-pass mode, first pass: the label alone, so OK chunks cost a few completion tokens
+VERDICT_PROMPT = PromptTemplate(
+    input_variables=["context", "question"],
+    template=(
+        "You are an AI content moderation system. Your task is to determine "
+        "if the given text violates any of the company’s policy documents.\n\n"
+        "=== POLICY CONTEXT ===\n"
+        "{context}\n\n"
+        "=== TEXT TO CHECK ===\n"
+        "{question}\n\n"
+        "Please respond with the label only: VIOLATION, REVIEW or OK.\n"
+        "Do not explain."
     )
+)
+
+BATCH_VERDICT_PROMPT = PromptTemplate(
+    input_variables=["context", "sections", "count"],
+    template=(
+        "You are an AI content moderation system. Your task is to determine "
+        "if each of the numbered text sections below violates any of the company’s policy documents.\n\n"
+        "=== POLICY CONTEXT ===\n"
+        "{context}\n\n"
+        "=== TEXT SECTIONS TO CHECK ===\n"
+        "{sections}\n\n"
+        "Judge every section independently. Respond with exactly {count} lines, one per section, "
+        "in section order, with the label only:\n"
+        "[<section number>] VIOLATION | REVIEW | OK\n\n"
+        "Do not explain and do not add any other text."
+    )
+)
+
+# Two-pass mode, second pass: only for chunks labeled VIOLATION or REVIEW
+EXPLANATION_PROMPT = PromptTemplate(
+    input_variables=["context", "question", "label"],
+    template=(
+        "You are an AI content moderation system. The text below was labeled {label} "
+        "against the company’s policy documents.\n\n"
+        "=== POLICY CONTEXT ===\n"
+        "{context}\n\n"
+        "=== TEXT TO CHECK ===\n"
+        "{question}\n\n"
+        "Please respond STRICTLY in the format '{label}: <brief explanation>', quoting or naming "
+        "the policy it relates to and explaining why.\n\n"
+        "Be concise but explicit in your reasoning."
+    )
+)
+
+def get_model_name() -> str:
+    return "fake-moderation" if MODERATION_LLM == "fake" else MODERATION_MODEL
+
+def format_policy_context(docs) -> str:
+    """
+    Join retrieved policy documents the same way the "stuff" chain does.
+    """
+    return "\n\n".join(d.page_content for d in docs)
+
+def get_retrieval_qa_chain(vectorstore, k: int = 3, chain_type: str = "stuff"):
+    """
+    Return a RetrievalQA chain using Groq LLM and the provided vectorstore retriever.
+    The LLM will follow the custom moderation prompt above.
+    """
+    llm = get_llm()
 
     retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": k})
 
@@ -57,13 +153,13 @@ def query_chain(chain, user_input: str):
     Run a moderation query against the RetrievalQA chain and return a formatted response.
     """
     try:
-        logger.debug(f"Running moderation chain for input: {user_input[:200]}...")
+        logger.debug("Running moderation chain for input: %.200s...", user_input)
         result = chain({"query": user_input})
         response = {
             "response": result["result"],
             "sources": [doc.metadata.get("source", "") for doc in result["source_documents"]]
         }
-        logger.debug(f"Chain response: {response}")
+        logger.debug("Chain response: %s", response)
         return response
     except Exception as e:
         logger.exception("Error in query_chain")
@@ -1,9 +1,8 @@
 import os
 from pathlib import Path
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from modules.pdf_handlers import save_upload, iter_pdf_documents
+from modules.embedding_engine import EmbeddingEngine
 
 PERSIST_DIR="./chroma_store"
 UPLOAD_DIR="./uploaded_pdfs"
@@ -14,19 +13,13 @@ def load_vectorstore(uploaded_files):
 
     for file in uploaded_files:
         save_path=Path(UPLOAD_DIR) / file.filename
-        with open(save_path, "wb") as f:
-            f.write(file.file.read())
-        file_paths.append(save_path)
+        file_paths.append(save_upload(file, save_path))
     
-    docs=[]
+    texts=[]
     for path in file_paths:
-        loader=PyPDFLoader(path)
-        docs.extend(loader.load())
-    
-    text_splitter=RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    texts=text_splitter.split_documents(docs)
+        texts.extend(iter_pdf_documents(path, chunk_size=1000, chunk_overlap=100))
 
-    embeddings=HuggingFaceEmbeddings(model_name="all-MiniLM-L12-v2")
+    embeddings=EmbeddingEngine("all-MiniLM-L12-v2")
 
     if os.path.exists(PERSIST_DIR) and os.listdir(PERSIST_DIR):
         vectorstore=Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
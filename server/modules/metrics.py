@@ -0,0 +1,180 @@
+# server/modules/metrics.py
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# histogram buckets (seconds) for stage and request durations
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+HELP = {
+    "moderation_stage_seconds": "Time spent per pipeline stage (upload_io, pdf_parse, split, embed, retrieve, llm_call, verdict_parse)",
+    "http_request_seconds": "HTTP request duration by route",
+    "llm_tokens_total": "LLM tokens by kind (prompt, completion)",
+    "llm_calls_total": "LLM calls made",
+    "verdict_cache_total": "Verdict cache lookups by result (hit, miss)",
+    "context_tokens_saved_total": "Policy-context tokens removed by merging, deduplication and trimming",
+    "collapsed_chunks_total": "Duplicate chunks that reused a representative's verdict",
+    "prefiltered_chunks_total": "Chunks marked OK by the relevance gate without an LLM call",
+    "moderated_chunks_total": "Chunks moderated by verdict",
+    "policy_chunks": "Policy chunks in the served snapshot",
+    "runtime_ready": "1 once the runtime is warm",
+}
+
+
+def _labels(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal process-wide counters, gauges and histograms rendered in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[LabelKey, float]] = defaultdict(dict)
+        self._histograms: Dict[str, Dict[LabelKey, list]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[name][_labels(labels)] += value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[name][_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                # per-bucket counts, then sum and count
+                series = self._histograms[name][key] = [0] * len(self.buckets) + [0.0, 0]
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[n] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, family in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(family.items()):
+                    lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} {kind}"]
+                    lines += [f"{name}{_format_labels(key)} {value:g}" for key, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                for key, values in sorted(series.items()):
+                    for bound, count in zip(self.buckets, values):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {values[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {values[-2]:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class RequestTimings:
+    """
+    Per-request accumulator for stage spans, token counts and cache/pre-filter hits.
+    Concurrent spans (e.g. parallel LLM calls) are summed, so stage totals can exceed wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages: Dict[str, list] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            total = self.stages.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "wall_ms": round((time.perf_counter() - self.started) * 1000, 3),
+                "stages": {
+                    stage: {"total_ms": round(seconds * 1000, 3), "count": count}
+                    for stage, (seconds, count) in self.stages.items()
+                },
+                **dict(self.counters),
+            }
+
+
+_current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def request_timings():
+    """
+    Collect spans for the current request; tasks and worker threads started inside inherit it.
+    """
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def observe_stage(stage: str, seconds: float):
+    metrics.observe("moderation_stage_seconds", seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a pipeline stage into the stage histogram and the current request's timings.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def count(name: str, value: int = 1, request_key: Optional[str] = None, **labels):
+    """
+    Increment a counter, and the current request's `request_key` counter if one is given.
+    """
+    if not value:
+        return
+    metrics.inc(name, value, **labels)
+    timings = _current_timings.get()
+    if timings is not None and request_key:
+        timings.count(request_key, value)
+
+
+def record_llm_usage(prompt_tokens: int, completion_tokens: int):
+    metrics.inc("llm_calls_total")
+    count("llm_tokens_total", prompt_tokens, request_key="prompt_tokens", kind="prompt")
+    count("llm_tokens_total", completion_tokens, request_key="completion_tokens", kind="completion")
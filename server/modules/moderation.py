@@ -1,115 +1,513 @@
-import tempfile
-from pathlib import Path
-from typing import List, Dict
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import random
+import threading
+import uuid
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple, Union
+import numpy as np
 from langchain.vectorstores import Chroma
-from modules.llm import get_retrieval_qa_chain
+from modules.llm import (
+    get_llm, get_model_name, LLM_MAX_TOKENS, MODERATION_PROMPT, BATCH_MODERATION_PROMPT, PROMPT_VERSION,
+    VERDICT_PROMPT, BATCH_VERDICT_PROMPT, EXPLANATION_PROMPT, TWO_PASS_PROMPT_VERSION,
+)
+from modules.rate_limit import RateLimiter, llm_limiter, estimate_tokens
+from modules.batching import format_sections, parse_batch_reply, pack_batches, batch_context_docs
+from modules.retrieval import PolicyIndex, embed_texts
+from modules.verdict_cache import VerdictCache, verdict_cache, make_cache_key, VERDICT_CACHE_ENABLED, CACHEABLE_VERDICTS
+from modules.policy_store import get_policy_store_version, embedding_model_id, DEFAULT_NAMESPACE
+from modules.archive import ModerationArchive, moderation_archive, ChunkTrace, MODERATION_ARCHIVE_ENABLED
+from modules.pdf_handlers import SpooledUpload, iter_pdf_chunks
+from modules.prefilter import PREFILTER_THRESHOLD, PREFILTER_LEXICAL_WEIGHT, LOW_RELEVANCE_EXPLANATION, relevance_scores
+from modules.metrics import span, count, record_llm_usage
+from modules.dedup import ChunkDeduplicator, DEDUP_ENABLED
+from modules.context_builder import build_policy_context, PolicyContext, POLICY_CONTEXT_TOKEN_BUDGET, CONTEXT_VERSION
 from logger import logger
 
-EMBEDDING_MODEL = "all-MiniLM-L12-v2"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 
+# Engine settings: max chunks in flight per document and retry policy for LLM calls
+MODERATION_CONCURRENCY = int(os.environ.get("MODERATION_CONCURRENCY", 8))
+MODERATION_MAX_RETRIES = int(os.environ.get("MODERATION_MAX_RETRIES", 3))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 1.0))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 30.0))
+
+# "single" sends one LLM call per chunk; "batched" packs several chunks into one call
+MODERATION_MODE = os.environ.get("MODERATION_MODE", "single")
+MODERATION_BATCH_SIZE = int(os.environ.get("MODERATION_BATCH_SIZE", 8))
+# input-token budget per batched call; keep it under the model context window and the TPM limit
+BATCH_MAX_INPUT_TOKENS = int(os.environ.get("BATCH_MAX_INPUT_TOKENS", 6000))
+BATCH_TOKENS_PER_VERDICT = 80
+# chunks handed to the engine at a time while the PDF is still being parsed
+MODERATION_WINDOW = int(os.environ.get("MODERATION_WINDOW", 32))
+
+# Two-pass mode: a label-only call per chunk (a few completion tokens), then an explanation
+# call only for chunks labeled VIOLATION or REVIEW
+MODERATION_TWO_PASS = os.environ.get("MODERATION_TWO_PASS", "0") == "1"
+VERDICT_MAX_TOKENS = 4
+VERDICT_STOP = ["\n", ":"]
+BATCH_TOKENS_PER_LABEL = 8
+FLAGGED_VERDICTS = ("violation", "review")
+
 def load_current_pdf_to_chunks(uploaded_file) -> List[dict]:
     """
     Save the uploaded PDF temporarily, load it, split into chunks, and return a list of dicts.
     Each dict contains:
         - page_content: text content of chunk
         - metadata: chunk metadata including chunk_id
+    The upload is copied in blocks and the temporary copy is removed afterwards.
+    """
+    with SpooledUpload(uploaded_file) as spool:
+        return load_pdf_path_to_chunks(spool.path, uploaded_file.filename)
+
+
+def load_pdf_path_to_chunks(path: str, filename: str) -> List[dict]:
+    """
+    Load a PDF already on disk and split it into chunk dicts with `filename`-based chunk IDs.
+    """
+    return list(iter_pdf_chunks(path, filename, CHUNK_SIZE, CHUNK_OVERLAP))
+
+
+async def aiter_in_thread(make_iter: Callable[[], Iterator], maxsize: int = 64) -> AsyncIterator:
+    """
+    Run a blocking generator in a worker thread and yield its items as they are produced.
+    The bounded queue applies backpressure, so a fast producer never runs far ahead.
+    Stopping early closes the generator in its thread (running its cleanup).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        iterator = make_iter()
+        try:
+            for item in iterator:
+                if stop.is_set() or not put(item):
+                    return
+            put(done)
+        except BaseException as e:
+            put(_ProducerError(e))
+        finally:
+            iterator.close()
+
+    # run in a copy of the caller's context so spans land in the request's timings
+    producer = loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, _ProducerError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        await asyncio.shield(producer)
+
+
+class _ProducerError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def parse_verdict(answer: str) -> str:
+    """
+    Map an LLM answer in the moderation prompt format to 'violation', 'review', 'ok' or 'unclear'.
+    """
+    answer_lower = answer.strip().lower()
+    for label in ("violation", "review", "ok"):
+        if answer_lower.startswith(label):
+            return label
+    return "unclear"
+
+
+async def call_with_retries(func, *args, max_retries: int = MODERATION_MAX_RETRIES, **kwargs):
+    """
+    Await `func(*args, **kwargs)`, retrying failures with exponential backoff and jitter.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+            delay *= 1 + random.random() * 0.25
+            logger.warning(f"LLM call failed ({e!r}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _outcome(answer: str, source_docs) -> dict:
+    with span("verdict_parse"):
+        verdict = parse_verdict(answer)
+    return {
+        "verdict": verdict,
+        "explanation": answer,
+        "sources": [d.metadata.get("source", "") for d in source_docs],
+    }
+
+
+def _token_usage(result, prompt: str, answer: str):
+    """
+    (prompt_tokens, completion_tokens) as reported by the provider, else estimated.
+    """
+    usage = getattr(result, "usage_metadata", None) or {}
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(result, "response_metadata", None) or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return estimate_tokens(prompt), estimate_tokens(answer)
+
+
+async def _ainvoke_llm(llm, prompt: str, limiter: RateLimiter, max_tokens: int, stop: Optional[List[str]] = None) -> str:
+    await limiter.acquire(estimate_tokens(prompt) + max_tokens)
+    bound = llm.bind(max_tokens=max_tokens, stop=stop) if stop else llm.bind(max_tokens=max_tokens)
+    with span("llm_call"):
+        result = await bound.ainvoke(prompt)
+    answer = getattr(result, "content", result).strip()
+    record_llm_usage(*_token_usage(result, prompt, answer))
+    return answer
+
+
+def _record_context_savings(context: PolicyContext, stats: Optional[dict]):
+    if stats is not None:
+        stats["context_tokens_saved"] = stats.get("context_tokens_saved", 0) + context.tokens_saved
+    count("context_tokens_saved_total", context.tokens_saved, request_key="context_tokens_saved")
+
+
+def _count_explanation(stats: Optional[dict]):
+    if stats is not None:
+        stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+        stats["explanation_calls"] = stats.get("explanation_calls", 0) + 1
+
+
+async def _aexplain(
+    llm, query_text: str, docs, label: str, limiter: RateLimiter,
+    stats: Optional[dict] = None, context: Optional[PolicyContext] = None,
+) -> dict:
+    """
+    Second pass of two-pass mode: ask for the explanation of a VIOLATION or REVIEW label.
+    The first-pass label stands even if the explanation starts with another one, or if
+    the explanation call still fails after its retries.
     """
-    temp_dir = tempfile.mkdtemp()
-    temp_path = Path(temp_dir) / uploaded_file.filename
-    with open(temp_path, "wb") as f:
-        f.write(uploaded_file.file.read())
+    context = context or build_policy_context(docs, [query_text])
+    prompt = EXPLANATION_PROMPT.format(context=context.text, question=query_text, label=label.upper())
+    try:
+        answer = await call_with_retries(_ainvoke_llm, llm, prompt, limiter, LLM_MAX_TOKENS)
+    except Exception as e:
+        logger.exception("Explanation call failed; keeping the label")
+        return _outcome(f"{label.upper()}: explanation unavailable ({e})", docs)
+    _record_context_savings(context, stats)
+    if parse_verdict(answer) != label:
+        answer = f"{label.upper()}: {answer}"
+    return _outcome(answer, docs)
 
-    loader = PyPDFLoader(str(temp_path))
-    docs = loader.load()
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP
+async def _ajudge_with_context(
+    llm, query_text: str, docs, limiter: RateLimiter, stats: Optional[dict] = None, two_pass: bool = False,
+) -> dict:
+    """
+    Judge one chunk against already-retrieved policy documents with the single-chunk prompt.
+    With `two_pass`, ask for the label alone first; only VIOLATION and REVIEW labels get a
+    second call for the explanation, and an unparseable label falls back to the full prompt.
+    Each LLM call is retried on its own, so a failing explanation never repeats the label call.
+    Raises once a label or full-prompt call has used up its retries.
+    """
+    context = build_policy_context(docs, [query_text])
+    if two_pass:
+        prompt = VERDICT_PROMPT.format(context=context.text, question=query_text)
+        label = parse_verdict(await call_with_retries(
+            _ainvoke_llm, llm, prompt, limiter, VERDICT_MAX_TOKENS, stop=VERDICT_STOP
+        ))
+        _record_context_savings(context, stats)
+        if label == "ok":
+            return _outcome("OK", docs)
+        if label in FLAGGED_VERDICTS:
+            _count_explanation(stats)
+            return await _aexplain(llm, query_text, docs, label, limiter, stats=stats, context=context)
+        # a second call, but a re-judgement rather than an explanation
+        if stats is not None:
+            stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+    prompt = MODERATION_PROMPT.format(context=context.text, question=query_text)
+    answer = await call_with_retries(_ainvoke_llm, llm, prompt, limiter, LLM_MAX_TOKENS)
+    _record_context_savings(context, stats)
+    return _outcome(answer, docs)
+
+
+async def aretrieve_policy_context(
+    index: PolicyIndex,
+    embeddings,
+    chunks: List[dict],
+    k: int = 3,
+    vectors: Optional[np.ndarray] = None,
+    on_retrieved: Optional[Callable[[int, np.ndarray, List[str]], None]] = None,
+):
+    """
+    Retrieval stage: embed every non-empty chunk with batched encoder calls (or take its
+    row of `vectors`, if given), then run one vectorized top-k query against the policy index.
+    Returns (retrieved, top_scores): the retrieved policy documents per chunk and the
+    best cosine similarity per chunk, in chunk order (None for empty chunks).
+    `on_retrieved(index, vector, policy_ids)` is called for every retrieved chunk.
+    """
+    positions = [i for i, c in enumerate(chunks) if c["page_content"].strip()]
+    texts = [chunks[i]["page_content"].strip() for i in positions]
+    retrieved: List[Optional[list]] = [None] * len(chunks)
+    top_scores: List[Optional[float]] = [None] * len(chunks)
+    if not texts:
+        return retrieved, top_scores
+
+    if vectors is None:
+        with span("embed"):
+            query_vectors = await asyncio.to_thread(embed_texts, embeddings, texts)
+    else:
+        query_vectors = np.asarray(vectors, dtype=np.float32)[positions]
+    with span("retrieve"):
+        best, scores = index.top_positions(query_vectors, k)
+    for n, pos in enumerate(positions):
+        retrieved[pos] = [index.documents[j] for j in best[n]]
+        top_scores[pos] = float(scores[n][0]) if len(best[n]) else 0.0
+        if on_retrieved:
+            on_retrieved(pos, query_vectors[n], [index.ids[j] for j in best[n]])
+    return retrieved, top_scores
+
+
+def apply_relevance_gate(
+    index: PolicyIndex,
+    chunks: List[dict],
+    retrieved: List[Optional[list]],
+    top_scores: List[Optional[float]],
+    threshold: float = PREFILTER_THRESHOLD,
+    lexical_weight: float = PREFILTER_LEXICAL_WEIGHT,
+) -> List[int]:
+    """
+    Triage tier ahead of the LLM: chunks whose combined dense/lexical policy relevance is
+    below `threshold` are dropped from `retrieved` (in place). Returns their positions.
+    """
+    if threshold <= 0:
+        return []
+    positions = [i for i, docs in enumerate(retrieved) if docs is not None]
+    if not positions:
+        return []
+    lexical = index.lexical if lexical_weight > 0 else None
+    scores = relevance_scores(
+        [top_scores[i] for i in positions],
+        [chunks[i]["page_content"] for i in positions],
+        lexical, lexical_weight,
     )
-    chunks = text_splitter.split_documents(docs)
+    gated = [i for i, score in zip(positions, scores) if score < threshold]
+    for i in gated:
+        retrieved[i] = None
+    return gated
 
-    chunk_dicts = []
-    for i, c in enumerate(chunks):
-        md = c.metadata.copy() if hasattr(c, "metadata") else {}
-        md["chunk_id"] = f"{uploaded_file.filename}::chunk_{i}"
-        chunk_dicts.append({"page_content": c.page_content, "metadata": md})
 
-    return chunk_dicts
+async def amoderate_chunks(
+    llm,
+    chunks: List[dict],
+    retrieved: List[Optional[list]],
+    concurrency: int = MODERATION_CONCURRENCY,
+    limiter: Optional[RateLimiter] = None,
+    stats: Optional[dict] = None,
+    on_outcome: Optional[Callable[[int, dict], None]] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    two_pass: bool = False,
+) -> List[Optional[dict]]:
+    """
+    Judge every chunk against its retrieved policy documents, with at most
+    `concurrency` LLM calls in flight (or a shared `semaphore`); see `_ajudge_with_context`
+    for `two_pass`.
+    Returns one outcome per chunk, in chunk order (None for empty chunks).
+    Each outcome has 'verdict', 'explanation' and 'sources'.
+    `on_outcome(index, outcome)` is called as soon as each chunk is judged.
+    """
+    limiter = limiter or llm_limiter
+    stats = stats if stats is not None else {}
+    semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+
+    async def run(idx: int, chunk: dict, docs: Optional[list]) -> Optional[dict]:
+        if docs is None:
+            return None
+        query_text = chunk["page_content"].strip()
+        async with semaphore:
+            logger.debug("Moderating chunk %d: len=%d", idx, len(query_text))
+            stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+            try:
+                outcome = await _ajudge_with_context(llm, query_text, docs, limiter, stats=stats, two_pass=two_pass)
+            except Exception as e:
+                logger.exception("Error when running moderation on chunk")
+                outcome = {"verdict": "error", "explanation": str(e), "sources": []}
+        if on_outcome:
+            on_outcome(idx, outcome)
+        return outcome
 
+    return await asyncio.gather(*(run(i, c, d) for i, (c, d) in enumerate(zip(chunks, retrieved))))
 
-def moderate_file_against_policy(policy_store: Chroma, uploaded_file, k: int = 3) -> Dict:
+
+async def amoderate_chunks_batched(
+    llm,
+    chunks: List[dict],
+    retrieved: List[Optional[list]],
+    batch_size: int = MODERATION_BATCH_SIZE,
+    max_input_tokens: int = BATCH_MAX_INPUT_TOKENS,
+    concurrency: int = MODERATION_CONCURRENCY,
+    limiter: Optional[RateLimiter] = None,
+    stats: Optional[dict] = None,
+    on_outcome: Optional[Callable[[int, dict], None]] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    two_pass: bool = False,
+) -> List[Optional[dict]]:
     """
-    For each chunk of the uploaded file:
-    - Retrieve top-k policy snippets from the policy store
-    - Use LLM (RetrievalQA) with custom moderation prompt to judge
-    - Parse 'VIOLATION', 'REVIEW', or 'OK' verdict
+    Batched moderation: pack chunks into numbered sections sharing one deduplicated
+    policy context, and parse the reply back into per-chunk verdicts. Sections missing
+    from a reply (or whole batches that fail) fall back to single-chunk calls.
+    With `two_pass`, the batch reply carries labels only and each VIOLATION or REVIEW
+    section gets its own explanation call.
+    Returns outcomes in chunk order (None for empty chunks).
+    `on_outcome(index, outcome)` is called as soon as each batch is judged.
+    """
+    limiter = limiter or llm_limiter
+    stats = stats if stats is not None else {}
+    semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+    outcomes: List[Optional[dict]] = [None] * len(chunks)
+
+    positions = [i for i, docs in enumerate(retrieved) if docs is not None]
+    items = [{"text": chunks[i]["page_content"].strip(), "docs": retrieved[i]} for i in positions]
+
+    batch_prompt = BATCH_VERDICT_PROMPT if two_pass else BATCH_MODERATION_PROMPT
+    tokens_per_verdict = BATCH_TOKENS_PER_LABEL if two_pass else BATCH_TOKENS_PER_VERDICT
+    fixed_tokens = estimate_tokens(batch_prompt.template)
+    batches = pack_batches(items, max(1, batch_size), max_input_tokens, fixed_tokens)
+    logger.debug(f"Packed {len(items)} chunks into {len(batches)} batches")
+
+    async def judge_single(pos: int, full_prompt: bool = False) -> dict:
+        item = items[pos]
+        async with semaphore:
+            stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+            try:
+                return await _ajudge_with_context(
+                    llm, item["text"], item["docs"], limiter, stats=stats, two_pass=two_pass and not full_prompt,
+                )
+            except Exception as e:
+                logger.exception("Error when running moderation on chunk")
+                return {"verdict": "error", "explanation": str(e), "sources": []}
+
+    async def explain_single(pos: int, label: str) -> dict:
+        item = items[pos]
+        async with semaphore:
+            _count_explanation(stats)
+            return await _aexplain(llm, item["text"], item["docs"], label, limiter, stats=stats)
+
+    async def judge_batch(batch: List[int]):
+        batch_items = [items[p] for p in batch]
+        answers = {}
+        replied = False
+        if len(batch) > 1:
+            context = build_policy_context(
+                batch_context_docs(batch_items), [it["text"] for it in batch_items],
+                token_budget=POLICY_CONTEXT_TOKEN_BUDGET * len(batch),
+            )
+            prompt = batch_prompt.format(
+                context=context.text,
+                sections=format_sections([it["text"] for it in batch_items]),
+                count=len(batch),
+            )
+            async with semaphore:
+                stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+                try:
+                    reply = await call_with_retries(
+                        _ainvoke_llm, llm, prompt, limiter, tokens_per_verdict * len(batch)
+                    )
+                    replied = True
+                    _record_context_savings(context, stats)
+                    with span("verdict_parse"):
+                        answers = parse_batch_reply(reply, len(batch))
+                except Exception:
+                    logger.exception("Batched moderation call failed; falling back to per-chunk calls")
+
+        missing = [p for n, p in enumerate(batch) if n not in answers]
+        if missing and len(batch) > 1:
+            stats["batch_fallbacks"] = stats.get("batch_fallbacks", 0) + len(missing)
+            logger.warning(f"Batch reply missing {len(missing)}/{len(batch)} verdicts; judging them individually")
+        # in a two-pass reply a section without a readable label had an unclear one: like
+        # single-chunk two-pass mode, it is re-judged with the full prompt, not asked again
+        full_prompt = two_pass and replied
+        flagged = [
+            (p, parse_verdict(answers[n])) for n, p in enumerate(batch)
+            if two_pass and n in answers and parse_verdict(answers[n]) in FLAGGED_VERDICTS
+        ]
+        redo = missing + [p for p, _ in flagged]
+        rejudged = await asyncio.gather(
+            *(judge_single(p, full_prompt=full_prompt) for p in missing),
+            *(explain_single(p, label) for p, label in flagged),
+        )
+
+        for n, p in enumerate(batch):
+            if n in answers:
+                # label-only replies parse as 'LABEL:'
+                answer = answers[n].rstrip(":") if two_pass else answers[n]
+                outcomes[positions[p]] = _outcome(answer, items[p]["docs"])
+        for p, outcome in zip(redo, rejudged):
+            outcomes[positions[p]] = outcome
+        if on_outcome:
+            for p in batch:
+                on_outcome(positions[p], outcomes[positions[p]])
+
+    await asyncio.gather(*(judge_batch(b) for b in batches))
+    return outcomes
+
+
+def chunk_record(chunk: dict, outcome: dict) -> dict:
     """
-    chunks = load_current_pdf_to_chunks(uploaded_file)
-    logger.debug(f"Split current file into {len(chunks)} chunks")
+    Per-chunk entry as it appears in the `violations` list (and in streamed records).
+    """
+    verdict = outcome["verdict"]
+    return {
+        "chunk_id": chunk["metadata"].get("chunk_id"),
+        "chunk_text": chunk["page_content"].strip()[:800],
+        "verdict": verdict,
+        "explanation": outcome["explanation"],
+        "sources": outcome["sources"] if verdict in ("violation", "review") else [],
+        **({"duplicate_of": outcome["duplicate_of"]} if "duplicate_of" in outcome else {}),
+    }
 
-    # Initialize the RetrievalQA chain with custom moderation prompt
-    chain = get_retrieval_qa_chain(policy_store, k=k, chain_type="stuff")
 
+def build_moderation_result(chunks: List[dict], outcomes: List[Optional[dict]], **extra) -> Dict:
+    """
+    Fold per-chunk outcomes into the /moderate/ response shape.
+    Any `extra` keyword arguments (engine statistics) are added to the response.
+    """
     violations = []
     allowed_count = 0
     review_count = 0
 
-    for idx, chunk in enumerate(chunks):
-        query_text = chunk["page_content"].strip()
-        if not query_text:
+    for chunk, outcome in zip(chunks, outcomes):
+        if outcome is None:
             continue
-
-        logger.debug(f"Moderating chunk {idx}: len={len(query_text)}")
-
-        try:
-            # Send chunk to LLM via RetrievalQA chain
-            result = chain({"query": query_text})
-            answer = result.get("result", "").strip()
-            source_docs = result.get("source_documents", [])
-
-            # Parse response based on updated prompt format
-            answer_lower = answer.lower()
-            if answer_lower.startswith("violation"):
-                violations.append({
-                    "chunk_id": chunk["metadata"].get("chunk_id"),
-                    "chunk_text": query_text[:800],
-                    "verdict": "violation",
-                    "explanation": answer,
-                    "sources": [d.metadata.get("source", "") for d in source_docs]
-                })
-            elif answer_lower.startswith("review"):
-                review_count += 1
-                violations.append({
-                    "chunk_id": chunk["metadata"].get("chunk_id"),
-                    "chunk_text": query_text[:800],
-                    "verdict": "review",
-                    "explanation": answer,
-                    "sources": [d.metadata.get("source", "") for d in source_docs]
-                })
-            elif answer_lower.startswith("ok"):
-                allowed_count += 1
-            else:
-                violations.append({
-                    "chunk_id": chunk["metadata"].get("chunk_id"),
-                    "chunk_text": query_text[:800],
-                    "verdict": "unclear",
-                    "explanation": answer,
-                    "sources": []
-                })
-
-        except Exception as e:
-            logger.exception("Error when running moderation chain on chunk")
-            violations.append({
-                "chunk_id": chunk["metadata"].get("chunk_id"),
-                "chunk_text": query_text[:800],
-                "verdict": "error",
-                "explanation": str(e),
-                "sources": []
-            })
+        verdict = outcome["verdict"]
+        if verdict == "ok":
+            allowed_count += 1
+            continue
+        if verdict == "review":
+            review_count += 1
+        violations.append(chunk_record(chunk, outcome))
 
     total_chunks = len(chunks)
     verdict = "clean" if not violations else "violation_found"
@@ -119,5 +517,541 @@ def moderate_file_against_policy(policy_store: Chroma, uploaded_file, k: int = 3
         "total_chunks": total_chunks,
         "allowed_chunks": allowed_count,
         "review_chunks": review_count,
-        "violations": violations
+        "violations": violations,
+        **extra
+    }
+
+
+async def amoderate_chunks_pipeline(
+    policy_store: Chroma,
+    chunks: List[dict],
+    k: int = 3,
+    index: Optional[PolicyIndex] = None,
+    embeddings=None,
+    llm=None,
+    concurrency: int = MODERATION_CONCURRENCY,
+    limiter: Optional[RateLimiter] = None,
+    mode: Optional[str] = None,
+    batch_size: int = MODERATION_BATCH_SIZE,
+    policy_version: Optional[str] = None,
+    namespace: str = DEFAULT_NAMESPACE,
+    cache: Optional[VerdictCache] = None,
+    stats: Optional[dict] = None,
+    on_outcome: Optional[Callable[[int, dict], None]] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    prefilter_threshold: float = PREFILTER_THRESHOLD,
+    dedup: Optional[ChunkDeduplicator] = None,
+    vectors: Optional[np.ndarray] = None,
+    on_retrieved: Optional[Callable[[int, np.ndarray, List[str]], None]] = None,
+    two_pass: Optional[bool] = None,
+) -> List[Optional[dict]]:
+    """
+    Moderate already-split chunks:
+    - Look up cached verdicts by chunk hash, prompt, model, k and policy-store version
+      (of `namespace`, unless `policy_version` is given)
+    - Collapse exact (and, if DEDUP_SIMHASH_DISTANCE > 0, near-) duplicate chunks: only one representative per group is judged,
+      and every member gets its verdict (`dedup` can be shared across windows and documents)
+    - Embed the remaining chunks in batches and retrieve top-k policy snippets in one vectorized query
+    - Mark chunks with low policy relevance OK without calling the LLM (if a threshold is set)
+    - Use the LLM with the moderation prompt to judge each chunk against its snippets
+      (`two_pass`: label first, explanation only for VIOLATION/REVIEW; default MODERATION_TWO_PASS)
+    - Parse 'VIOLATION', 'REVIEW', or 'OK' verdict
+    Returns outcomes in chunk order and fills `stats`. `on_outcome(index, outcome)` fires as
+    each chunk is decided; verdicts judged before a cancellation are still cached.
+    `vectors` (rows aligned with `chunks`) skips embedding; `on_retrieved` is passed to retrieval.
+    """
+    if index is None:
+        index = await asyncio.to_thread(PolicyIndex.from_store, policy_store)
+    embeddings = embeddings or policy_store.embeddings
+    llm = llm or get_llm()
+    policy_version = policy_version or get_policy_store_version(namespace)
+    if cache is None and VERDICT_CACHE_ENABLED:
+        cache = verdict_cache
+    stats = stats if stats is not None else {}
+    stats.setdefault("llm_calls", 0)
+    stats.setdefault("context_tokens_saved", 0)
+    stats.setdefault("collapsed_chunks", 0)
+    two_pass = MODERATION_TWO_PASS if two_pass is None else two_pass
+    if two_pass:
+        stats.setdefault("explanation_calls", 0)
+    prompt_version = f"{TWO_PASS_PROMPT_VERSION if two_pass else PROMPT_VERSION}/{CONTEXT_VERSION}"
+    if dedup is None and DEDUP_ENABLED:
+        dedup = ChunkDeduplicator()
+
+    outcomes: List[Optional[dict]] = [None] * len(chunks)
+    groups = {}
+
+    def record(i: int, outcome: dict):
+        outcomes[i] = outcome
+        count("moderated_chunks_total", verdict=outcome["verdict"])
+        group = groups.get(i)
+        if group is not None and not group.outcome.done():
+            group.outcome.set_result(outcome)
+        if on_outcome:
+            on_outcome(i, outcome)
+
+    async def copy_from(i: int, group):
+        outcome = await group.outcome
+        record(i, {**outcome, "duplicate_of": group.chunk_id})
+
+    keys = {}
+    for i, chunk in enumerate(chunks):
+        text = chunk["page_content"].strip()
+        if text:
+            keys[i] = make_cache_key(text, prompt_version, get_model_name(), k, policy_version)
+
+    hits = await asyncio.to_thread(cache.get_many, keys.values()) if cache else {}
+    pending = [i for i in keys if keys[i] not in hits]
+    cache_stats = stats.setdefault("cache", {"hits": 0, "misses": 0})
+    cache_stats["hits"] += len(keys) - len(pending)
+    cache_stats["misses"] += len(pending)
+    count("verdict_cache_total", len(keys) - len(pending), request_key="cache_hits", result="hit")
+    count("verdict_cache_total", len(pending), request_key="cache_misses", result="miss")
+    logger.debug(f"Verdict cache: {len(keys) - len(pending)} hits, {len(pending)} misses")
+    for i in keys:
+        if keys[i] in hits:
+            record(i, hits[keys[i]])
+
+    members = []
+    if dedup is not None:
+        representatives = []
+        for i in keys:
+            group, is_new = dedup.assign(chunks[i]["page_content"], chunks[i]["metadata"].get("chunk_id"))
+            if is_new:
+                groups[i] = group
+                if keys[i] in hits:
+                    group.outcome.set_result(hits[keys[i]])
+                else:
+                    representatives.append(i)
+            elif keys[i] not in hits:
+                members.append((i, group))
+        pending = representatives
+        stats["collapsed_chunks"] += len(members)
+        count("collapsed_chunks_total", len(members), request_key="collapsed_chunks")
+
+    pending_chunks = [chunks[i] for i in pending]
+    options = dict(concurrency=concurrency, limiter=limiter, stats=stats, semaphore=semaphore, two_pass=two_pass,
+                   on_outcome=lambda j, outcome: record(pending[j], outcome))
+    try:
+        retrieved, top_scores = await aretrieve_policy_context(
+            index, embeddings, pending_chunks, k=k,
+            vectors=vectors[pending] if vectors is not None else None,
+            on_retrieved=(lambda j, vector, ids: on_retrieved(pending[j], vector, ids)) if on_retrieved else None,
+        )
+        gated = apply_relevance_gate(index, pending_chunks, retrieved, top_scores, threshold=prefilter_threshold)
+        stats["prefiltered_chunks"] = stats.get("prefiltered_chunks", 0) + len(gated)
+        count("prefiltered_chunks_total", len(gated), request_key="prefiltered_chunks")
+        for j in gated:
+            record(pending[j], {"verdict": "ok", "explanation": LOW_RELEVANCE_EXPLANATION, "sources": [], "prefiltered": True})
+        if (mode or MODERATION_MODE) == "batched":
+            await amoderate_chunks_batched(llm, pending_chunks, retrieved, batch_size=batch_size, **options)
+        else:
+            await amoderate_chunks(llm, pending_chunks, retrieved, **options)
+        # representatives in earlier or concurrent windows resolve their members here
+        await asyncio.gather(*(copy_from(i, group) for i, group in members))
+    finally:
+        # members elsewhere must not wait on a representative that will never be judged
+        for group in groups.values():
+            if not group.outcome.done():
+                group.outcome.cancel()
+        # gate decisions depend on the threshold, not the LLM, so they are not cached
+        if cache:
+            # the write runs to completion in its thread even if this task is cancelled again
+            await asyncio.to_thread(cache.put_many, {
+                keys[i]: outcomes[i] for i in pending
+                if outcomes[i] is not None and not outcomes[i].get("prefiltered")
+            })
+
+    return outcomes
+
+
+async def amoderate_chunk_iter(
+    policy_store: Chroma,
+    chunks: Union[List[dict], AsyncIterator[dict]],
+    k: int = 3,
+    window: int = MODERATION_WINDOW,
+    concurrency: int = MODERATION_CONCURRENCY,
+    stats: Optional[dict] = None,
+    on_outcome: Optional[Callable[[int, dict], None]] = None,
+    collected: Optional[List[dict]] = None,
+    archive_as: Optional[str] = None,
+    namespace: str = DEFAULT_NAMESPACE,
+    traces: Optional[Dict[int, ChunkTrace]] = None,
+    **options,
+):
+    """
+    Moderate chunks as they arrive: every `window` chunks are handed to
+    `amoderate_chunks_pipeline` while parsing continues, with one shared concurrency cap.
+    Chunks are appended to `collected` (a new list by default) as they are read.
+    With `archive_as` (a filename), the document is kept in the moderation archive for
+    /remoderate and its ID is added to `stats["document_id"]`. A `traces` dict collects
+    each retrieved chunk's (embedding, policy IDs) for callers that archive themselves.
+    Returns (chunks, outcomes), both in chunk order.
+    """
+    if isinstance(chunks, list):
+        chunks = _aiter_list(chunks)
+    if options.get("index") is None:
+        options["index"] = await asyncio.to_thread(PolicyIndex.from_store, policy_store)
+    options["policy_version"] = options.get("policy_version") or get_policy_store_version(namespace)
+    if options.get("dedup") is None and DEDUP_ENABLED:
+        # one deduplicator for all windows, so boilerplate repeated on every page is judged once
+        options["dedup"] = ChunkDeduplicator()
+    stats = stats if stats is not None else {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    all_chunks: List[dict] = collected if collected is not None else []
+    outcomes: List[Optional[dict]] = []
+    tasks = []
+    archive = archive_as is not None and MODERATION_ARCHIVE_ENABLED
+    collect_traces = archive or traces is not None
+    traces = traces if traces is not None else {}
+
+    async def run_window(offset: int, window_chunks: List[dict]):
+        def forward(i, outcome):
+            if on_outcome:
+                on_outcome(offset + i, outcome)
+
+        def trace(i, vector, policy_ids):
+            traces[offset + i] = (vector, policy_ids)
+
+        result = await amoderate_chunks_pipeline(
+            policy_store, window_chunks, k=k, namespace=namespace, concurrency=concurrency, stats=stats,
+            on_outcome=forward, semaphore=semaphore, on_retrieved=trace if collect_traces else None, **options,
+        )
+        outcomes[offset:offset + len(result)] = result
+
+    def flush(buffer: List[dict]):
+        tasks.append(asyncio.create_task(run_window(len(all_chunks) - len(buffer), buffer)))
+
+    try:
+        buffer: List[dict] = []
+        async for chunk in chunks:
+            all_chunks.append(chunk)
+            outcomes.append(None)
+            buffer.append(chunk)
+            if len(buffer) >= max(1, window):
+                flush(buffer)
+                buffer = []
+        if buffer:
+            flush(buffer)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    logger.debug(f"Moderated {len(all_chunks)} chunks in {len(tasks)} windows")
+    if archive:
+        stats["document_id"] = await aarchive_moderation(
+            archive_as, namespace, all_chunks, outcomes, traces, k=k, index=options["index"],
+            embeddings=options.get("embeddings") or policy_store.embeddings,
+            policy_version=options["policy_version"],
+        )
+    return all_chunks, outcomes
+
+
+async def amoderate_documents(
+    policy_store: Chroma,
+    documents: List[Tuple[str, str]],
+    k: int = 3,
+    namespace: str = DEFAULT_NAMESPACE,
+    archive: bool = True,
+    **options,
+) -> Dict:
+    """
+    Bulk moderation of (filename, path) PDFs through one shared pipeline: chunks from every
+    document flow through the same windows, concurrency cap, rate limiter, batches and
+    deduplicator, so a batch or a collapsed duplicate can span documents. Files are parsed
+    one after another in a worker thread while earlier chunks are judged; a file that fails
+    to parse is reported without stopping the rest.
+    Returns {"results": [per-file result in the /moderate/ shape], "aggregate": {...}}.
+    """
+    owners: List[int] = []
+    errors: Dict[int, str] = {}
+
+    def produce():
+        for n, (filename, path) in enumerate(documents):
+            try:
+                for chunk in iter_pdf_chunks(path, filename, CHUNK_SIZE, CHUNK_OVERLAP):
+                    yield n, chunk
+            except Exception as e:
+                logger.warning(f"Could not parse {filename}: {e!r}")
+                errors[n] = str(e)
+
+    async def chunks():
+        async for n, chunk in aiter_in_thread(produce):
+            owners.append(n)
+            yield chunk
+
+    stats = {"llm_calls": 0}
+    traces: Dict[int, ChunkTrace] = {}
+    archive = archive and MODERATION_ARCHIVE_ENABLED
+    if options.get("index") is None:
+        options["index"] = await asyncio.to_thread(PolicyIndex.from_store, policy_store)
+    options["policy_version"] = options.get("policy_version") or get_policy_store_version(namespace)
+    all_chunks, outcomes = await amoderate_chunk_iter(
+        policy_store, chunks(), k=k, namespace=namespace, stats=stats, traces=traces if archive else None, **options
+    )
+
+    positions: Dict[int, List[int]] = {n: [] for n in range(len(documents))}
+    for i, n in enumerate(owners):
+        positions[n].append(i)
+    results = []
+    for n, (filename, _) in enumerate(documents):
+        if n in errors:
+            results.append({"filename": filename, "error": errors[n]})
+            continue
+        file_chunks = [all_chunks[i] for i in positions[n]]
+        file_outcomes = [outcomes[i] for i in positions[n]]
+        result = {"filename": filename, **build_moderation_result(file_chunks, file_outcomes)}
+        if archive:
+            result["document_id"] = await aarchive_moderation(
+                filename, namespace, file_chunks, file_outcomes,
+                {j: traces[i] for j, i in enumerate(positions[n]) if i in traces}, k=k,
+                index=options["index"], embeddings=options.get("embeddings") or policy_store.embeddings,
+                policy_version=options["policy_version"],
+            )
+        results.append(result)
+
+    moderated = [r for r in results if "error" not in r]
+    aggregate = {
+        "verdict": "violation_found" if any(r["verdict"] == "violation_found" for r in moderated) else "clean",
+        "files": len(documents),
+        "failed_files": len(errors),
+        "files_with_violations": sum(1 for r in moderated if r["verdict"] == "violation_found"),
+        "total_chunks": len(all_chunks),
+        "allowed_chunks": sum(r["allowed_chunks"] for r in moderated),
+        "review_chunks": sum(r["review_chunks"] for r in moderated),
+        "violation_chunks": sum(
+            1 for r in moderated for v in r["violations"] if v["verdict"] == "violation"
+        ),
+        **stats,
     }
+    return {"results": results, "aggregate": aggregate}
+
+
+async def aarchive_moderation(
+    filename: str,
+    namespace: str,
+    chunks: List[dict],
+    outcomes: List[Optional[dict]],
+    traces: Dict[int, ChunkTrace],
+    k: int,
+    index: PolicyIndex,
+    embeddings,
+    policy_version: str,
+    archive: Optional[ModerationArchive] = None,
+) -> str:
+    """
+    Store a moderated document for delta re-moderation and return its document ID.
+    Chunks that skipped retrieval (cache hits, collapsed duplicates) reuse the trace of a
+    chunk with the same text; the others are embedded and retrieved here, so every chunk
+    has a trace.
+    """
+    archive = archive or moderation_archive
+    first = {chunks[i]["page_content"].strip(): i for i in traces}
+    missing, copies = [], []
+    for i, c in enumerate(chunks):
+        text = c["page_content"].strip()
+        if not text or i in traces:
+            continue
+        if text in first:
+            copies.append((i, first[text]))
+        else:
+            first[text] = i
+            missing.append(i)
+    if missing:
+        await aretrieve_policy_context(
+            index, embeddings, [chunks[i] for i in missing], k=k,
+            on_retrieved=lambda j, vector, ids: traces.__setitem__(missing[j], (vector, ids)),
+        )
+    for i, source in copies:
+        if source in traces:
+            traces[i] = traces[source]
+    document_id = uuid.uuid4().hex
+    await asyncio.to_thread(
+        archive.save, document_id, filename, namespace, k, policy_version,
+        embedding_model_id(embeddings), chunks, outcomes, traces,
+    )
+    logger.debug(f"Archived {filename} as {document_id} ({len(missing)} chunks traced after moderation)")
+    return document_id
+
+
+async def aremoderate_document(
+    document_id: str,
+    policy_store: Chroma,
+    index: PolicyIndex,
+    embeddings,
+    policy_version: str,
+    namespace: str = DEFAULT_NAMESPACE,
+    archive: Optional[ModerationArchive] = None,
+    **options,
+) -> dict:
+    """
+    Delta re-moderation of an archived document against the current policy snapshot.
+    Stored chunk embeddings are re-queried against the new index in one vectorized search;
+    only chunks whose top-k policy chunk IDs changed (or whose last outcome was not a
+    definite verdict) go back through the pipeline. The rest keep their verdicts.
+    Raises KeyError for documents not archived under `namespace`.
+    """
+    archive = archive or moderation_archive
+    doc = await asyncio.to_thread(archive.get, document_id)
+    if doc is None or doc["namespace"] != namespace:
+        raise KeyError(document_id)
+    chunks, stored_vectors, old_ids, outcomes = await asyncio.to_thread(archive.load_chunks, document_id)
+    k = doc["k"]
+    model_id = embedding_model_id(embeddings)
+    positions = [i for i, c in enumerate(chunks) if c["page_content"].strip()]
+
+    traces: Dict[int, ChunkTrace] = {}
+    matrix = None
+    if positions and doc["embedding_model"] == model_id and all(stored_vectors[i] is not None for i in positions):
+        dim = len(stored_vectors[positions[0]])
+        matrix = np.stack([v if v is not None else np.zeros(dim, dtype=np.float32) for v in stored_vectors])
+    # without usable stored vectors (e.g. another embedding model) every chunk is re-embedded
+    await aretrieve_policy_context(
+        index, embeddings, chunks, k=k, vectors=matrix,
+        on_retrieved=lambda i, vector, ids: traces.__setitem__(i, (vector, ids)),
+    )
+
+    changed = [
+        i for i in positions
+        if set(traces[i][1]) != set(old_ids[i] or [])
+        or outcomes[i] is None or outcomes[i]["verdict"] not in CACHEABLE_VERDICTS
+    ]
+    stats = {"llm_calls": 0}
+    rejudged = []
+    if changed:
+        rejudged = await amoderate_chunks_pipeline(
+            policy_store, [chunks[i] for i in changed], k=k, index=index, embeddings=embeddings,
+            policy_version=policy_version, stats=stats,
+            vectors=np.stack([traces[i][0] for i in changed]), **options,
+        )
+
+    verdict_changes = []
+    for i, outcome in zip(changed, rejudged):
+        before = outcomes[i]["verdict"] if outcomes[i] else None
+        if outcome is not None and outcome["verdict"] != before:
+            verdict_changes.append({
+                "chunk_id": chunks[i]["metadata"].get("chunk_id"), "before": before, "after": outcome["verdict"],
+            })
+        outcomes[i] = outcome
+    await asyncio.to_thread(
+        archive.update, document_id, policy_version, model_id, traces, dict(zip(changed, rejudged)),
+    )
+    logger.info(f"Re-moderated {doc['filename']} ({document_id}): {len(changed)}/{len(positions)} chunks re-judged")
+    return {
+        "document_id": document_id,
+        "filename": doc["filename"],
+        "rejudged_chunks": len(changed),
+        "reused_chunks": len(positions) - len(changed),
+        "verdict_changes": verdict_changes,
+        "result": build_moderation_result(chunks, outcomes, **stats),
+    }
+
+
+async def _aiter_list(items: List[dict]) -> AsyncIterator[dict]:
+    for item in items:
+        yield item
+
+
+async def amoderate_chunks_stream(
+    policy_store: Chroma,
+    chunks: Union[List[dict], AsyncIterator[dict]],
+    k: int = 3,
+    stop_on_first_violation: bool = False,
+    **options,
+) -> AsyncIterator[dict]:
+    """
+    Yield a {"type": "chunk", "index": ..., **chunk_record} record as each chunk is judged
+    (completion order), then one {"type": "summary", ...} record in the /moderate/ response shape.
+    `chunks` may be a list or an async iterator still being parsed.
+    With `stop_on_first_violation`, pending chunk work is cancelled once a VIOLATION is seen.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    stats = {"llm_calls": 0}
+    all_chunks: List[dict] = []
+    seen: Dict[int, dict] = {}
+    task = asyncio.create_task(amoderate_chunk_iter(
+        policy_store, chunks, k=k, stats=stats, collected=all_chunks,
+        on_outcome=lambda i, outcome: queue.put_nowait((i, outcome)), **options,
+    ))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+
+    stopped_early = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            i, outcome = item
+            seen[i] = outcome
+            yield {"type": "chunk", "index": i, **chunk_record(all_chunks[i], outcome)}
+            if stop_on_first_violation and outcome["verdict"] == "violation":
+                stopped_early = True
+                break
+    finally:
+        if not task.done():
+            task.cancel()
+            logger.debug("Cancelled pending chunk moderation")
+
+    if stopped_early:
+        # outcomes decided before the stop but not yet emitted (e.g. a window's cache hits)
+        # are reported too; only chunks never judged count as skipped
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                i, outcome = item
+                seen[i] = outcome
+                yield {"type": "chunk", "index": i, **chunk_record(all_chunks[i], outcome)}
+        # chunks parsed after the stop are never read, so totals cover what was parsed
+        outcomes = [seen.get(i) for i in range(len(all_chunks))]
+    else:
+        # surface pipeline failures (retrieval errors etc.) instead of a partial summary
+        all_chunks, outcomes = task.result()
+
+    summary = build_moderation_result(all_chunks, outcomes, **stats)
+    if stop_on_first_violation:
+        summary["stopped_early"] = stopped_early
+        summary["skipped_chunks"] = sum(
+            1 for c, o in zip(all_chunks, outcomes) if o is None and c["page_content"].strip()
+        )
+    yield {"type": "summary", **summary}
+
+
+async def amoderate_file_against_policy(
+    policy_store: Chroma,
+    uploaded_file,
+    k: int = 3,
+    stop_on_first_violation: bool = False,
+    **options,
+) -> Dict:
+    """
+    Async moderation engine for an uploaded PDF. The upload is spooled to a temporary
+    file and parsed page by page in a worker thread; chunks are moderated in windows
+    while parsing continues. Chunks are judged concurrently (bounded by `concurrency`
+    and the rate limiter); results keep chunk order. `mode="batched"` packs `batch_size`
+    chunks per LLM call. Pass the runtime's `index`, `embeddings`, `llm` and
+    `policy_version` to avoid rebuilding them.
+    """
+    spool = await asyncio.to_thread(SpooledUpload, uploaded_file)
+    chunks = aiter_in_thread(spool.iter_chunks)
+
+    if stop_on_first_violation:
+        summary = {}
+        async for record in amoderate_chunks_stream(policy_store, chunks, k=k, stop_on_first_violation=True, **options):
+            summary = record
+        summary.pop("type", None)
+        return summary
+
+    stats = {"llm_calls": 0}
+    all_chunks, outcomes = await amoderate_chunk_iter(policy_store, chunks, k=k, stats=stats, **options)
+    logger.debug(f"Split current file into {len(all_chunks)} chunks")
+    return build_moderation_result(all_chunks, outcomes, **stats)
+
+
+def moderate_file_against_policy(policy_store: Chroma, uploaded_file, k: int = 3, **kwargs) -> Dict:
+    """
+    Synchronous wrapper around `amoderate_file_against_policy` for scripts and tests.
+    """
+    return asyncio.run(amoderate_file_against_policy(policy_store, uploaded_file, k=k, **kwargs))
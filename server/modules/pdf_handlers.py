@@ -1,18 +1,273 @@
 import os
 import shutil
-from fastapi import UploadFile
 import tempfile
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from fastapi import UploadFile
+from pypdf import PdfReader
+from langchain.schema import Document
+from langchain.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from modules.metrics import span
 
 UPLOAD_DIR = "./uploaded_pdfs"
+COPY_BLOCK_SIZE = 1 << 20
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# Parallel parsing: PDFs with more pages than the threshold are split into page ranges
+# and extracted in a process pool; 0 or 1 workers disables it.
+PDF_PARSE_WORKERS = int(os.environ.get("PDF_PARSE_WORKERS", os.cpu_count() or 1))
+PAGES_PER_TASK = int(os.environ.get("PAGES_PER_TASK", 16))
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get("PARALLEL_PAGE_THRESHOLD", 32))
+
+# Bulk moderation limits: files per request (after expanding ZIPs) and total extracted bytes
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", 1000))
+BULK_MAX_BYTES = int(os.environ.get("BULK_MAX_BYTES", 2 * 1024 ** 3))
+
+_parse_pool = None
+
+def save_upload(file: UploadFile, save_path) -> str:
+    """
+    Copy an upload to disk in fixed-size blocks (never holding the whole file in memory).
+    """
+    with span("upload_io"), open(save_path, "wb") as f:
+        shutil.copyfileobj(file.file, f, COPY_BLOCK_SIZE)
+    return str(save_path)
 
 def save_uploaded_files(files:list[UploadFile]) -> list[str]:
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     file_paths = []
-    
+
     for file in files:
         save_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(save_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        file_paths.append(save_path)
-    
-    return file_paths
\ No newline at end of file
+        file_paths.append(save_upload(file, save_path))
+
+    return file_paths
+
+class SpooledUpload:
+    """
+    An upload copied into a private temporary directory, removed by cleanup() or on exit.
+    """
+
+    def __init__(self, file: UploadFile):
+        self.filename = file.filename
+        self._dir = tempfile.TemporaryDirectory(prefix="moderate_")
+        self.path = save_upload(file, Path(self._dir.name) / Path(file.filename).name)
+
+    def iter_chunks(self) -> Iterator[dict]:
+        """
+        Yield chunk dicts while parsing, then remove the temporary copy
+        (also when the consumer stops early and the generator is closed).
+        """
+        try:
+            yield from iter_pdf_chunks(self.path, self.filename)
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        self._dir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+class BulkUploadError(ValueError):
+    pass
+
+class SpooledBatch:
+    """
+    Several uploads spooled into one private temporary directory for bulk moderation.
+    ZIP archives are expanded: each PDF member becomes a document named `archive.zip/member.pdf`.
+    `documents` holds (filename, path) pairs in upload order; `rejected` holds
+    (filename, reason) for entries that are not PDFs.
+    Raises BulkUploadError for corrupt archives or when the batch exceeds the limits.
+    """
+
+    def __init__(self, files: List[UploadFile], max_files: int = BULK_MAX_FILES, max_bytes: int = BULK_MAX_BYTES):
+        self._dir = tempfile.TemporaryDirectory(prefix="moderate_bulk_")
+        self.documents: List[Tuple[str, str]] = []
+        self.rejected: List[Tuple[str, str]] = []
+        self._max_files = max_files
+        self._bytes_left = max_bytes
+        try:
+            for file in files:
+                name = file.filename or "upload"
+                if name.lower().endswith(".zip"):
+                    self._add_zip(file, name)
+                elif name.lower().endswith(".pdf"):
+                    self._add(name, file.file)
+                else:
+                    self.rejected.append((name, "not a PDF or ZIP file"))
+        except BaseException:
+            self.cleanup()
+            raise
+
+    def _add(self, filename: str, source):
+        if len(self.documents) >= self._max_files:
+            raise BulkUploadError(f"Too many files: at most {self._max_files} PDFs per request")
+        # numbered names keep same-named files (e.g. from different archives) apart
+        path = Path(self._dir.name) / f"{len(self.documents)}_{Path(filename).name}"
+        with span("upload_io"), open(path, "wb") as f:
+            shutil.copyfileobj(source, f, COPY_BLOCK_SIZE)
+        self._bytes_left -= path.stat().st_size
+        if self._bytes_left < 0:
+            raise BulkUploadError("Upload too large: extracted files exceed BULK_MAX_BYTES")
+        self.documents.append((filename, str(path)))
+
+    def _add_zip(self, file: UploadFile, name: str):
+        archive_path = Path(self._dir.name) / "archive.zip"
+        with span("upload_io"), open(archive_path, "wb") as f:
+            shutil.copyfileobj(file.file, f, COPY_BLOCK_SIZE)
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                for info in archive.infolist():
+                    member = info.filename
+                    if info.is_dir() or member.startswith("__MACOSX/") or Path(member).name.startswith("."):
+                        continue
+                    if not member.lower().endswith(".pdf"):
+                        self.rejected.append((f"{name}/{member}", "not a PDF file"))
+                        continue
+                    if info.file_size > self._bytes_left:
+                        raise BulkUploadError("Upload too large: extracted files exceed BULK_MAX_BYTES")
+                    with archive.open(info) as src:
+                        self._add(f"{name}/{member}", src)
+        except zipfile.BadZipFile as e:
+            raise BulkUploadError(f"{name} is not a valid ZIP archive: {e}") from e
+        finally:
+            archive_path.unlink(missing_ok=True)
+
+    def cleanup(self):
+        self._dir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+def iter_pdf_pages(path: str):
+    """
+    Yield one langchain Document per PDF page without loading the whole file.
+    """
+    yield from PyPDFLoader(str(path)).lazy_load()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for PDF parsing. Workers are spawned (not forked) so they don't
+    inherit the server's model weights, threads or locks.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
+
+def pdf_page_count(path: str) -> int:
+    return len(PdfReader(str(path)).pages)
+
+def page_ranges(num_pages: int, pages_per_task: int = PAGES_PER_TASK) -> List[range]:
+    return [range(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+
+def _split_page_range(path: str, start: int, stop: int, chunk_size: int, chunk_overlap: int) -> List[tuple]:
+    """
+    Process-pool task: extract pages [start, stop) and split them per page.
+    Page metadata mirrors PyPDFLoader ({"source", "page"}). Returns (text, metadata) pairs.
+    """
+    reader = PdfReader(path)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    out = []
+    for i in range(start, stop):
+        page = Document(page_content=reader.pages[i].extract_text(), metadata={"source": path, "page": i})
+        out.extend((c.page_content, c.metadata) for c in text_splitter.split_documents([page]))
+    return out
+
+def iter_pdf_documents_parallel(path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP, num_pages: int = None):
+    """
+    Split one PDF in page ranges across the process pool, yielding chunk Documents in page
+    order as each range completes. At most two ranges per worker are in flight.
+    """
+    path = str(path)
+    num_pages = num_pages if num_pages is not None else pdf_page_count(path)
+    pool = get_parse_pool()
+    ranges = deque(page_ranges(num_pages))
+    pending = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < 2 * PDF_PARSE_WORKERS:
+                r = ranges.popleft()
+                pending.append(pool.submit(_split_page_range, path, r.start, r.stop, chunk_size, chunk_overlap))
+            # workers parse and split together, so the wait is recorded as pdf_parse
+            with span("pdf_parse"):
+                parsed = pending.popleft().result()
+            for text, md in parsed:
+                yield Document(page_content=text, metadata=md)
+    finally:
+        for future in pending:
+            future.cancel()
+
+def iter_pdf_documents(path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Split a PDF page by page, yielding chunk Documents as they are produced.
+    The splitter works per document, so this matches splitting the fully loaded page list.
+    Large PDFs are parsed in page ranges on the process pool; output order is unchanged.
+    """
+    if PDF_PARSE_WORKERS > 1:
+        num_pages = pdf_page_count(path)
+        if num_pages > PARALLEL_PAGE_THRESHOLD:
+            yield from iter_pdf_documents_parallel(path, chunk_size, chunk_overlap, num_pages)
+            return
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    pages = iter_pdf_pages(path)
+    while True:
+        with span("pdf_parse"):
+            page = next(pages, None)
+        if page is None:
+            return
+        with span("split"):
+            chunks = text_splitter.split_documents([page])
+        yield from chunks
+
+def parse_pdfs_parallel(paths: List[str], chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Dict[str, List[Document]]:
+    """
+    Split several PDFs at once: every file's page ranges go to the process pool together,
+    so a multi-file upload uses all workers. Returns {path: chunk Documents in page order}.
+    """
+    if PDF_PARSE_WORKERS <= 1 or not paths:
+        return {p: list(iter_pdf_documents(p, chunk_size, chunk_overlap)) for p in paths}
+
+    pool = get_parse_pool()
+    futures = {}
+    for p in paths:
+        p = str(p)
+        futures[p] = [
+            pool.submit(_split_page_range, p, r.start, r.stop, chunk_size, chunk_overlap)
+            for r in page_ranges(pdf_page_count(p))
+        ]
+    with span("pdf_parse"):
+        return {
+            p: [Document(page_content=text, metadata=md) for f in fs for text, md in f.result()]
+            for p, fs in futures.items()
+        }
+
+def iter_pdf_chunks(path: str, filename: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[dict]:
+    """
+    Yield chunk dicts ({"page_content", "metadata"}) with sequential `filename::chunk_i` IDs.
+    """
+    for i, c in enumerate(iter_pdf_documents(path, chunk_size, chunk_overlap)):
+        md = c.metadata.copy() if hasattr(c, "metadata") else {}
+        md["chunk_id"] = f"{filename}::chunk_{i}"
+        yield {"page_content": c.page_content, "metadata": md}
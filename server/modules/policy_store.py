@@ -1,84 +1,306 @@
 # server/modules/policy_store.py
 import os
+import re
+import json
+import time
+import uuid
+import hashlib
 from pathlib import Path
 import shutil
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from modules.pdf_handlers import save_upload, parse_pdfs_parallel
+from modules.flat_store import FlatVectorStore, FLAT_STORE_FILES
+from modules.embedding_engine import EmbeddingEngine, EMBEDDING_MODEL
+from modules.metrics import span
+from logger import logger
 
 BASE_DIR = Path(__file__).resolve().parents[1]
-PERSIST_POLICY_DIR = str(BASE_DIR / "policy_store")
-POLICY_UPLOAD_DIR = str(BASE_DIR / "uploaded_policies")
+PERSIST_POLICY_DIR = os.environ.get("POLICY_STORE_DIR", str(BASE_DIR / "policy_store"))
+POLICY_UPLOAD_DIR = os.environ.get("POLICY_UPLOAD_DIR", str(BASE_DIR / "uploaded_policies"))
+# each non-default namespace keeps its own store and uploads under POLICY_NAMESPACES_DIR/<namespace>/
+POLICY_NAMESPACES_DIR = os.environ.get("POLICY_NAMESPACES_DIR", str(BASE_DIR / "policy_namespaces"))
 
 os.makedirs(POLICY_UPLOAD_DIR, exist_ok=True)
 os.makedirs(PERSIST_POLICY_DIR, exist_ok=True)
 
-EMBEDDING_MODEL = "all-MiniLM-L12-v2"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 
-def save_policy_files(uploaded_files) -> list[str]:
+# vector store backend: "chroma" (default) or "flat" (memory-mapped exact index, see flat_store.py);
+# convert existing Chroma stores (every namespace) with `python -m tools.migrate_policy_store`
+POLICY_STORE_BACKEND = os.environ.get("POLICY_STORE_BACKEND", "chroma")
+
+# bookkeeping files kept next to the Chroma data; they don't count as store contents
+VERSION_FILE = "VERSION"
+MANIFEST_FILE = "manifest.json"
+METADATA_FILES = {VERSION_FILE, MANIFEST_FILE}
+
+# the default namespace is the original single store, so existing deployments keep working
+DEFAULT_NAMESPACE = "default"
+NAMESPACE_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+class InvalidNamespace(ValueError):
+    pass
+
+def policy_dirs(namespace: str = DEFAULT_NAMESPACE) -> tuple[str, str]:
+    """
+    Return (store directory, upload directory) for a policy namespace.
+    Raises InvalidNamespace for names that are not safe as a directory name.
+    """
+    if namespace == DEFAULT_NAMESPACE:
+        return PERSIST_POLICY_DIR, POLICY_UPLOAD_DIR
+    if not NAMESPACE_RE.match(namespace or ""):
+        raise InvalidNamespace(
+            f"Invalid policy namespace {namespace!r}: use 1-64 letters, digits, '-' or '_'"
+        )
+    root = Path(POLICY_NAMESPACES_DIR) / namespace
+    return str(root / "policy_store"), str(root / "uploaded_policies")
+
+def list_namespaces() -> list[str]:
+    """
+    Namespaces that have a policy store or uploads on disk (the default one always counts).
+    """
+    names = {DEFAULT_NAMESPACE}
+    if os.path.isdir(POLICY_NAMESPACES_DIR):
+        names.update(n for n in os.listdir(POLICY_NAMESPACES_DIR) if NAMESPACE_RE.match(n))
+    return sorted(names)
+
+def _store_exists(namespace: str = DEFAULT_NAMESPACE) -> bool:
+    store_dir, _ = policy_dirs(namespace)
+    if POLICY_STORE_BACKEND == "flat":
+        return FlatVectorStore.exists(store_dir) and len(FlatVectorStore(store_dir)) > 0
+    return os.path.exists(store_dir) and any(
+        name not in METADATA_FILES | FLAT_STORE_FILES for name in os.listdir(store_dir)
+    )
+
+def open_policy_store(embeddings, namespace: str = DEFAULT_NAMESPACE):
+    """
+    Open the namespace's policy vector store with the configured backend.
+    """
+    store_dir, _ = policy_dirs(namespace)
+    if POLICY_STORE_BACKEND == "flat":
+        return FlatVectorStore(store_dir, embedding_function=embeddings)
+    if POLICY_STORE_BACKEND != "chroma":
+        raise ValueError(f"Unknown POLICY_STORE_BACKEND: {POLICY_STORE_BACKEND}")
+    return Chroma(persist_directory=store_dir, embedding_function=embeddings)
+
+def get_policy_store_version(namespace: str = DEFAULT_NAMESPACE) -> str:
+    """
+    Return a token that changes whenever the policy store is built, updated or cleared.
+    """
+    path = Path(policy_dirs(namespace)[0]) / VERSION_FILE
+    if path.exists():
+        return path.read_text().strip()
+    return "initial"
+
+def bump_policy_store_version(namespace: str = DEFAULT_NAMESPACE) -> str:
+    version = uuid.uuid4().hex
+    store_dir, _ = policy_dirs(namespace)
+    os.makedirs(store_dir, exist_ok=True)
+    (Path(store_dir) / VERSION_FILE).write_text(version)
+    return version
+
+def save_policy_files(uploaded_files, namespace: str = DEFAULT_NAMESPACE) -> list[str]:
     """
     Save uploaded policy files to disk and return list of saved paths.
     """
+    _, upload_dir = policy_dirs(namespace)
+    os.makedirs(upload_dir, exist_ok=True)
     file_paths = []
     for file in uploaded_files:
-        save_path = Path(POLICY_UPLOAD_DIR) / file.filename
-        with open(save_path, "wb") as f:
-            f.write(file.file.read())
-        file_paths.append(str(save_path))
+        save_path = Path(upload_dir) / file.filename
+        file_paths.append(save_upload(file, save_path))
     return file_paths
 
-def build_or_update_policy_store(uploaded_files):
+def get_embeddings():
     """
-    Save uploaded policy PDFs, split into chunks, embed, and persist to policy_store.
-    Appends to existing store if present.
-    Returns the Chroma vectorstore instance.
+    Build the embedding model used for the policy store and document chunks.
+    Callers that serve requests should reuse the instance held by the runtime registry.
     """
-    file_paths = save_policy_files(uploaded_files)
+    return EmbeddingEngine(EMBEDDING_MODEL)
 
-    docs = []
+def embedding_model_id(embeddings) -> str:
+    """
+    Model identity recorded per file in the manifest (includes quantization, if any).
+    """
+    return getattr(embeddings, "model_id", EMBEDDING_MODEL)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(namespace: str = DEFAULT_NAMESPACE) -> dict:
+    """
+    Return the manifest of ingested policy files:
+    {"documents": {filename: {"sha256", "chunk_ids", "embedding_model", "updated_at"}}}
+    """
+    path = Path(policy_dirs(namespace)[0]) / MANIFEST_FILE
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"documents": {}}
+
+def save_manifest(manifest: dict, namespace: str = DEFAULT_NAMESPACE):
+    store_dir, _ = policy_dirs(namespace)
+    os.makedirs(store_dir, exist_ok=True)
+    path = Path(store_dir) / MANIFEST_FILE
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, path)
+
+def chunk_ids_for(filename: str, chunks) -> list[str]:
+    """
+    Content-addressed chunk IDs: unchanged chunk text keeps its ID across re-uploads,
+    so only new or edited chunks need embedding. Repeats within a file get a counter.
+    """
+    ids = []
+    seen = {}
+    for c in chunks:
+        digest = hashlib.sha256(c.page_content.encode("utf-8")).hexdigest()[:16]
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(f"{filename}::{digest}" + (f"::{n}" if n else ""))
+    return ids
+
+def _legacy_chunk_ids(store) -> dict[str, list[str]]:
+    """
+    IDs of chunks added before the manifest existed (random IDs), grouped by file name.
+    Their `source` is the absolute path the store was first built from, which need not
+    be this checkout, so only the file name is compared.
+    """
+    data = store.get(include=["metadatas"])
+    by_name = {}
+    for chunk_id, metadata in zip(data.get("ids") or [], data.get("metadatas") or []):
+        source = (metadata or {}).get("source")
+        if source:
+            by_name.setdefault(Path(source).name, []).append(chunk_id)
+    return by_name
+
+def build_or_update_policy_store(uploaded_files, embeddings=None, namespace: str = DEFAULT_NAMESPACE):
+    """
+    Save uploaded policy PDFs, split into chunks, embed, and persist to the namespace's policy store.
+    Incremental: files whose content hash is unchanged are skipped, and for changed
+    files only new chunks are embedded while chunks no longer present are deleted.
+    The manifest records each file's hash, chunk IDs and embedding model.
+    Returns the vectorstore instance.
+    """
+    file_paths = save_policy_files(uploaded_files, namespace)
+    embeddings = embeddings or get_embeddings()
+    model_id = embedding_model_id(embeddings)
+    store = open_policy_store(embeddings, namespace)
+    manifest = load_manifest(namespace)
+    changed = False
+    legacy_ids = None
+
+    hashes = {}
     for p in file_paths:
-        loader = PyPDFLoader(p)
-        docs.extend(loader.load())
+        filename = Path(p).name
+        hashes[p] = file_sha256(p)
+        entry = manifest["documents"].get(filename)
+        if entry and entry["sha256"] == hashes[p] and entry["embedding_model"] == model_id:
+            logger.info(f"Policy file {filename} unchanged; skipping")
+            del hashes[p]
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    texts = text_splitter.split_documents(docs)
+    # parse and split all changed files at once across the process pool
+    parsed = parse_pdfs_parallel(list(hashes), CHUNK_SIZE, CHUNK_OVERLAP)
 
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    for p, sha in hashes.items():
+        filename = Path(p).name
+        entry = manifest["documents"].get(filename)
+        texts = parsed[p]
+        ids = chunk_ids_for(filename, texts)
 
-    if os.path.exists(PERSIST_POLICY_DIR) and os.listdir(PERSIST_POLICY_DIR):
-        # load and add
-        store = Chroma(persist_directory=PERSIST_POLICY_DIR, embedding_function=embeddings)
-        store.add_documents(texts)
-        store.persist()
-    else:
-        # create new
-        store = Chroma.from_documents(texts, embeddings, persist_directory=PERSIST_POLICY_DIR)
+        if entry is None:
+            if legacy_ids is None:
+                legacy_ids = _legacy_chunk_ids(store)
+            old_ids = set(legacy_ids.get(filename, []))
+        elif entry["embedding_model"] != model_id:
+            # vectors from another model are not comparable; re-embed the whole file
+            store.delete(ids=entry["chunk_ids"])
+            old_ids = set()
+        else:
+            old_ids = set(entry["chunk_ids"])
+
+        new_ids = set(ids)
+        stale = [i for i in old_ids if i not in new_ids]
+        fresh = [(i, t) for i, t in zip(ids, texts) if i not in old_ids]
+        if stale:
+            store.delete(ids=stale)
+        if fresh:
+            with span("embed"):
+                store.add_documents([t for _, t in fresh], ids=[i for i, _ in fresh])
+        logger.info(f"Policy file {filename}: {len(fresh)} chunks embedded, {len(stale)} removed, "
+                    f"{len(ids) - len(fresh)} reused")
+
+        manifest["documents"][filename] = {
+            "sha256": sha,
+            "chunk_ids": ids,
+            "embedding_model": model_id,
+            "updated_at": time.time(),
+        }
+        changed = True
+
+    if changed:
         store.persist()
+        save_manifest(manifest, namespace)
+        bump_policy_store_version(namespace)
+    return store
 
+def list_policy_documents(namespace: str = DEFAULT_NAMESPACE) -> list[dict]:
+    """
+    List ingested policy files from the manifest.
+    """
+    return [
+        {"filename": name, "sha256": e["sha256"], "chunks": len(e["chunk_ids"]),
+         "embedding_model": e["embedding_model"], "updated_at": e["updated_at"]}
+        for name, e in sorted(load_manifest(namespace)["documents"].items())
+    ]
+
+def delete_policy_document(filename: str, embeddings=None, namespace: str = DEFAULT_NAMESPACE):
+    """
+    Remove one policy file's chunks from the store and its upload from disk.
+    Raises KeyError if the file is not in the manifest. Returns the vectorstore instance.
+    """
+    manifest = load_manifest(namespace)
+    entry = manifest["documents"].pop(filename)
+    store = open_policy_store(embeddings or get_embeddings(), namespace)
+    if entry["chunk_ids"]:
+        store.delete(ids=entry["chunk_ids"])
+        store.persist()
+    upload_path = Path(policy_dirs(namespace)[1]) / filename
+    if upload_path.exists():
+        upload_path.unlink()
+    save_manifest(manifest, namespace)
+    bump_policy_store_version(namespace)
     return store
 
-def load_policy_store():
+def load_policy_store(embeddings=None, namespace: str = DEFAULT_NAMESPACE, read_only: bool = False):
     """
     Load existing policy store. Raises FileNotFoundError if empty.
+    With `read_only` and no `embeddings`, the embedding model is not loaded: the store's
+    chunks and vectors can be read, but it cannot be searched by text or written.
     """
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    if os.path.exists(PERSIST_POLICY_DIR) and os.listdir(PERSIST_POLICY_DIR):
-        return Chroma(persist_directory=PERSIST_POLICY_DIR, embedding_function=embeddings)
+    if not read_only:
+        embeddings = embeddings or get_embeddings()
+    if _store_exists(namespace):
+        return open_policy_store(embeddings, namespace)
     else:
-        raise FileNotFoundError("Policy store is empty. Upload policy PDFs first.")
+        label = "Policy store" if namespace == DEFAULT_NAMESPACE else f"Policy store for namespace '{namespace}'"
+        raise FileNotFoundError(f"{label} is empty. Upload policy PDFs first.")
 
-def clear_policy_store():
+def clear_policy_store(namespace: str = DEFAULT_NAMESPACE):
     """
-    Remove the persisted policy store and policy upload folder (full reset).
+    Remove the namespace's persisted policy store and policy upload folder (full reset).
     """
-    if os.path.exists(PERSIST_POLICY_DIR):
-        shutil.rmtree(PERSIST_POLICY_DIR)
-    if os.path.exists(POLICY_UPLOAD_DIR):
-        shutil.rmtree(POLICY_UPLOAD_DIR)
+    store_dir, upload_dir = policy_dirs(namespace)
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    if os.path.exists(upload_dir):
+        shutil.rmtree(upload_dir)
     # recreate empty directories
-    os.makedirs(POLICY_UPLOAD_DIR, exist_ok=True)
-    os.makedirs(PERSIST_POLICY_DIR, exist_ok=True)
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(store_dir, exist_ok=True)
+    bump_policy_store_version(namespace)
     return True
@@ -0,0 +1,87 @@
+# server/modules/prefilter.py
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Sequence
+import numpy as np
+
+# Chunks whose policy-relevance score is below the threshold skip the LLM and are marked OK.
+# 0 disables the gate; calibrate a value with tools/calibrate_prefilter.py.
+PREFILTER_THRESHOLD = float(os.environ.get("PREFILTER_THRESHOLD", 0.0))
+# weight of the lexical score in the combined relevance score (0 = dense similarity only)
+PREFILTER_LEXICAL_WEIGHT = float(os.environ.get("PREFILTER_LEXICAL_WEIGHT", 0.3))
+LOW_RELEVANCE_EXPLANATION = "OK: low policy relevance"
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9'-]{2,}")
+STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has have with this that from they "
+    "will would there their what which when who how its into than then them these those been being were "
+    "also may such each other more most some only own same very just should could about over under".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    IDF-weighted vocabulary of the policy store. A chunk's lexical score is the share of its
+    (IDF-weighted) distinct terms that also occur somewhere in the policies, in [0, 1].
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        df = Counter()
+        for text in texts:
+            df.update(set(tokenize(text)))
+        n = max(1, len(texts))
+        self.idf = {term: math.log(1 + n / count) for term, count in df.items()}
+        # weight for terms the policies never use
+        self.unseen_idf = math.log(1 + n)
+
+    def score(self, text: str) -> float:
+        terms = set(tokenize(text))
+        if not terms:
+            return 0.0
+        matched = sum(self.idf[t] for t in terms if t in self.idf)
+        total = matched + self.unseen_idf * sum(1 for t in terms if t not in self.idf)
+        return matched / total if total else 0.0
+
+
+def relevance_scores(dense: Sequence[float], texts: Sequence[str], lexical: Optional[LexicalIndex],
+                     lexical_weight: float = PREFILTER_LEXICAL_WEIGHT) -> np.ndarray:
+    """
+    Combine each chunk's max cosine similarity to any policy chunk with its lexical score.
+    """
+    dense = np.asarray(dense, dtype=np.float32)
+    if lexical is None or lexical_weight <= 0:
+        return dense
+    lex = np.array([lexical.score(t) for t in texts], dtype=np.float32)
+    return (1 - lexical_weight) * dense + lexical_weight * lex
+
+
+def calibrate_threshold(scores: Sequence[float], labels: Sequence[str], target_recall: float = 1.0,
+                        margin: float = 0.02) -> dict:
+    """
+    Pick the highest threshold that keeps `target_recall` of the non-OK (violation/review)
+    samples above it, minus a safety `margin`. Reports how many OK samples it would skip.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    flagged = np.array([label.lower() != "ok" for label in labels])
+    if not flagged.any():
+        raise ValueError("Calibration sample needs at least one violation or review example")
+
+    positive = np.sort(scores[flagged])
+    keep_out = int(math.floor((1 - target_recall) * len(positive)))
+    threshold = float(positive[keep_out]) - margin
+
+    skipped = scores < threshold
+    return {
+        "threshold": threshold,
+        "target_recall": target_recall,
+        "recall": float(1 - skipped[flagged].mean()),
+        "ok_skip_rate": float(skipped[~flagged].mean()) if (~flagged).any() else 0.0,
+        "samples": int(len(scores)),
+        "flagged_samples": int(flagged.sum()),
+    }
@@ -2,13 +2,13 @@ from logger import logger
 
 def query_chain(chain,user_input:str):
     try:
-        logger.debug(f"Running chain for input: {user_input}")
+        logger.debug("Running chain for input: %s", user_input)
         result=chain({"query":user_input})
         response={
             "response":result["result"],
             "sources":[doc.metadata.get("source","") for doc in result["source_documents"]]
         }
-        logger.debug(f"Chain response: {response}")
+        logger.debug("Chain response: %s", response)
         return response
     except Exception as e:
         logger.exception("Error in query_chain")
@@ -0,0 +1,84 @@
+# server/modules/rate_limit.py
+import asyncio
+import os
+import threading
+import time
+
+# Provider limits for the moderation model (Groq llama-3.3-70b-versatile defaults).
+# Set either to 0 to disable that bucket.
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_REQUESTS_PER_MINUTE", 30))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("LLM_TOKENS_PER_MINUTE", 12000))
+# server processes sharing the API key (serve.py sets this); each gets an equal share of the limits
+SERVER_WORKERS = max(1, int(os.environ.get("SERVER_WORKERS", 1)))
+
+
+def per_worker(limit: int) -> int:
+    """
+    This process's share of a per-key limit; 0 (disabled) stays 0.
+    """
+    return max(1, limit // SERVER_WORKERS) if limit > 0 else limit
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for rate limiting.
+    """
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` tokens per minute.
+    Thread-safe and usable from any event loop; waiting happens outside the lock.
+    """
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """
+        Take `amount` tokens if available and return 0, else return seconds to wait.
+        """
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1):
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Combined requests-per-minute and tokens-per-minute limiter for one provider key.
+    """
+
+    def __init__(self, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE, tokens_per_minute: int = LLM_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, tokens: int = 1):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+
+# shared by every request in the process, since provider limits apply per API key
+llm_limiter = RateLimiter(per_worker(LLM_REQUESTS_PER_MINUTE), per_worker(LLM_TOKENS_PER_MINUTE))
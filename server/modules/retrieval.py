@@ -0,0 +1,122 @@
+# server/modules/retrieval.py
+import os
+from typing import List, Sequence
+import numpy as np
+from langchain.schema import Document
+from modules.prefilter import LexicalIndex
+from logger import logger
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row so a dot product is cosine similarity.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embed_texts(embeddings, texts: Sequence[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """
+    Embed texts with batched encoder calls and return a normalized (n, dim) float32 matrix.
+    """
+    if hasattr(embeddings, "encode"):
+        # EmbeddingEngine batches (length-sorted) and normalizes itself
+        return embeddings.encode(texts)
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(list(texts[start:start + batch_size])))
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    return normalize_rows(np.array(vectors, dtype=np.float32))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Column indices of the k highest scores per row, best first.
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+class PolicyIndex:
+    """
+    Normalized policy-chunk embeddings held in memory for exact, vectorized top-k search.
+    Built once per policy-store snapshot from the vectors the store already persisted.
+    """
+
+    def __init__(self, ids: List[str], vectors: np.ndarray, documents: List[Document], normalized: bool = False):
+        self.ids = ids
+        if not len(ids):
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self.vectors = vectors if normalized else normalize_rows(vectors)
+        self.documents = documents
+        self._lexical = None
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        """
+        Keyword index over the same policy chunks, built on first use.
+        """
+        if self._lexical is None:
+            self._lexical = LexicalIndex([d.page_content for d in self.documents])
+        return self._lexical
+
+    @classmethod
+    def from_store(cls, store) -> "PolicyIndex":
+        if hasattr(store, "as_policy_index"):
+            # flat stores already hold normalized (memory-mapped) vectors
+            index = store.as_policy_index()
+            logger.info(f"Policy index mapped with {len(index)} chunks")
+            return index
+        data = store.get(include=["embeddings", "documents", "metadatas"])
+        ids = list(data.get("ids") or [])
+        documents = [
+            Document(page_content=text or "", metadata=md or {})
+            for text, md in zip(data.get("documents") or [], data.get("metadatas") or [])
+        ]
+        vectors = np.array(data.get("embeddings") if ids else [], dtype=np.float32)
+        logger.info(f"Policy index built with {len(ids)} chunks")
+        return cls(ids, vectors, documents)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, query_vectors: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of each (normalized) query against every policy chunk: (n_queries, n_policy).
+        """
+        if not len(self) or not len(query_vectors):
+            return np.zeros((len(query_vectors), len(self)), dtype=np.float32)
+        return query_vectors @ self.vectors.T
+
+    def search(self, query_vectors: np.ndarray, k: int) -> List[List[Document]]:
+        """
+        Exact top-k policy documents for a batch of queries with one matrix multiply.
+        """
+        docs, _ = self.search_with_scores(query_vectors, k)
+        return docs
+
+    def search_with_scores(self, query_vectors: np.ndarray, k: int):
+        best, best_scores = self.top_positions(query_vectors, k)
+        docs = [[self.documents[j] for j in row] for row in best]
+        return docs, best_scores
+
+    def top_positions(self, query_vectors: np.ndarray, k: int):
+        """
+        Row positions (into ids/documents) of the top-k policy chunks per query, and their scores.
+        """
+        scores = self.scores(query_vectors)
+        best = top_k(scores, k)
+        best_scores = np.take_along_axis(scores, best, axis=1) if best.size else np.zeros(best.shape)
+        return best, best_scores
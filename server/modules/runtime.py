@@ -0,0 +1,330 @@
+# server/modules/runtime.py
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from modules.policy_store import (
+    DEFAULT_NAMESPACE, get_embeddings, load_policy_store, get_policy_store_version, policy_dirs,
+    embedding_model_id, list_namespaces,
+)
+from modules.llm import get_llm
+from modules.retrieval import PolicyIndex
+from modules.shared_snapshot import (
+    SHARED_POLICY_SNAPSHOTS, SharedPolicySnapshot, generation_counter, publish_lock, publish_snapshot,
+    retire_snapshots, snapshot_info,
+)
+from logger import logger
+
+# memory bound for the loaded-namespace LRU; the least recently used stores are closed first
+POLICY_CACHE_MAX_MB = float(os.environ.get("POLICY_CACHE_MAX_MB", 512))
+# rough per-chunk overhead of Document objects, metadata and ids on top of text and vectors
+CHUNK_OVERHEAD_BYTES = 1024
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+
+
+@dataclass(frozen=True)
+class PolicySnapshot:
+    """
+    Immutable view of the currently served policy store and the in-memory index built on it.
+    Requests grab one snapshot and use it to the end, so a swap never mixes stores.
+    """
+    store: Optional[object] = None
+    index: Optional[PolicyIndex] = None
+    version: str = "initial"
+    loaded_at: float = field(default_factory=time.time)
+    namespace: str = DEFAULT_NAMESPACE
+    nbytes: int = 0
+    # shared-snapshot generation this was loaded from (multi-worker mode only)
+    generation: int = 0
+
+
+def estimate_snapshot_bytes(store, index: Optional[PolicyIndex]) -> int:
+    """
+    Approximate resident size of an opened store and its index: vectors, chunk text and
+    per-chunk overhead. Chroma keeps its own copy of the vectors, so they count twice.
+    """
+    if index is None or not len(index):
+        return 0
+    if hasattr(store, "nbytes"):
+        # shared snapshot: sized from its mapped files, without decoding every chunk
+        return int(store.nbytes)
+    size = int(index.vectors.nbytes) + len(index) * CHUNK_OVERHEAD_BYTES
+    size += sum(len(d.page_content.encode("utf-8")) for d in index.documents)
+    if not hasattr(store, "as_policy_index"):
+        size += int(index.vectors.nbytes)
+    return size
+
+
+def current_generation(namespace: str, model_id: str, embeddings=None) -> int:
+    """
+    Generation of the namespace's current shared snapshot, publishing one from the
+    on-disk store if there is none or it is older than the store (e.g. the store was
+    written by a single-process server). Raises FileNotFoundError if the store is empty.
+    The store is only read, so `embeddings` may be None.
+    """
+    counter = generation_counter(namespace)
+    info = snapshot_info(namespace, counter.value)
+    if info is not None and info["version"] == get_policy_store_version(namespace):
+        return counter.value
+    with publish_lock(namespace):
+        # another worker may have published while this one waited
+        info = snapshot_info(namespace, counter.value)
+        version = get_policy_store_version(namespace)
+        if info is not None and info["version"] == version:
+            return counter.value
+        try:
+            store = load_policy_store(embeddings=embeddings, namespace=namespace, read_only=True)
+        except FileNotFoundError:
+            if info is not None:
+                retire_snapshots(namespace)
+            raise
+        return publish_snapshot(namespace, PolicyIndex.from_store(store), version, model_id)
+
+
+def publish_current_snapshots(model_id: str):
+    """
+    Body of the subprocess started by `PolicyRuntime.preload`: make sure every namespace
+    on disk has a current shared snapshot, recorded as built for `model_id`.
+    """
+    for namespace in list_namespaces():
+        try:
+            current_generation(namespace, model_id)
+        except FileNotFoundError:
+            pass
+
+
+class PolicyRuntime:
+    """
+    Process-wide registry holding the embedding model, the open policy stores with their
+    in-memory retrieval indexes, and the LLM client. Warmed once by the FastAPI lifespan.
+    Each policy namespace has its own store; opened stores live in an LRU bounded by
+    `max_bytes`, so cold namespaces are evicted and reopened from disk on their next request.
+
+    With `shared` (multi-worker mode), stores are served from read-only snapshots mapped by
+    every worker (modules/shared_snapshot.py). Writes publish a new snapshot generation, and
+    each request compares its namespace's generation counter with the loaded one, so every
+    worker picks up a publish on its next request.
+    """
+
+    def __init__(self, max_bytes: int = int(POLICY_CACHE_MAX_MB * 1024 * 1024), shared: bool = SHARED_POLICY_SNAPSHOTS):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._embeddings = None
+        self._snapshots: "OrderedDict[str, PolicySnapshot]" = OrderedDict()
+        self._max_bytes = max_bytes
+        self._warm = False
+        self.shared = shared
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    logger.info("Loading embedding model")
+                    self._embeddings = get_embeddings()
+        return self._embeddings
+
+    @property
+    def snapshot(self) -> PolicySnapshot:
+        return self._snapshots.get(DEFAULT_NAMESPACE) or PolicySnapshot()
+
+    @property
+    def llm(self):
+        return get_llm()
+
+    def warm(self):
+        """
+        Load the embedding model and LLM client, and open the default policy store (if any) with its index.
+        Other namespaces are opened on first use.
+        """
+        embeddings = self.embeddings
+        get_llm()
+        try:
+            self.reload()
+        except FileNotFoundError:
+            logger.info("Policy store is empty; runtime warmed without a store")
+        self._warm = True
+        return embeddings
+
+    def preload(self):
+        """
+        Run once in the parent process before forking workers: load the embedding model
+        (its weights are then shared copy-on-write), then bring every namespace's shared
+        snapshot up to date in a short-lived subprocess. Policy stores (a Chroma client and
+        its SQLite connection) are only opened there, and nothing is encoded and no LLM
+        client is created here, so the workers inherit no store handles or connections.
+        """
+        model_id = embedding_model_id(self.embeddings)
+        subprocess.run(
+            [sys.executable, "-c", "import sys; from modules.runtime import publish_current_snapshots; "
+                                   "publish_current_snapshots(sys.argv[1])", model_id],
+            cwd=SERVER_DIR, check=True,
+        )
+
+    def writing(self, namespace: str = DEFAULT_NAMESPACE):
+        """
+        Context for policy store writes (upload, delete, clear): in multi-worker mode it
+        serializes them across workers with the namespace's publish lock.
+        """
+        policy_dirs(namespace)  # validate before creating its lock file
+        return publish_lock(namespace) if self.shared else nullcontext()
+
+    def _current_generation(self, namespace: str) -> int:
+        return current_generation(namespace, embedding_model_id(self.embeddings), self.embeddings)
+
+    def _shared_snapshot(self, namespace: str, generation: int) -> PolicySnapshot:
+        store = SharedPolicySnapshot(namespace, generation, self.embeddings)
+        index = store.as_policy_index()
+        return PolicySnapshot(
+            store=store, index=index, version=store.version, namespace=namespace,
+            nbytes=estimate_snapshot_bytes(store, index), generation=generation,
+        )
+
+    def _publish(self, snapshot: PolicySnapshot) -> PolicySnapshot:
+        """
+        Insert a snapshot as most recently used and evict cold namespaces over the memory bound.
+        The snapshot just published is never evicted, even if it alone exceeds the bound.
+        Call with the lock held.
+        """
+        self._snapshots.pop(snapshot.namespace, None)
+        self._snapshots[snapshot.namespace] = snapshot
+        total = sum(s.nbytes for s in self._snapshots.values())
+        while total > self._max_bytes and len(self._snapshots) > 1:
+            namespace, evicted = self._snapshots.popitem(last=False)
+            total -= evicted.nbytes
+            logger.info(f"Evicted policy namespace '{namespace}' ({evicted.nbytes} bytes) from runtime")
+        return snapshot
+
+    def _snapshot_for(self, store, namespace: str) -> PolicySnapshot:
+        index = PolicyIndex.from_store(store)
+        return PolicySnapshot(
+            store=store, index=index, version=get_policy_store_version(namespace),
+            namespace=namespace, nbytes=estimate_snapshot_bytes(store, index),
+        )
+
+    def reload(self, namespace: str = DEFAULT_NAMESPACE):
+        """
+        Reopen a namespace's policy store from disk and atomically swap it in.
+        Raises FileNotFoundError if the store is empty (the old snapshot is dropped).
+        """
+        policy_dirs(namespace)  # validate before touching the cache
+        if self.shared:
+            # no runtime lock while publishing: writers take the publish lock first
+            try:
+                snapshot = self._shared_snapshot(namespace, self._current_generation(namespace))
+            except FileNotFoundError:
+                with self._lock:
+                    self._snapshots.pop(namespace, None)
+                raise
+            with self._lock:
+                self._publish(snapshot)
+            logger.info(f"Policy snapshot generation {snapshot.generation} for namespace '{namespace}' mapped into runtime")
+            return snapshot
+        # loads are serialized by their own lock, so requests for loaded namespaces don't wait on them
+        with self._load_lock:
+            try:
+                store = load_policy_store(embeddings=self.embeddings, namespace=namespace)
+            except FileNotFoundError:
+                with self._lock:
+                    self._snapshots.pop(namespace, None)
+                raise
+            snapshot = self._snapshot_for(store, namespace)
+            with self._lock:
+                self._publish(snapshot)
+        logger.info(f"Policy store for namespace '{namespace}' loaded into runtime")
+        return snapshot
+
+    def swap(self, store, namespace: str = DEFAULT_NAMESPACE):
+        """
+        Publish an already-built policy store (e.g. after an upload) to new requests.
+        In multi-worker mode it becomes the next shared generation, for every worker.
+        """
+        if self.shared:
+            generation = publish_snapshot(
+                namespace, PolicyIndex.from_store(store), get_policy_store_version(namespace),
+                embedding_model_id(self.embeddings),
+            )
+            snapshot = self._shared_snapshot(namespace, generation)
+        else:
+            snapshot = self._snapshot_for(store, namespace)
+        with self._lock:
+            return self._publish(snapshot)
+
+    def clear(self, namespace: str = DEFAULT_NAMESPACE):
+        """
+        Drop a namespace's served policy store after the on-disk store was cleared.
+        """
+        if self.shared:
+            retire_snapshots(namespace)
+        with self._lock:
+            self._snapshots.pop(namespace, None)
+
+    def _loaded(self, namespace: str) -> Optional[PolicySnapshot]:
+        """
+        The namespace's snapshot if it is loaded and current, else None.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(namespace)
+            if snapshot is not None and (not self.shared or snapshot.generation == generation_counter(namespace).value):
+                self._snapshots.move_to_end(namespace)
+                return snapshot
+        return None
+
+    def current(self, namespace: str = DEFAULT_NAMESPACE) -> PolicySnapshot:
+        """
+        Return the namespace's served snapshot, loading it from disk if needed.
+        Raises FileNotFoundError if the policy store is empty.
+        """
+        return self._loaded(namespace) or self.reload(namespace)
+
+    async def acurrent(self, namespace: str = DEFAULT_NAMESPACE) -> PolicySnapshot:
+        """
+        `current()` for request handlers: a loaded snapshot is returned directly, while
+        opening a cold namespace (store load, index build) runs in a worker thread.
+        """
+        return self._loaded(namespace) or await asyncio.to_thread(self.reload, namespace)
+
+    def moderation_options(self, snapshot: PolicySnapshot) -> dict:
+        """
+        Keyword arguments that let the moderation engine reuse this runtime's resources.
+        """
+        return {
+            "index": snapshot.index,
+            "embeddings": self.embeddings,
+            "llm": self.llm,
+            "policy_version": snapshot.version,
+        }
+
+    def status(self) -> dict:
+        snapshot = self.snapshot
+        with self._lock:
+            loaded = {
+                name: {"policy_chunks": len(s.index) if s.index is not None else 0,
+                       "bytes": s.nbytes, "policy_version": s.version}
+                for name, s in self._snapshots.items()
+            }
+        return {
+            "ready": self._warm,
+            "embeddings_loaded": self._embeddings is not None,
+            "policy_store_loaded": snapshot.store is not None,
+            "policy_chunks": len(snapshot.index) if snapshot.index is not None else 0,
+            "policy_version": snapshot.version,
+            "loaded_at": snapshot.loaded_at,
+            "namespaces_loaded": loaded,
+            "namespace_cache_bytes": sum(n["bytes"] for n in loaded.values()),
+            "namespace_cache_max_bytes": self._max_bytes,
+            "shared_snapshots": self.shared,
+            "generation": snapshot.generation,
+            "pid": os.getpid(),
+        }
+
+
+runtime = PolicyRuntime()
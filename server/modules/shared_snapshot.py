@@ -0,0 +1,237 @@
+# server/modules/shared_snapshot.py
+import fcntl
+import json
+import mmap
+import operator
+import os
+import shutil
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+import numpy as np
+from langchain.schema import Document
+from modules.retrieval import PolicyIndex
+from logger import logger
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+# Multi-worker mode (set by serve.py): workers serve policy stores from read-only snapshots
+# published here instead of each opening its own Chroma store
+SHARED_POLICY_SNAPSHOTS = os.environ.get("SHARED_POLICY_SNAPSHOTS", "0") == "1"
+POLICY_SNAPSHOT_DIR = os.environ.get("POLICY_SNAPSHOT_DIR", str(BASE_DIR / "policy_snapshots"))
+# generations kept on disk; older ones are removed (workers still mapping them keep their pages)
+KEEP_GENERATIONS = 2
+
+GENERATION_FILE = "generation"
+LOCK_FILE = "publish.lock"
+SNAPSHOT_VECTORS = "vectors.npy"
+SNAPSHOT_RECORDS = "records.npy"
+SNAPSHOT_OFFSETS = "offsets.npy"
+SNAPSHOT_INFO = "snapshot.json"
+
+
+def namespace_dir(namespace: str) -> Path:
+    path = Path(POLICY_SNAPSHOT_DIR) / namespace
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def generation_dir(namespace: str, generation: int) -> Path:
+    return namespace_dir(namespace) / f"gen-{generation:08d}"
+
+
+class GenerationCounter:
+    """
+    Publish counter of one namespace: 8 bytes in a file every worker maps MAP_SHARED, so
+    checking for a newer snapshot is a memory read rather than a syscall. Only written
+    under the namespace's publish lock.
+    """
+
+    def __init__(self, path: Path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    @property
+    def value(self) -> int:
+        return struct.unpack_from("<q", self._map)[0]
+
+    def advance(self) -> int:
+        generation = self.value + 1
+        struct.pack_into("<q", self._map, 0, generation)
+        self._map.flush()
+        return generation
+
+
+class _PublishLock:
+    """
+    Cross-process lock (flock on a lock file) that is re-entrant within a thread, so a
+    caller can hold it around a store rebuild and the publish that follows.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+_counters: Dict[str, GenerationCounter] = {}
+_locks: Dict[str, _PublishLock] = {}
+_registry_lock = threading.Lock()
+
+
+def generation_counter(namespace: str) -> GenerationCounter:
+    with _registry_lock:
+        if namespace not in _counters:
+            _counters[namespace] = GenerationCounter(namespace_dir(namespace) / GENERATION_FILE)
+        return _counters[namespace]
+
+
+def publish_lock(namespace: str) -> _PublishLock:
+    with _registry_lock:
+        if namespace not in _locks:
+            _locks[namespace] = _PublishLock(namespace_dir(namespace) / LOCK_FILE)
+        return _locks[namespace]
+
+
+def _prune(namespace: str, keep_from: int):
+    for path in namespace_dir(namespace).glob("gen-*"):
+        try:
+            generation = int(path.name.split("-", 1)[1].split(".", 1)[0])
+        except ValueError:
+            continue
+        if generation < keep_from:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def publish_snapshot(namespace: str, index: PolicyIndex, version: str, embedding_model: str) -> int:
+    """
+    Write a policy index as the namespace's next generation and advance the counter.
+    Vectors go to a float32 .npy; IDs, texts and metadata to one byte array of JSON
+    records with an offsets array, so workers map them instead of parsing them.
+    Returns the new generation.
+    """
+    with publish_lock(namespace):
+        counter = generation_counter(namespace)
+        generation = counter.value + 1
+        final = generation_dir(namespace, generation)
+        tmp = final.with_name(final.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        blobs = [json.dumps([i, d.page_content, d.metadata or {}]).encode("utf-8")
+                 for i, d in zip(index.ids, index.documents)]
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blobs], out=offsets[1:])
+        np.save(tmp / SNAPSHOT_VECTORS, np.ascontiguousarray(index.vectors, dtype=np.float32))
+        np.save(tmp / SNAPSHOT_RECORDS, np.frombuffer(b"".join(blobs), dtype=np.uint8))
+        np.save(tmp / SNAPSHOT_OFFSETS, offsets)
+        (tmp / SNAPSHOT_INFO).write_text(json.dumps({
+            "generation": generation, "namespace": namespace, "version": version,
+            "embedding_model": embedding_model, "chunks": len(blobs),
+        }))
+        os.replace(tmp, final)
+        counter.advance()
+        _prune(namespace, generation - KEEP_GENERATIONS + 1)
+    logger.info(f"Published policy snapshot generation {generation} for namespace '{namespace}' ({len(blobs)} chunks)")
+    return generation
+
+
+def retire_snapshots(namespace: str) -> int:
+    """
+    Advance the counter without a snapshot (the store was cleared) and remove old generations.
+    """
+    with publish_lock(namespace):
+        generation = generation_counter(namespace).advance()
+        _prune(namespace, generation)
+    return generation
+
+
+def snapshot_info(namespace: str, generation: int) -> Optional[dict]:
+    path = generation_dir(namespace, generation) / SNAPSHOT_INFO
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+class _MappedRecords(Sequence):
+    """
+    Read-only sequence decoding one field of the JSON records on access.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, make):
+        self._blob = blob
+        self._offsets = offsets
+        self._make = make
+
+    def __len__(self) -> int:
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        record = json.loads(self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes())
+        return self._make(record)
+
+
+class SharedPolicySnapshot:
+    """
+    Read-only policy store over one published generation. Every array is memory-mapped,
+    so all workers serving the same generation share its pages through the page cache.
+    Provides what the moderation engine needs from a store: `embeddings` and
+    `as_policy_index()`.
+    """
+
+    def __init__(self, namespace: str, generation: int, embedding_function=None):
+        directory = generation_dir(namespace, generation)
+        self.info = json.loads((directory / SNAPSHOT_INFO).read_text())
+        self.namespace = namespace
+        self.generation = generation
+        self.version = self.info["version"]
+        self._embedding_function = embedding_function
+        self.vectors = np.load(directory / SNAPSHOT_VECTORS, mmap_mode="r")
+        if self.info["chunks"]:
+            blob = np.load(directory / SNAPSHOT_RECORDS, mmap_mode="r")
+            offsets = np.load(directory / SNAPSHOT_OFFSETS, mmap_mode="r")
+        else:
+            blob, offsets = np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64)
+        self.nbytes = int(self.vectors.nbytes + blob.nbytes + offsets.nbytes)
+        self.ids = _MappedRecords(blob, offsets, lambda r: r[0])
+        self.documents = _MappedRecords(blob, offsets, lambda r: Document(page_content=r[1], metadata=r[2]))
+        self._index = None
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def as_policy_index(self) -> PolicyIndex:
+        if self._index is None:
+            self._index = PolicyIndex(self.ids, self.vectors, self.documents, normalized=True)
+        return self._index
@@ -0,0 +1,116 @@
+# server/modules/verdict_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+VERDICT_CACHE_PATH = os.environ.get("VERDICT_CACHE_PATH", str(BASE_DIR / "verdict_cache.sqlite3"))
+VERDICT_CACHE_ENABLED = os.environ.get("VERDICT_CACHE_ENABLED", "1") == "1"
+VERDICT_CACHE_MAX_ENTRIES = int(os.environ.get("VERDICT_CACHE_MAX_ENTRIES", 100000))
+VERDICT_CACHE_TTL = float(os.environ.get("VERDICT_CACHE_TTL", 7 * 24 * 3600))
+
+# only definite verdicts are cached; errors and unparseable answers are retried next time
+CACHEABLE_VERDICTS = ("ok", "violation", "review")
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def make_cache_key(text: str, prompt_version: str, model_name: str, k: int, policy_version: str) -> str:
+    """
+    Key a verdict by normalized chunk text and everything else that can change the answer.
+    """
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{text_hash}:{prompt_version}:{model_name}:k={k}:{policy_version}"
+
+
+class VerdictCache:
+    """
+    SQLite-backed verdict cache with TTL expiry and least-recently-used eviction.
+    """
+
+    def __init__(self, path: str = VERDICT_CACHE_PATH, max_entries: int = VERDICT_CACHE_MAX_ENTRIES, ttl: float = VERDICT_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "key TEXT PRIMARY KEY, outcome TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def _lookup(self, conn: sqlite3.Connection, key: str, now: float) -> Optional[dict]:
+        row = conn.execute("SELECT outcome, created_at FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self.ttl and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE verdicts SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys) -> dict:
+        """
+        Return {key: outcome} for the keys that are cached and not expired.
+        """
+        now = time.time()
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for key in set(keys):
+                hit = self._lookup(conn, key, now)
+                if hit is not None:
+                    found[key] = hit
+            conn.commit()
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Store {key: outcome} for cacheable outcomes, then evict expired and least-recently-used rows.
+        """
+        now = time.time()
+        rows = [
+            (key, json.dumps(outcome), now, now)
+            for key, outcome in items.items()
+            if outcome is not None and outcome.get("verdict") in CACHEABLE_VERDICTS
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", rows)
+            if self.ttl:
+                conn.execute("DELETE FROM verdicts WHERE created_at < ?", (now - self.ttl,))
+            overflow = conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM verdicts")
+            self._conn.commit()
+
+
+verdict_cache = VerdictCache()
@@ -0,0 +1,99 @@
+# server/serve.py
+"""
+Multi-worker server. Loads the embedding model once, publishes a shared, memory-mapped
+policy snapshot for every namespace (from a short-lived subprocess, so no policy store
+connection is inherited), then forks uvicorn workers that accept on one listening socket. Workers inherit the model weights copy-on-write and map the same
+snapshot files, so adding workers adds little memory. A policy upload in any worker
+publishes a new snapshot generation that the other workers load on their next request.
+
+Usage (from the server directory):
+    python serve.py --workers 4 [--host 0.0.0.0] [--port 8000]
+
+(`uvicorn --workers` starts workers with spawn, so each would load its own model copy.)
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    # configuration is read at import time, so it is set before the server modules load
+    os.environ["SHARED_POLICY_SNAPSHOTS"] = "1"
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    # LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE stay per-key totals; each worker's
+    # limiter takes an equal share of them
+    os.environ["SERVER_WORKERS"] = str(workers)
+    # split the cores between workers instead of every worker using all of them
+    cores_per_worker = str(max(1, (os.cpu_count() or 1) // workers))
+    os.environ.setdefault("EMBED_THREADS", cores_per_worker)
+    os.environ.setdefault("PDF_PARSE_WORKERS", cores_per_worker)
+
+    import uvicorn
+    from main import app
+    from modules.jobs import job_queue
+    from modules.runtime import runtime
+    from logger import logger
+
+    runtime.preload()
+    # keep the garbage collector from touching (and so copying) the preloaded objects' pages
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+    children = {}
+    stopping = False
+
+    def spawn(n: int, first: bool):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # one worker resumes jobs left over by a previous run; a restarted one must not,
+            # since the others may be running them
+            job_queue.resume = n == 0 and first
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        children[pid] = n
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for n in range(workers):
+        spawn(n, first=True)
+    logger.info(f"Serving on {args.host}:{args.port} with {workers} workers (pids {sorted(children)})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        n = children.pop(pid, None)
+        if n is not None and not stopping:
+            logger.warning(f"Worker {n} (pid {pid}) exited with status {status}; restarting it")
+            spawn(n, first=False)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# server/tests/conftest.py
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVER_DIR))
+
+# server modules read their configuration at import time: point every persistent path at a
+# scratch directory and use the fake LLM before any of them is imported
+WORK_DIR = Path(tempfile.mkdtemp(prefix="moderation-tests-"))
+os.environ.update({
+    "MODERATION_LLM": "fake",
+    "POLICY_STORE_DIR": str(WORK_DIR / "policy_store"),
+    "POLICY_UPLOAD_DIR": str(WORK_DIR / "uploaded_policies"),
+    "POLICY_NAMESPACES_DIR": str(WORK_DIR / "policy_namespaces"),
+    "POLICY_SNAPSHOT_DIR": str(WORK_DIR / "policy_snapshots"),
+    "JOBS_DB_PATH": str(WORK_DIR / "jobs.sqlite3"),
+    "JOB_UPLOAD_DIR": str(WORK_DIR / "job_uploads"),
+    "MODERATION_ARCHIVE_PATH": str(WORK_DIR / "moderation_archive.sqlite3"),
+    "VERDICT_CACHE_PATH": str(WORK_DIR / "verdict_cache.sqlite3"),
+    "VERDICT_CACHE_ENABLED": "0",
+    "LLM_REQUESTS_PER_MINUTE": "0",
+    "LLM_TOKENS_PER_MINUTE": "0",
+})
+
+# chunk texts the fake LLM and the `engine` policies judge as TEXT_VERDICTS
+TEXTS = ["A friendly note.", "I hate this team.", "Lunch is at noon.", "Bring a weapon.", "See you soon."]
+TEXT_VERDICTS = ["ok", "violation", "ok", "review", "ok"]
+
+
+def make_chunks(texts, filename: str = "doc.pdf"):
+    """
+    Chunk dicts in the shape the PDF loaders produce.
+    """
+    return [{"page_content": t, "metadata": {"chunk_id": f"{filename}::chunk_{i}"}} for i, t in enumerate(texts)]
+
+
+class Upload:
+    """
+    UploadFile stand-in (the server only uses .filename and .file).
+    """
+
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self.file = io.BytesIO(data)
+
+
+@pytest.fixture
+def engine():
+    """
+    Moderation engine options: the fake LLM and a hashing embedder over a small policy index.
+    """
+    from langchain.schema import Document
+    from modules.fake_llm import FakeModerationLLM
+    from modules.rate_limit import RateLimiter
+    from modules.retrieval import PolicyIndex, embed_texts
+    from tools.benchmark import HashEmbeddings
+
+    embeddings = HashEmbeddings(dim=64)
+    policies = [
+        Document(page_content="Hate speech and slurs are not allowed.", metadata={"source": "conduct.pdf"}),
+        Document(page_content="Threats of violence are not allowed.", metadata={"source": "conduct.pdf"}),
+        Document(page_content="Weapons and drugs need a manual review.", metadata={"source": "review.pdf"}),
+    ]
+    index = PolicyIndex(
+        [f"policy::{i}" for i in range(len(policies))],
+        embed_texts(embeddings, [d.page_content for d in policies]),
+        policies,
+    )
+    return {
+        "index": index, "embeddings": embeddings, "llm": FakeModerationLLM(),
+        "policy_version": "test", "limiter": RateLimiter(0, 0),
+    }
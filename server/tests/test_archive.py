@@ -0,0 +1,51 @@
+# server/tests/test_archive.py
+import asyncio
+import time
+import numpy as np
+from conftest import TEXTS, make_chunks
+from modules import moderation
+from modules.archive import ModerationArchive
+from modules.moderation import amoderate_chunk_iter
+
+CHUNK = {"page_content": "Staff may accept small gifts.", "metadata": {"chunk_id": "doc.pdf::chunk_0"}}
+OUTCOME = {"verdict": "ok", "explanation": "OK", "sources": []}
+
+
+def _save(archive, document_id):
+    archive.save(
+        document_id, "doc.pdf", "default", 3, "v1", "model",
+        [CHUNK], [OUTCOME], {0: (np.ones(4, dtype=np.float32), ["policy::chunk_0"])},
+    )
+
+
+def test_nothing_is_archived_unless_enabled(engine, tmp_path, monkeypatch):
+    archive = ModerationArchive(str(tmp_path / "archive.sqlite3"))
+    monkeypatch.setattr(moderation, "moderation_archive", archive)
+    monkeypatch.setattr(moderation, "MODERATION_ARCHIVE_ENABLED", False)
+    stats = {}
+    asyncio.run(amoderate_chunk_iter(None, make_chunks(TEXTS), archive_as="doc.pdf", stats=stats, **engine))
+    assert "document_id" not in stats
+    assert archive.list() == []
+
+    monkeypatch.setattr(moderation, "MODERATION_ARCHIVE_ENABLED", True)
+    asyncio.run(amoderate_chunk_iter(None, make_chunks(TEXTS), archive_as="doc.pdf", stats=stats, **engine))
+    assert [d["id"] for d in archive.list()] == [stats["document_id"]]
+
+
+def test_delete_removes_document_and_chunks(tmp_path):
+    archive = ModerationArchive(str(tmp_path / "archive.sqlite3"))
+    _save(archive, "a")
+    assert archive.delete("a")
+    assert archive.get("a") is None
+    assert archive.load_chunks("a") == ([], [], [], [])
+    assert not archive.delete("a")
+
+
+def test_expired_documents_are_removed_on_save(tmp_path):
+    archive = ModerationArchive(str(tmp_path / "archive.sqlite3"), retention_days=1)
+    _save(archive, "old")
+    with archive._lock:
+        archive._connect().execute("UPDATE documents SET updated_at = ?", (time.time() - 2 * 86400,))
+    _save(archive, "new")
+    assert [d["id"] for d in archive.list()] == ["new"]
+    assert archive.load_chunks("old")[0] == []
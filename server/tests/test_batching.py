@@ -0,0 +1,36 @@
+# server/tests/test_batching.py
+import asyncio
+import pytest
+from conftest import TEXTS, TEXT_VERDICTS, make_chunks
+from modules.fake_llm import FakeModerationLLM
+from modules.moderation import amoderate_chunks_pipeline
+
+
+@pytest.mark.parametrize("mode", ["single", "batched"])
+@pytest.mark.parametrize("two_pass", [False, True])
+def test_modes_agree_on_verdicts(engine, mode, two_pass):
+    outcomes = asyncio.run(amoderate_chunks_pipeline(
+        None, make_chunks(TEXTS), mode=mode, batch_size=3, two_pass=two_pass, **engine
+    ))
+    assert [o["verdict"] for o in outcomes] == TEXT_VERDICTS
+    assert outcomes[1]["explanation"].startswith("VIOLATION: ")
+    assert outcomes[1]["sources"]
+
+
+def test_failed_batch_falls_back_to_single_calls(engine, monkeypatch):
+    monkeypatch.setattr("modules.moderation.RETRY_BASE_DELAY", 0.001)
+
+    class NoBatchLLM(FakeModerationLLM):
+        def answer(self, prompt, stop=None):
+            if "=== TEXT SECTIONS TO CHECK ===" in prompt:
+                raise RuntimeError("provider error")
+            return super().answer(prompt, stop)
+
+    stats = {}
+    engine["llm"] = NoBatchLLM()
+    outcomes = asyncio.run(amoderate_chunks_pipeline(
+        None, make_chunks(TEXTS), mode="batched", batch_size=len(TEXTS), stats=stats, **engine
+    ))
+    assert [o["verdict"] for o in outcomes] == TEXT_VERDICTS
+    assert stats["batch_fallbacks"] == len(TEXTS)
+    assert stats["llm_calls"] == 1 + len(TEXTS)
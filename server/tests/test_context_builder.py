@@ -0,0 +1,31 @@
+# server/tests/test_context_builder.py
+from langchain.schema import Document
+from modules.context_builder import build_policy_context, drop_near_duplicates
+
+MAY = (
+    "Employees may share customer records with approved vendors after a privacy review. "
+    "Exceptions require written approval from the data protection officer."
+)
+MAY_NOT = MAY.replace("may share", "may not share")
+GIFTS = (
+    "Staff may accept gifts worth up to 50 dollars from a vendor. Larger gifts are returned with a "
+    "thank-you note. Gifts of cash are never accepted, whatever the amount. Every gift is recorded "
+    "in the register within one week, including those that were returned."
+)
+
+
+def test_budget_zero_merges_but_never_trims():
+    # the policy splitter's overlapping neighbours, a repeat and a one-word variant
+    snippets = [GIFTS[:150], GIFTS[100:], MAY, MAY_NOT, MAY]
+    docs = [Document(page_content=t) for t in snippets]
+    context = build_policy_context(docs, ["Can I keep a 20 dollar gift card?"], token_budget=0)
+    assert context.text == f"{GIFTS}\n\n{MAY}\n\n{MAY_NOT}"
+    assert context.snippets_out == 3
+
+    trimmed = build_policy_context(docs, ["Can I keep a 20 dollar gift card?"], token_budget=30)
+    assert trimmed.tokens_after < context.tokens_after
+
+
+def test_near_duplicate_removal_counts_negations():
+    assert drop_near_duplicates([MAY, MAY_NOT], threshold=0.8) == [MAY, MAY_NOT]
+    assert drop_near_duplicates([MAY, MAY + " See section 4."], threshold=0.8) == [MAY]
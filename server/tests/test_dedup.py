@@ -0,0 +1,71 @@
+# server/tests/test_dedup.py
+import asyncio
+from conftest import TEXTS, TEXT_VERDICTS, make_chunks
+from modules.dedup import ChunkDeduplicator, simhash
+from modules.moderation import amoderate_chunk_iter, amoderate_chunks_pipeline
+
+SHARE = (
+    "Employees may share quarterly results with external partners once the board has "
+    "approved the report and legal has reviewed every figure in it."
+)
+NOT_SHARE = SHARE.replace("may share", "may not share")
+AMOUNT = (
+    "Gifts from vendors worth up to 50 dollars may be accepted by staff members as long "
+    "as they are reported to the compliance team within one week."
+)
+FOOTER = (
+    "Confidential. This document is the property of Acme Corp and may not be copied, distributed "
+    "or disclosed to any third party without the prior written permission of the legal department. "
+    "All rights reserved. Printed copies are uncontrolled and must be destroyed after use. "
+    "Questions about this notice go to the records office at the head office. Page 3 of 40"
+)
+
+
+def _assign_all(dedup, texts):
+    async def run():
+        return [dedup.assign(text, f"c{i}") for i, text in enumerate(texts)]
+    return asyncio.run(run())
+
+
+def test_negation_changes_fingerprint():
+    assert simhash(SHARE) != simhash(NOT_SHARE)
+
+
+def test_amount_changes_fingerprint():
+    assert simhash(AMOUNT) != simhash(AMOUNT.replace("50", "5000"))
+
+
+def test_distance_zero_collapses_exact_duplicates_only():
+    groups = _assign_all(ChunkDeduplicator(distance=0), [
+        SHARE, NOT_SHARE, AMOUNT, AMOUNT.replace("50", "5000"), FOOTER, FOOTER.replace("Page 3", "Page 4"),
+        "  " + SHARE.upper() + "\n",
+    ])
+    new = [is_new for _, is_new in groups]
+    assert new == [True, True, True, True, True, True, False]
+    assert groups[6][0] is groups[0][0]
+
+
+def test_near_duplicates_collapse_when_enabled():
+    groups = _assign_all(ChunkDeduplicator(distance=6), [FOOTER, FOOTER.replace("Page 3", "Page 4"), SHARE])
+    assert [is_new for _, is_new in groups] == [True, False, True]
+
+
+def test_duplicates_and_empty_chunks(engine):
+    stats = {}
+    texts = TEXTS + ["   "] + TEXTS
+    outcomes = asyncio.run(amoderate_chunks_pipeline(None, make_chunks(texts), stats=stats, **engine))
+    assert outcomes[len(TEXTS)] is None
+    assert stats["collapsed_chunks"] == len(TEXTS)
+    assert stats["llm_calls"] == len(TEXTS)
+    copies = outcomes[len(TEXTS) + 1:]
+    assert [o["verdict"] for o in copies] == [o["verdict"] for o in outcomes[:len(TEXTS)]]
+    assert [o["duplicate_of"] for o in copies] == [f"doc.pdf::chunk_{i}" for i in range(len(TEXTS))]
+
+
+def test_windows_share_the_deduplicator(engine):
+    stats = {}
+    texts = TEXTS * 3
+    chunks, outcomes = asyncio.run(amoderate_chunk_iter(None, make_chunks(texts), window=2, stats=stats, **engine))
+    assert len(chunks) == len(texts)
+    assert [o["verdict"] for o in outcomes] == TEXT_VERDICTS * 3
+    assert stats["llm_calls"] == len(TEXTS)
@@ -0,0 +1,50 @@
+# server/tests/test_engine.py
+import asyncio
+from conftest import TEXTS, make_chunks
+from modules.fake_llm import FakeModerationLLM
+from modules.moderation import amoderate_chunks_pipeline
+
+
+class CountingLLM(FakeModerationLLM):
+    """
+    Fake LLM that records the most calls it had in flight at once.
+    """
+
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super()._acall(prompt, stop, run_manager, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+def test_concurrency_is_capped_and_order_kept(engine):
+    texts = [f"Note {i} about the {'hate' if i % 7 == 3 else 'weather'}." for i in range(40)]
+    engine["llm"] = CountingLLM(latency=0.01)
+    outcomes = asyncio.run(amoderate_chunks_pipeline(None, make_chunks(texts), concurrency=4, **engine))
+    assert engine["llm"].max_in_flight == 4
+    assert [o["verdict"] for o in outcomes] == ["violation" if i % 7 == 3 else "ok" for i in range(40)]
+
+
+def test_retries_with_backoff_then_reports_an_error(engine, monkeypatch):
+    monkeypatch.setattr("modules.moderation.RETRY_BASE_DELAY", 0.001)
+
+    class FlakyLLM(FakeModerationLLM):
+        failures: int = 2
+
+        def answer(self, prompt, stop=None):
+            if "noon" in prompt:
+                raise RuntimeError("always down")
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("temporarily down")
+            return super().answer(prompt, stop)
+
+    engine["llm"] = FlakyLLM()
+    outcomes = asyncio.run(amoderate_chunks_pipeline(None, make_chunks(TEXTS), concurrency=1, **engine))
+    assert [o["verdict"] for o in outcomes] == ["ok", "violation", "error", "review", "ok"]
+    assert "always down" in outcomes[2]["explanation"]
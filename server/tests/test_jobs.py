@@ -0,0 +1,126 @@
+# server/tests/test_jobs.py
+import asyncio
+from conftest import Upload, make_chunks
+from modules.jobs import JobQueue, JobStore
+
+
+def test_submit_wakes_a_waiting_worker(tmp_path, monkeypatch):
+    ran = []
+
+    async def fake_run(self, job_id):
+        ran.append(job_id)
+
+    monkeypatch.setattr(JobQueue, "_run", fake_run)
+
+    async def scenario():
+        # debug mode raises on queue access from another thread
+        asyncio.get_running_loop().set_debug(True)
+        queue = JobQueue(workers=1, store=JobStore(str(tmp_path / "jobs.sqlite3")))
+        await queue.start()
+        try:
+            job_id = await queue.submit(Upload("doc.pdf", b"%PDF-1.4"), {"mode": None})
+            for _ in range(100):
+                if ran:
+                    break
+                await asyncio.sleep(0.01)
+            return job_id
+        finally:
+            await queue.stop()
+
+    job_id = asyncio.run(scenario())
+    assert ran == [job_id]
+
+
+def test_cancel_from_another_process_stops_the_owner(tmp_path, monkeypatch):
+    from modules import jobs
+    from modules.runtime import PolicySnapshot
+
+    upload_dir = tmp_path / "uploads"
+    monkeypatch.setattr(jobs, "JOB_UPLOAD_DIR", str(upload_dir))
+    monkeypatch.setattr(jobs, "JOB_PROGRESS_INTERVAL", 0.0)
+    monkeypatch.setattr(jobs.runtime, "_loaded", lambda namespace: PolicySnapshot())
+    monkeypatch.setattr(jobs.runtime, "moderation_options", lambda snapshot: {})
+    upload_present = []
+
+    async def slow_moderation(store, chunks, on_outcome=None, collected=None, **kwargs):
+        for i in range(200):
+            upload_present.append(any(upload_dir.iterdir()))
+            on_outcome(i, {"verdict": "ok"})
+            await asyncio.sleep(0.01)
+        return [], []
+
+    monkeypatch.setattr(jobs, "amoderate_chunk_iter", slow_moderation)
+    db = str(tmp_path / "jobs.sqlite3")
+
+    async def scenario():
+        # two queues on one database stand in for two server processes
+        owner = JobQueue(workers=1, store=JobStore(db))
+        other = JobQueue(workers=1, store=JobStore(db), resume=False)
+        await owner.start()
+        await other.start()
+        try:
+            job_id = await owner.submit(Upload("doc.pdf", b"%PDF-1.4"), {})
+            while owner.store.get(job_id)["status"] != "running":
+                await asyncio.sleep(0.01)
+            assert (await other.cancel(job_id))["status"] == "cancelled"
+            for _ in range(100):
+                if job_id not in owner._running:
+                    break
+                await asyncio.sleep(0.01)
+            return job_id
+        finally:
+            await owner.stop()
+            await other.stop()
+
+    job_id = asyncio.run(scenario())
+    assert JobStore(db).get(job_id)["status"] == "cancelled"
+    # the upload stayed until the owner stopped, then the owner removed it
+    assert upload_present and all(upload_present)
+    assert len(upload_present) < 200
+    assert not any(upload_dir.iterdir())
+
+
+def test_job_runs_to_done_with_the_engine(tmp_path, monkeypatch, engine):
+    from modules import jobs
+    from modules.runtime import PolicySnapshot
+
+    texts = ["A friendly note.", "I hate this team.", "   ", "Bring a weapon."]
+    monkeypatch.setattr(jobs, "JOB_UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(jobs, "JOB_PROGRESS_INTERVAL", 0.0)
+    monkeypatch.setattr(jobs.runtime, "_loaded", lambda namespace: PolicySnapshot(index=engine["index"]))
+    monkeypatch.setattr(jobs.runtime, "moderation_options", lambda snapshot: dict(engine))
+    monkeypatch.setattr(jobs, "iter_pdf_chunks", lambda path, filename: (
+        chunk for chunk in make_chunks(texts, filename)
+    ))
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    writes = []
+    update = store.update
+
+    def recording_update(job_id, only_if=None, **fields):
+        if "total" in fields:
+            writes.append((fields["done"], fields["total"]))
+        return update(job_id, only_if=only_if, **fields)
+
+    store.update = recording_update
+
+    async def scenario():
+        queue = JobQueue(workers=1, store=store)
+        await queue.start()
+        try:
+            job_id = await queue.submit(Upload("doc.pdf", b"%PDF-1.4"), {"mode": "batched"})
+            for _ in range(200):
+                job = queue.store.get(job_id)
+                if job["status"] in jobs.FINAL_STATES:
+                    return job
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert job["progress"] == {"done": 3, "total": 3}
+    # running progress counts the empty chunk out of the total just like the final write
+    assert writes and all(done <= total <= 3 for done, total in writes)
+    assert job["result"]["verdict"] == "violation_found"
+    assert [v["verdict"] for v in job["result"]["violations"]] == ["violation", "review"]
+    assert not any((tmp_path / "uploads").iterdir())
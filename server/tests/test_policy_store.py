@@ -0,0 +1,32 @@
+# server/tests/test_policy_store.py
+import numpy as np
+from conftest import Upload
+from langchain.schema import Document
+from modules import policy_store
+from modules.flat_store import FlatVectorStore
+from tools.benchmark import HashEmbeddings
+
+FOREIGN_SOURCE = "/home/vasu/repos/ragbot/server/uploaded_policies/Hate speech not allowed.pdf"
+POLICY_TEXTS = ["Hate speech is not allowed.", "Slurs are removed on sight."]
+
+
+def test_reupload_replaces_chunks_stored_before_the_manifest(monkeypatch):
+    monkeypatch.setattr(policy_store, "POLICY_STORE_BACKEND", "flat")
+    monkeypatch.setattr(policy_store, "parse_pdfs_parallel", lambda paths, size, overlap: {
+        p: [Document(page_content=t, metadata={"source": p}) for t in POLICY_TEXTS] for p in paths
+    })
+    embeddings = HashEmbeddings(dim=16)
+    namespace = "legacy"
+    store_dir, _ = policy_store.policy_dirs(namespace)
+    legacy = FlatVectorStore(store_dir, embedding_function=embeddings)
+    legacy.add_embeddings(
+        ["3f1c", "9a7e"], POLICY_TEXTS, [{"source": FOREIGN_SOURCE}] * 2, np.ones((2, 16), dtype=np.float32),
+    )
+    legacy.persist()
+
+    store = policy_store.build_or_update_policy_store(
+        [Upload("Hate speech not allowed.pdf", b"%PDF-")], embeddings=embeddings, namespace=namespace,
+    )
+    assert len(store) == len(POLICY_TEXTS)
+    assert "3f1c" not in store.ids and "9a7e" not in store.ids
+    assert policy_store.list_policy_documents(namespace)[0]["chunks"] == len(POLICY_TEXTS)
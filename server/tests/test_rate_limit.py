@@ -0,0 +1,29 @@
+# server/tests/test_rate_limit.py
+import pytest
+from modules import rate_limit
+from modules.rate_limit import TokenBucket, per_worker
+
+
+def test_bucket_allows_a_burst_then_asks_to_wait():
+    bucket = TokenBucket(per_minute=60)
+    for _ in range(60):
+        assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1.0, abs=0.05)
+
+
+def test_oversized_requests_wait_for_a_full_bucket_only():
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.try_acquire(10_000) == 0
+    assert bucket.try_acquire(10_000) == pytest.approx(60.0, abs=0.5)
+
+
+def test_zero_rate_disables_the_bucket():
+    bucket = TokenBucket(per_minute=0)
+    assert all(bucket.try_acquire(1_000) == 0 for _ in range(10))
+
+
+def test_workers_split_the_per_key_limits(monkeypatch):
+    monkeypatch.setattr(rate_limit, "SERVER_WORKERS", 4)
+    assert per_worker(30) == 7
+    assert per_worker(2) == 1
+    assert per_worker(0) == 0
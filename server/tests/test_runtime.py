@@ -0,0 +1,59 @@
+# server/tests/test_runtime.py
+import asyncio
+import time
+import numpy as np
+from modules import policy_store, runtime as runtime_module
+from modules.flat_store import FlatVectorStore
+from modules.runtime import PolicyRuntime, PolicySnapshot
+from modules.shared_snapshot import generation_counter, snapshot_info
+from tools.benchmark import HashEmbeddings
+
+
+def test_cold_namespace_loads_off_the_event_loop(monkeypatch):
+    runtime = PolicyRuntime(shared=False)
+
+    def slow_reload(namespace):
+        time.sleep(0.2)
+        return PolicySnapshot(namespace=namespace)
+
+    monkeypatch.setattr(runtime, "reload", slow_reload)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        snapshot = await runtime.acurrent("cold")
+        ticker.cancel()
+        return snapshot, ticks
+
+    snapshot, ticks = asyncio.run(run())
+    assert snapshot.namespace == "cold"
+    assert ticks > 5
+
+
+def test_preload_publishes_snapshots_from_a_subprocess(monkeypatch):
+    # the subprocess reads its configuration from the environment
+    monkeypatch.setenv("POLICY_STORE_BACKEND", "flat")
+    monkeypatch.setattr(policy_store, "POLICY_STORE_BACKEND", "flat")
+    namespace = "preload"
+    store = FlatVectorStore(policy_store.policy_dirs(namespace)[0])
+    store.add_embeddings(["a", "b"], ["Be kind.", "No spam."], [{}, {}], np.eye(2, 8, dtype=np.float32))
+    store.persist()
+    version = policy_store.bump_policy_store_version(namespace)
+
+    def no_store_in_the_parent(*args, **kwargs):
+        raise AssertionError("preload opened a policy store before the fork")
+
+    monkeypatch.setattr(runtime_module, "load_policy_store", no_store_in_the_parent)
+    runtime = PolicyRuntime(shared=True)
+    runtime._embeddings = HashEmbeddings(dim=8)
+    runtime.preload()
+    generation = generation_counter(namespace).value
+    assert generation >= 1
+    assert snapshot_info(namespace, generation)["version"] == version
@@ -0,0 +1,33 @@
+# server/tests/test_stream.py
+import asyncio
+from conftest import TEXTS, make_chunks
+from modules.moderation import amoderate_chunk_iter, amoderate_chunks_stream
+from modules.verdict_cache import VerdictCache
+
+
+async def _stream(engine, chunks, **options):
+    return [r async for r in amoderate_chunks_stream(None, chunks, **engine, **options)]
+
+
+def test_stream_emits_every_chunk_then_a_summary(engine):
+    records = asyncio.run(_stream(engine, make_chunks(TEXTS)))
+    assert [r["type"] for r in records] == ["chunk"] * len(TEXTS) + ["summary"]
+    assert sorted(r["index"] for r in records[:-1]) == list(range(len(TEXTS)))
+    summary = records[-1]
+    assert summary["verdict"] == "violation_found"
+    assert (summary["allowed_chunks"], summary["review_chunks"], len(summary["violations"])) == (3, 1, 2)
+
+
+def test_stop_on_first_violation_counts_decided_outcomes(engine, tmp_path):
+    cache = VerdictCache(str(tmp_path / "cache.sqlite3"))
+    chunks = make_chunks(TEXTS)
+    # every verdict comes back from the cache at once, before the first record is emitted
+    asyncio.run(amoderate_chunk_iter(None, chunks, cache=cache, **engine))
+    records = asyncio.run(_stream(engine, chunks, cache=cache, stop_on_first_violation=True))
+    summary = records[-1]
+    assert summary["stopped_early"]
+    assert summary["skipped_chunks"] == 0
+    assert len([r for r in records if r["type"] == "chunk"]) == len(TEXTS)
+    assert summary["allowed_chunks"] + summary["review_chunks"] + sum(
+        1 for v in summary["violations"] if v["verdict"] == "violation"
+    ) == len(TEXTS)
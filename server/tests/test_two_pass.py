@@ -0,0 +1,55 @@
+# server/tests/test_two_pass.py
+import asyncio
+import pytest
+from conftest import TEXTS, TEXT_VERDICTS, make_chunks
+from modules.fake_llm import FakeModerationLLM
+from modules.moderation import amoderate_chunks_pipeline
+
+
+class UnclearLabelLLM(FakeModerationLLM):
+    """
+    Fake LLM whose label-only answer for the third text (about lunch) is not a label.
+    """
+
+    def answer(self, prompt, stop=None):
+        reply = super().answer(prompt, stop)
+        if "label only" not in prompt:
+            return reply
+        if "[3]" in reply:
+            return reply.replace("[3] OK", "[3] Hmm")
+        return "Hmm" if "noon" in prompt else reply
+
+
+@pytest.mark.parametrize("mode, llm_calls", [("single", 5 + 2 + 1), ("batched", 1 + 2 + 1)])
+def test_two_pass_rejudges_unclear_labels(engine, mode, llm_calls):
+    stats = {}
+    engine["llm"] = UnclearLabelLLM()
+    outcomes = asyncio.run(amoderate_chunks_pipeline(
+        None, make_chunks(TEXTS), mode=mode, batch_size=len(TEXTS), two_pass=True, stats=stats, **engine
+    ))
+    assert [o["verdict"] for o in outcomes] == TEXT_VERDICTS
+    assert outcomes[2]["explanation"].startswith("OK: ")
+    assert stats["explanation_calls"] == 2
+    assert stats["llm_calls"] == llm_calls
+
+
+@pytest.mark.parametrize("mode", ["single", "batched"])
+def test_failed_explanations_keep_the_label_without_relabelling(engine, mode, monkeypatch):
+    monkeypatch.setattr("modules.moderation.RETRY_BASE_DELAY", 0.001)
+
+    class NoExplanationLLM(FakeModerationLLM):
+        label_calls: int = 0
+
+        def answer(self, prompt, stop=None):
+            if "was labeled" in prompt:
+                raise RuntimeError("explanations down")
+            self.label_calls += 1
+            return super().answer(prompt, stop)
+
+    engine["llm"] = NoExplanationLLM()
+    outcomes = asyncio.run(amoderate_chunks_pipeline(
+        None, make_chunks(TEXTS), mode=mode, batch_size=len(TEXTS), two_pass=True, **engine
+    ))
+    assert [o["verdict"] for o in outcomes] == TEXT_VERDICTS
+    assert "explanation unavailable (explanations down)" in outcomes[1]["explanation"]
+    assert engine["llm"].label_calls == (len(TEXTS) if mode == "single" else 1)
@@ -0,0 +1,25 @@
+# server/tests/test_verdict_cache.py
+import asyncio
+import threading
+from conftest import TEXTS, make_chunks
+from modules.moderation import amoderate_chunks_pipeline
+from modules.verdict_cache import VerdictCache
+
+
+def test_cache_writes_run_off_the_event_loop(engine, tmp_path):
+    cache = VerdictCache(str(tmp_path / "cache.sqlite3"))
+    writers = []
+    put_many = cache.put_many
+
+    def recording_put_many(entries):
+        writers.append(threading.current_thread())
+        put_many(entries)
+
+    cache.put_many = recording_put_many
+    asyncio.run(amoderate_chunks_pipeline(None, make_chunks(TEXTS), cache=cache, **engine))
+    assert writers and threading.main_thread() not in writers
+
+    stats = {}
+    asyncio.run(amoderate_chunks_pipeline(None, make_chunks(TEXTS), cache=cache, stats=stats, **engine))
+    assert stats["cache"] == {"hits": len(TEXTS), "misses": 0}
+    assert stats["llm_calls"] == 0
@@ -0,0 +1,100 @@
+# server/tools/bench_vector_store.py
+"""
+Compare top-k query latency of the Chroma policy store and the flat memory-mapped backend.
+
+Usage (from the server directory, with a Chroma policy store present):
+    python -m tools.bench_vector_store [--queries 500] [--k 3] [--dtype float32]
+
+Queries are stored policy vectors plus Gaussian noise, so no embedding model is loaded and
+only the vector search is timed. The flat store is built from the Chroma data in a temporary
+directory. Prints JSON: per-query and batched latency for each backend and top-k agreement.
+"""
+import argparse
+import json
+import tempfile
+import time
+import numpy as np
+from langchain.vectorstores import Chroma
+from modules.flat_store import FlatVectorStore
+from modules.policy_store import PERSIST_POLICY_DIR
+from modules.retrieval import normalize_rows
+
+
+def latency_stats(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--noise", type=float, default=0.05, help="std-dev of the noise added to query vectors")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chroma = Chroma(persist_directory=PERSIST_POLICY_DIR)
+    data = chroma.get(include=["embeddings", "documents", "metadatas"])
+    if not data.get("ids"):
+        raise SystemExit(f"No Chroma policy store found in {PERSIST_POLICY_DIR}")
+    stored = np.array(data["embeddings"], dtype=np.float32)
+
+    rng = np.random.default_rng(args.seed)
+    picks = rng.integers(0, len(stored), args.queries)
+    queries = normalize_rows(stored[picks] + rng.normal(0, args.noise, (args.queries, stored.shape[1])))
+
+    with tempfile.TemporaryDirectory(prefix="flat_bench_") as tmp:
+        flat = FlatVectorStore(tmp, dtype=args.dtype)
+        _, build_seconds = timed(lambda: (
+            flat.add_embeddings(data["ids"], data["documents"], [md or {} for md in data["metadatas"]], stored),
+            flat.persist(),
+        ))
+        flat = FlatVectorStore(tmp, dtype=args.dtype)
+        _, load_seconds = timed(lambda: flat.as_policy_index())
+
+        collection = chroma._collection
+        chroma_single, chroma_ids = [], []
+        for q in queries:
+            result, seconds = timed(lambda: collection.query(query_embeddings=[q.tolist()], n_results=args.k))
+            chroma_single.append(seconds)
+            chroma_ids.append(result["ids"][0])
+        _, chroma_batch = timed(lambda: collection.query(query_embeddings=queries.tolist(), n_results=args.k))
+
+        index = flat.as_policy_index()
+        flat_single = [timed(index.search_with_scores, q.reshape(1, -1), args.k)[1] for q in queries]
+        best = np.argsort(-index.scores(queries), axis=1)[:, :args.k]
+        flat_ids = [[flat.ids[j] for j in row] for row in best]
+        _, flat_batch = timed(index.search_with_scores, queries, args.k)
+
+    agreement = np.mean([len(set(a) & set(b)) / max(1, len(a)) for a, b in zip(chroma_ids, flat_ids)])
+    print(json.dumps({
+        "policy_chunks": len(stored),
+        "dim": int(stored.shape[1]),
+        "queries": args.queries,
+        "k": args.k,
+        "chroma": {"per_query": latency_stats(chroma_single), "batch_ms": round(chroma_batch * 1000, 3)},
+        "flat": {
+            "dtype": args.dtype,
+            "build_ms": round(build_seconds * 1000, 3),
+            "load_ms": round(load_seconds * 1000, 3),
+            "per_query": latency_stats(flat_single),
+            "batch_ms": round(flat_batch * 1000, 3),
+        },
+        "topk_agreement": round(float(agreement), 4),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# server/tools/benchmark.py
+"""
+End-to-end moderation benchmark on synthetic PDFs with the fake LLM.
+
+Usage (from the server directory):
+    python -m tools.benchmark run [--policy-pages 20] [--doc-pages 50] [--iterations 5]
+                                  [--concurrency 4] [--llm-latency 0.05] [--fake-embeddings]
+                                  [--output bench.json]
+    python -m tools.benchmark compare before.json after.json
+    python -m tools.benchmark context [--budgets 0,600,400,250] [--fake-embeddings]
+
+`run` times policy-store build, PDF loading, retrieval and moderation, both by calling the
+modules directly and through the FastAPI app (in-process ASGI transport, no network).
+Each stage reports p50/p95/p99 latency, throughput and the process peak RSS after it.
+The policy store, uploads, job database and verdict cache are redirected to a temporary
+directory, so a run never touches the server's own data. The verdict cache and the LLM
+rate limiter are off unless --cache / --rate-limit are given, so repeated iterations
+measure the full pipeline.
+
+`context` measures POLICY_CONTEXT_TOKEN_BUDGET on the same synthetic PDFs: policy-context
+tokens per call for each budget, and how many distinct policy rules trimming removes
+from a call's context entirely.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+
+
+class HashEmbeddings:
+    """
+    Deterministic bag-of-words hashing embedder: isolates pipeline overhead from model cost.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        return out.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def latency_stats(seconds) -> dict:
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux; children covers the PDF parse pool
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def stage_result(latencies, wall: float, items_per_op: int = 1, item_name: str = "chunks") -> dict:
+    ops = len(latencies)
+    return {
+        "iterations": ops,
+        "wall_s": round(wall, 4),
+        "latency": latency_stats(latencies),
+        "throughput": {
+            "ops_per_s": round(ops / wall, 3) if wall else None,
+            f"{item_name}_per_s": round(ops * items_per_op / wall, 3) if wall else None,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def upload(path: Path) -> SimpleNamespace:
+    """
+    UploadFile stand-in (the modules only use .filename and .file).
+    """
+    return SimpleNamespace(filename=path.name, file=io.BytesIO(path.read_bytes()))
+
+
+def timed_runs(fn, iterations: int):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - start
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_environment(args, work_dir: Path):
+    """
+    Point every persistent path at `work_dir` and select the fake LLM. Must run before the
+    server modules are imported, since they read their configuration at import time.
+    """
+    os.environ.update({
+        "MODERATION_LLM": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "POLICY_STORE_DIR": str(work_dir / "policy_store"),
+        "POLICY_UPLOAD_DIR": str(work_dir / "uploaded_policies"),
+        "POLICY_NAMESPACES_DIR": str(work_dir / "policy_namespaces"),
+        "POLICY_SNAPSHOT_DIR": str(work_dir / "policy_snapshots"),
+        "JOBS_DB_PATH": str(work_dir / "jobs.sqlite3"),
+        "JOB_UPLOAD_DIR": str(work_dir / "job_uploads"),
+        "MODERATION_ARCHIVE_PATH": str(work_dir / "moderation_archive.sqlite3"),
+        "VERDICT_CACHE_PATH": str(work_dir / "verdict_cache.sqlite3"),
+        "VERDICT_CACHE_ENABLED": "1" if args.cache else "0",
+    })
+    if args.mode:
+        os.environ["MODERATION_MODE"] = args.mode
+    if args.two_pass:
+        os.environ["MODERATION_TWO_PASS"] = "1"
+    if not args.rate_limit:
+        os.environ["LLM_REQUESTS_PER_MINUTE"] = "0"
+        os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+
+
+def run_direct(args, policy_pdf: Path, document_pdf: Path) -> dict:
+    from modules.policy_store import build_or_update_policy_store, clear_policy_store
+    from modules.moderation import load_current_pdf_to_chunks, aretrieve_policy_context, moderate_file_against_policy
+    from modules.runtime import runtime
+
+    if args.fake_embeddings:
+        # pre-seed the registry so neither the direct calls nor the app load the model
+        runtime._embeddings = HashEmbeddings()
+    embeddings = runtime.embeddings
+    stages = {}
+
+    def build():
+        clear_policy_store()
+        runtime.swap(build_or_update_policy_store([upload(policy_pdf)], embeddings=embeddings))
+
+    latencies, wall = timed_runs(build, args.iterations)
+    snapshot = runtime.current()
+    policy_chunks = len(snapshot.index)
+    stages["build_policy_store"] = stage_result(latencies, wall, policy_chunks)
+
+    latencies, wall = timed_runs(lambda: load_current_pdf_to_chunks(upload(document_pdf)), args.iterations)
+    chunks = load_current_pdf_to_chunks(upload(document_pdf))
+    stages["load_pdf_chunks"] = stage_result(latencies, wall, len(chunks))
+
+    latencies, wall = timed_runs(
+        lambda: asyncio.run(aretrieve_policy_context(snapshot.index, embeddings, chunks, k=args.k)), args.iterations
+    )
+    stages["retrieval"] = stage_result(latencies, wall, len(chunks))
+
+    options = runtime.moderation_options(snapshot)
+    results = []
+    latencies, wall = timed_runs(
+        lambda: results.append(moderate_file_against_policy(snapshot.store, upload(document_pdf), k=args.k, **options)),
+        args.iterations,
+    )
+    stages["moderate_direct"] = stage_result(latencies, wall, len(chunks))
+    stages["moderate_direct"]["verdict"] = results[-1]["verdict"]
+    stages["moderate_direct"]["stats"] = {
+        key: results[-1][key] for key in ("llm_calls", "cache", "batch_fallbacks", "prefiltered_chunks") if key in results[-1]
+    }
+    return {"policy_chunks": policy_chunks, "document_chunks": len(chunks), "stages": stages}
+
+
+async def run_http(args, policy_pdf: Path, document_pdf: Path, policy_chunks: int, document_chunks: int) -> dict:
+    import httpx
+    from main import app
+
+    policy_bytes = policy_pdf.read_bytes()
+    document_bytes = document_pdf.read_bytes()
+    stages = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+            async def post_policy():
+                await client.post("/clear_policy/")
+                response = await client.post(
+                    "/upload_policy/", files=[("files", (policy_pdf.name, policy_bytes, "application/pdf"))]
+                )
+                response.raise_for_status()
+
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                t = time.perf_counter()
+                await post_policy()
+                latencies.append(time.perf_counter() - t)
+            stages["upload_policy_http"] = stage_result(latencies, time.perf_counter() - start, policy_chunks)
+
+            async def post_moderate(latencies):
+                t = time.perf_counter()
+                response = await client.post(
+                    "/moderate/", files={"current_file": (document_pdf.name, document_bytes, "application/pdf")}
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - t)
+                return response.json()
+
+            requests = args.requests or args.iterations * args.concurrency
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies = []
+
+            async def bounded():
+                async with semaphore:
+                    return await post_moderate(latencies)
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(bounded() for _ in range(requests)))
+            stages["moderate_http"] = stage_result(latencies, time.perf_counter() - start, document_chunks)
+            stages["moderate_http"]["concurrency"] = args.concurrency
+            stages["moderate_http"]["errors"] = sum(1 for r in results if "error" in r)
+    return stages
+
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="moderation_bench_") as tmp:
+        work_dir = Path(tmp)
+        configure_environment(args, work_dir)
+        sys.path.insert(0, str(SERVER_DIR))
+
+        from tools.synthetic_pdfs import generate_policy_pdf, generate_document_pdf
+        policy_pdf = Path(generate_policy_pdf(work_dir / "bench_policy.pdf", args.policy_pages, args.seed))
+        document_pdf = Path(generate_document_pdf(
+            work_dir / "bench_document.pdf", args.doc_pages, args.violation_rate, args.seed + 1
+        ))
+
+        report = {
+            "meta": {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "config": vars(args),
+            },
+        }
+        report.update(run_direct(args, policy_pdf, document_pdf))
+        if not args.skip_http:
+            report["stages"].update(asyncio.run(run_http(
+                args, policy_pdf, document_pdf, report["policy_chunks"], report["document_chunks"]
+            )))
+        report["peak_rss_mb"] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+        print(f"Wrote {args.output}")
+    print(output)
+
+
+def context_budgets(args):
+    """
+    Build every chunk's policy context at each budget and report the tokens it saves
+    against the distinct policy rules it drops.
+    """
+    with tempfile.TemporaryDirectory(prefix="moderation_bench_") as tmp:
+        work_dir = Path(tmp)
+        configure_environment(args, work_dir)
+        sys.path.insert(0, str(SERVER_DIR))
+
+        from tools.synthetic_pdfs import generate_policy_pdf, generate_document_pdf, POLICY_SENTENCES
+        from modules.context_builder import build_policy_context
+        from modules.pdf_handlers import iter_pdf_documents
+        from modules.policy_store import get_embeddings
+        from modules.retrieval import PolicyIndex, embed_texts
+
+        policy_pdf = generate_policy_pdf(work_dir / "bench_policy.pdf", args.policy_pages, args.seed)
+        document_pdf = generate_document_pdf(work_dir / "bench_document.pdf", args.doc_pages, args.violation_rate, args.seed + 1)
+        policies = list(iter_pdf_documents(policy_pdf))
+        chunks = [d.page_content for d in iter_pdf_documents(document_pdf)]
+        embeddings = HashEmbeddings() if args.fake_embeddings else get_embeddings()
+        index = PolicyIndex(
+            [str(i) for i in range(len(policies))], embed_texts(embeddings, [d.page_content for d in policies]), policies,
+        )
+        retrieved, _ = index.search_with_scores(embed_texts(embeddings, chunks), args.k)
+
+    def rules(text):
+        text = " ".join(text.split())
+        return {rule for rule in POLICY_SENTENCES if rule in text}
+
+    full = [build_policy_context(docs, [chunk], token_budget=0) for chunk, docs in zip(chunks, retrieved)]
+    report = {"policy_chunks": len(policies), "document_chunks": len(chunks), "budgets": {}}
+    for budget in args.budgets:
+        before = after = trimmed = dropped = 0
+        for chunk, docs, whole in zip(chunks, retrieved, full):
+            context = build_policy_context(docs, [chunk], token_budget=budget)
+            before += context.tokens_before
+            after += context.tokens_after
+            trimmed += context.text != whole.text
+            dropped += len(rules(whole.text) - rules(context.text))
+        calls = max(1, len(chunks))
+        report["budgets"][str(budget)] = {
+            "tokens_per_call_before": round(before / calls, 1),
+            "tokens_per_call_after": round(after / calls, 1),
+            "tokens_saved_pct": round((before - after) / before * 100, 1) if before else 0.0,
+            "trimmed_calls": trimmed,
+            "dropped_rules_per_call": round(dropped / calls, 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+def compare(args):
+    """
+    Print per-stage p50/p95 latency and throughput changes between two result files.
+    """
+    before = json.loads(Path(args.before).read_text())
+    after = json.loads(Path(args.after).read_text())
+
+    def change(old, new):
+        if not old or new is None:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"{'stage':<22} {'metric':<12} {'before':>12} {'after':>12} {'change':>9}")
+    for stage, new in after["stages"].items():
+        old = before["stages"].get(stage)
+        if old is None:
+            continue
+        rows = [
+            ("p50_ms", old["latency"]["p50_ms"], new["latency"]["p50_ms"]),
+            ("p95_ms", old["latency"]["p95_ms"], new["latency"]["p95_ms"]),
+            ("ops_per_s", old["throughput"]["ops_per_s"], new["throughput"]["ops_per_s"]),
+        ]
+        for metric, a, b in rows:
+            print(f"{stage:<22} {metric:<12} {a:>12} {b:>12} {change(a, b):>9}")
+    print(f"{'peak_rss_mb':<22} {'self':<12} {before['peak_rss_mb']['self']:>12} {after['peak_rss_mb']['self']:>12} "
+          f"{change(before['peak_rss_mb']['self'], after['peak_rss_mb']['self']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmark")
+    run_parser.add_argument("--policy-pages", type=int, default=20)
+    run_parser.add_argument("--doc-pages", type=int, default=50)
+    run_parser.add_argument("--violation-rate", type=float, default=0.05)
+    run_parser.add_argument("--iterations", type=int, default=5)
+    run_parser.add_argument("--concurrency", type=int, default=4, help="concurrent /moderate/ requests")
+    run_parser.add_argument("--requests", type=int, default=0, help="total /moderate/ requests (default iterations x concurrency)")
+    run_parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    run_parser.add_argument("--mode", choices=["single", "batched"], default=None)
+    run_parser.add_argument("--two-pass", action="store_true", help="label first, explain only VIOLATION/REVIEW chunks")
+    run_parser.add_argument("--k", type=int, default=3)
+    run_parser.add_argument("--fake-embeddings", action="store_true", help="use a hashing embedder instead of the model")
+    run_parser.add_argument("--cache", action="store_true", help="keep the verdict cache enabled")
+    run_parser.add_argument("--rate-limit", action="store_true", help="keep the LLM rate limiter enabled")
+    run_parser.add_argument("--skip-http", action="store_true", help="only time direct module calls")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="write the JSON report to this file")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.set_defaults(func=compare)
+
+    context_parser = commands.add_parser("context", help="policy-context tokens and dropped rules per budget")
+    context_parser.add_argument("--budgets", type=lambda v: [int(b) for b in v.split(",")], default=[0, 600, 400, 250])
+    context_parser.add_argument("--policy-pages", type=int, default=20)
+    context_parser.add_argument("--doc-pages", type=int, default=50)
+    context_parser.add_argument("--violation-rate", type=float, default=0.05)
+    context_parser.add_argument("--k", type=int, default=3)
+    context_parser.add_argument("--fake-embeddings", action="store_true", help="use a hashing embedder instead of the model")
+    context_parser.add_argument("--seed", type=int, default=0)
+    context_parser.set_defaults(
+        func=context_budgets, llm_latency=0.0, mode=None, two_pass=False, cache=False, rate_limit=False,
+    )
+
+    args = parser.parse_args()
+    func = args.func
+    del args.func
+    func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# server/tools/calibrate_prefilter.py
+"""
+Calibrate PREFILTER_THRESHOLD on a labeled sample against the current policy store.
+
+Usage (from the server directory):
+    python -m tools.calibrate_prefilter sample.jsonl [--recall 0.99] [--lexical-weight 0.3]
+
+Each line of the sample is {"text": "...", "label": "ok" | "violation" | "review"}.
+"""
+import argparse
+import json
+from modules.policy_store import get_embeddings, load_policy_store
+from modules.retrieval import PolicyIndex, embed_texts
+from modules.prefilter import relevance_scores, calibrate_threshold, PREFILTER_LEXICAL_WEIGHT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sample", help="JSONL file with text/label records")
+    parser.add_argument("--recall", type=float, default=1.0, help="share of violation/review samples that must pass the gate")
+    parser.add_argument("--margin", type=float, default=0.02, help="safety margin subtracted from the threshold")
+    parser.add_argument("--lexical-weight", type=float, default=PREFILTER_LEXICAL_WEIGHT)
+    args = parser.parse_args()
+
+    with open(args.sample) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    texts = [r["text"] for r in records]
+    labels = [r["label"] for r in records]
+
+    embeddings = get_embeddings()
+    index = PolicyIndex.from_store(load_policy_store(embeddings=embeddings))
+    _, top = index.search_with_scores(embed_texts(embeddings, texts), k=1)
+    dense = [float(row[0]) if len(row) else 0.0 for row in top]
+    scores = relevance_scores(dense, texts, index.lexical, args.lexical_weight)
+
+    report = calibrate_threshold(scores, labels, target_recall=args.recall, margin=args.margin)
+    report["lexical_weight"] = args.lexical_weight
+    print(json.dumps(report, indent=2))
+    print(f"\nexport PREFILTER_THRESHOLD={report['threshold']:.4f} PREFILTER_LEXICAL_WEIGHT={args.lexical_weight}")
+
+
+if __name__ == "__main__":
+    main()
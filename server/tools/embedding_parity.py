@@ -0,0 +1,66 @@
+# server/tools/embedding_parity.py
+"""
+Measure cosine drift of an embedding backend against the reference model (the original
+HuggingFaceEmbeddings setup), plus neighbour agreement and throughput of both.
+
+Usage (from the server directory):
+    python -m tools.embedding_parity [--backend onnx-int8] [--pdf a.pdf ...] [--min-cosine 0.99]
+
+Texts come from the given PDFs (split like uploads), else from the default policy store,
+else from a synthetic policy document. Exits non-zero if any text falls below --min-cosine.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from modules.embedding_engine import (
+    BACKENDS, EMBED_THREADS, EMBEDDING_BACKEND, EMBEDDING_MODEL, EmbeddingEngine, parity_check, reference_embeddings,
+)
+from modules.pdf_handlers import iter_pdf_documents
+from modules.retrieval import EMBED_BATCH_SIZE
+
+
+def sample_texts(pdfs, limit: int, embeddings):
+    if pdfs:
+        return [d.page_content for path in pdfs for d in iter_pdf_documents(path)][:limit]
+    from modules.policy_store import load_policy_store
+
+    try:
+        data = load_policy_store(embeddings=embeddings).get(include=["documents"])
+        texts = list(data.get("documents") or [])
+        if texts:
+            return texts[:limit]
+    except FileNotFoundError:
+        pass
+    from tools.synthetic_pdfs import generate_document_pdf
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = generate_document_pdf(Path(tmp) / "parity.pdf", pages=20, violation_rate=0.2)
+        return [d.page_content for d in iter_pdf_documents(path)][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS)
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDFs to sample chunks from")
+    parser.add_argument("--limit", type=int, default=500, help="max texts to compare")
+    parser.add_argument("--k", type=int, default=5, help="neighbours compared for agreement")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    reference = reference_embeddings()
+    texts = sample_texts(args.pdf, args.limit, reference)
+    engine = EmbeddingEngine(EMBEDDING_MODEL, backend=args.backend, batch_size=args.batch_size, threads=args.threads)
+    report = parity_check(engine, reference, texts, k=args.k)
+    report.update(backend=args.backend, batch_size=args.batch_size, threads=args.threads, min_cosine_required=args.min_cosine)
+    print(json.dumps(report, indent=2))
+    if report["min_cosine"] < args.min_cosine:
+        print(f"\n{args.backend} drifts below {args.min_cosine} cosine on at least one text", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
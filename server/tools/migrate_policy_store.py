@@ -0,0 +1,82 @@
+# server/tools/migrate_policy_store.py
+"""
+Convert Chroma policy stores into the flat memory-mapped backend, in place.
+
+Usage (from the server directory):
+    python -m tools.migrate_policy_store [--namespace NAME] [--dtype float16] [--remove-chroma]
+
+Every policy namespace on disk is converted unless --namespace picks one; namespaces
+without a Chroma store are skipped. Stored embeddings are copied as-is (nothing is
+re-embedded) and chunk IDs are kept, so the manifests stay valid. Serve the result with
+POLICY_STORE_BACKEND=flat.
+"""
+import argparse
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from langchain.vectorstores import Chroma
+from modules.flat_store import FlatVectorStore, FLAT_STORE_DTYPE, FLAT_STORE_FILES
+from modules.policy_store import (
+    METADATA_FILES, InvalidNamespace, bump_policy_store_version, list_namespaces, policy_dirs,
+)
+
+
+def migrate(namespace: str, dtype: str, remove_chroma: bool = False) -> bool:
+    """
+    Convert one namespace's Chroma store. Returns False if it has none.
+    """
+    store_dir, _ = policy_dirs(namespace)
+    if not os.path.isdir(store_dir):
+        return False
+    chroma = Chroma(persist_directory=store_dir)
+    data = chroma.get(include=["embeddings", "documents", "metadatas"])
+    ids = list(data.get("ids") or [])
+    if not ids:
+        return False
+
+    flat = FlatVectorStore(store_dir, dtype=dtype)
+    flat.delete(ids=list(flat.ids))
+    flat.add_embeddings(ids, data["documents"], [md or {} for md in data["metadatas"]],
+                        np.array(data["embeddings"], dtype=np.float32))
+    flat.persist()
+    # float16 rounding can move near-ties in retrieval, so cached verdicts are invalidated
+    bump_policy_store_version(namespace)
+    print(f"[{namespace}] Converted {len(flat)} chunks to {flat.dtype.name} in {store_dir}")
+
+    if remove_chroma:
+        for name in os.listdir(store_dir):
+            if name in METADATA_FILES | FLAT_STORE_FILES:
+                continue
+            path = Path(store_dir) / name
+            shutil.rmtree(path) if path.is_dir() else path.unlink()
+        print(f"[{namespace}] Removed Chroma files")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--namespace", help="convert only this namespace (default: all of them)")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=FLAT_STORE_DTYPE)
+    parser.add_argument("--remove-chroma", action="store_true", help="delete the Chroma files after converting")
+    args = parser.parse_args()
+
+    namespaces = [args.namespace] if args.namespace else list_namespaces()
+    try:
+        for namespace in namespaces:
+            policy_dirs(namespace)
+    except InvalidNamespace as e:
+        raise SystemExit(str(e))
+    converted = []
+    for namespace in namespaces:
+        if migrate(namespace, args.dtype, args.remove_chroma):
+            converted.append(namespace)
+        else:
+            print(f"[{namespace}] No Chroma policy store; skipped")
+    if not converted:
+        raise SystemExit("No Chroma policy store found")
+    print("Set POLICY_STORE_BACKEND=flat to serve the converted stores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# server/tools/synthetic_pdfs.py
+"""
+Generate synthetic policy and document PDFs of configurable size for benchmarks.
+
+Usage (from the server directory):
+    python -m tools.synthetic_pdfs OUT_DIR [--policy-pages 20] [--doc-pages 50] [--violation-rate 0.05]
+
+The PDFs are plain text in Helvetica written without extra dependencies; pypdf extracts the
+lines back verbatim. Document pages mix neutral sentences with a share of sentences that
+contain terms the fake LLM flags, so benchmark runs exercise every verdict.
+"""
+import argparse
+import random
+from pathlib import Path
+from typing import List
+
+LINES_PER_PAGE = 48
+LINE_WIDTH = 90
+
+POLICY_SENTENCES = [
+    "Content that promotes hate against a protected group is prohibited.",
+    "Threats of violence or calls to kill a person must be removed.",
+    "Slurs and dehumanizing language are not allowed in any context.",
+    "Instructions for building a weapon require review by a moderator.",
+    "Descriptions of illegal drugs sale or use require review.",
+    "Confidential personal data such as addresses must not be shared.",
+    "Graphic violence shown for news value must carry a warning.",
+    "Harassment that targets an individual repeatedly is prohibited.",
+]
+NEUTRAL_SENTENCES = [
+    "The quarterly report shows steady growth in all regions.",
+    "Our team met on Tuesday to plan the product launch schedule.",
+    "Customers can reach support by email during business hours.",
+    "The new office opens next month with space for forty people.",
+    "Please review the attached budget before the Friday meeting.",
+    "Training sessions cover onboarding, tooling and code review.",
+    "The library lends books, journals and audio recordings.",
+    "Weather delays moved the delivery to the following week.",
+]
+FLAGGED_SENTENCES = [
+    "He posted hate messages about his neighbours again.",
+    "The thread described violence against the protesters.",
+    "Someone asked where to buy a weapon without papers.",
+    "The message listed prices for drugs near the station.",
+    "A confidential list of home addresses was attached.",
+]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages: List[List[str]]) -> str:
+    """
+    Write a minimal PDF with one text line per entry of each page.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        body = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (n, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(out))
+    return str(path)
+
+
+def _page(rng: random.Random, sentences: List[str], flagged: List[str], flagged_rate: float, number: int) -> List[str]:
+    lines, line = [f"Page {number}"], ""
+    while len(lines) < LINES_PER_PAGE:
+        pool = flagged if flagged and rng.random() < flagged_rate else sentences
+        sentence = rng.choice(pool)
+        if len(line) + len(sentence) + 1 > LINE_WIDTH:
+            lines.append(line)
+            line = ""
+        line = f"{line} {sentence}".strip()
+    return lines
+
+
+def generate_policy_pdf(path, pages: int = 20, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return write_pdf(path, [_page(rng, POLICY_SENTENCES, [], 0.0, n + 1) for n in range(pages)])
+
+
+def generate_document_pdf(path, pages: int = 50, violation_rate: float = 0.05, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    return write_pdf(path, [_page(rng, NEUTRAL_SENTENCES, FLAGGED_SENTENCES, violation_rate, n + 1) for n in range(pages)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--policy-pages", type=int, default=20)
+    parser.add_argument("--doc-pages", type=int, default=50)
+    parser.add_argument("--violation-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out = Path(args.out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    print(generate_policy_pdf(out / "synthetic_policy.pdf", args.policy_pages, args.seed))
+    print(generate_document_pdf(out / "synthetic_document.pdf", args.doc_pages, args.violation_rate, args.seed + 1))
+
+
+if __name__ == "__main__":
+    main()